@@ -1,12 +1,15 @@
 from flask import Blueprint, request, jsonify
-import io, base64, cv2, csv, json
-import numpy as np
-from PIL import Image
+import base64, json
 from typing import List, Dict, Any
 
-from .card_ocr_redact import run_once_image
-from .engine import detect_and_redact
-from .pii_masking import mask_one as _mask_one_simple
+from .engine import detect_and_redact, mask_csv_stream, mask_json_stream, Base64Sink
+from .model_registry import load_stats
+from .inference import inference_stats
+from .fast_tier import tier_stats
+from .pii_masking import MASK_PIPELINE
+from .restore import restore_text
+from .cache import cache_stats
+from .pipeline import stage_stats
 
 api_bp = Blueprint("api", __name__)
 
@@ -16,14 +19,43 @@ def scan():
         return ("", 204)
     data = request.get_json() or {}
     text = (data.get("text") or "").strip()
-    result = detect_and_redact(text)
+    stages = data.get("stages")
+    if stages is not None and not isinstance(stages, dict):
+        return jsonify({"ok": False, "error": "stages must be an object"}), 400
+    try:
+        MASK_PIPELINE.check_overrides(stages)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    result = detect_and_redact(text, stages=stages)
     return jsonify({"ok": True, "original_text": text, **result})
 
+@api_bp.route("/restore", methods=["POST", "OPTIONS"])
+def restore():
+    if request.method == "OPTIONS":
+        return ("", 204)
+    data = request.get_json() or {}
+    text = data.get("text") or ""
+    restore_map = data.get("restore_map") or {}
+    if not isinstance(restore_map, dict):
+        return jsonify({"ok": False, "error": "restore_map must be an object"}), 400
+    restore_map = {str(k): str(v) for k, v in restore_map.items()}
+    return jsonify({"ok": True, "restored_text": restore_text(text, restore_map)})
+
+@api_bp.get("/stats")
+def stats():
+    return jsonify({"ok": True, "models": load_stats(), "inference": inference_stats(),
+                    "tiers": tier_stats(), "caches": cache_stats(), "stages": stage_stats()})
+
 @api_bp.route("/ocr-mask", methods=["POST", "OPTIONS"])
 def ocr_mask():
     if request.method == "OPTIONS":
         return ("", 204)
     try:
+        # OCR 경로에서만 쓰는 cv2/easyocr(torch 포함)는 요청이 올 때 불러온다
+        import cv2
+        import numpy as np
+        from .card_ocr_redact import run_once_image
+
         f = request.files.get("file")
         if not f:
             return jsonify({"ok": False, "error": "no file"}), 400
@@ -94,19 +126,8 @@ def ocr_mask():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
-def _mask_text_value(v: Any, state: dict | None = None) -> str:
-    s = str(v) if v is not None else ""
-    res = detect_and_redact(s)
-    return (res.get("redacted_text") or _mask_one_simple(s, state=state) or s)
-
-def _collect_types_and_count(texts: List[str]) -> tuple[list, int]:
-    all_types: set = set()
-    total = 0
-    for t in texts:
-        r = detect_and_redact(t or "")
-        all_types.update(r.get("types") or [])
-        total += len(r.get("entities") or [])
-    return sorted(all_types), total
+def _text_value(v: Any) -> str:
+    return str(v) if v is not None else ""
 
 @api_bp.route("/file-mask", methods=["POST", "OPTIONS"])
 def file_mask():
@@ -122,6 +143,7 @@ def file_mask():
         raw = f.read()
 
         preview_items: List[Dict[str, Any]] = []
+        chunks: List[str] = []
         masked_file_base64 = None
         masked_mime = None
         masked_name = None
@@ -129,86 +151,33 @@ def file_mask():
         total_count = 0
 
         if lower.endswith(".csv"):
-            sio = io.StringIO(raw.decode("utf-8", errors="ignore"))
-            reader = csv.DictReader(sio)
-            rows = list(reader)
-            headers = list(reader.fieldnames or [])
-
-            texts_for_stats = [" | ".join(str(row.get(h, "") or "") for h in headers) for row in rows]
-            types, total_count = _collect_types_and_count(texts_for_stats)
-
-            state = {}
-            for i, row in enumerate(rows[:5]):
-                orig_line = {h: row.get(h, "") for h in headers}
-                masked_line = {h: _mask_text_value(row.get(h, ""), state=state) for h in headers}
-                preview_items.append({"kind": "csv_row", "index": i, "original": orig_line, "masked": masked_line})
-
-            out_sio = io.StringIO()
-            w = csv.DictWriter(out_sio, fieldnames=headers)
-            w.writeheader()
-            state_all = {}
-            for row in rows:
-                w.writerow({h: _mask_text_value(row.get(h, ""), state=state_all) for h in headers})
-            data = out_sio.getvalue().encode("utf-8")
-            masked_file_base64 = base64.b64encode(data).decode("ascii")
+            # 행 배치 단위로 마스킹하며, 유형 통계도 마스킹에서 검출한 엔티티로 센다.
+            # 인덱스는 파일 전체에서 이어진다. (같은 값은 모든 행에서 같은 [유형_N], 셀마다 1부터 다시 세지 않음)
+            b64 = Base64Sink(chunks.append)
+            summary = mask_csv_stream(raw, b64)
+            b64.close()
+
+            preview_items = summary["preview"]
+            types, total_count = summary["types"], summary["total_count"]
+            masked_file_base64 = "".join(chunks)
             masked_mime = "text/csv"
             masked_name = f"masked_{name or 'data.csv'}"
 
         elif lower.endswith(".json") or lower.endswith(".jsonl"):
-            text = raw.decode("utf-8", errors="ignore").strip()
-            values_for_stats: List[str] = []
-            preview_limit = 5
-            state = {}
-
-            def _mask_json_obj(obj):
-                if isinstance(obj, dict):
-                    return {k: _mask_json_obj(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [_mask_json_obj(v) for v in obj]
-                else:
-                    values_for_stats.append(str(obj))
-                    return _mask_text_value(obj, state=state)
-
-            if lower.endswith(".jsonl"):
-                items = []
-                for line in text.splitlines():
-                    if not line.strip(): continue
-                    try:
-                        items.append(json.loads(line))
-                    except:
-                        items.append({"_raw": line})
-                masked_items = [_mask_json_obj(o) for o in items]
-
-                for i, (o, m) in enumerate(zip(items[:preview_limit], masked_items[:preview_limit])):
-                    preview_items.append({"kind": "json_obj", "index": i, "original": o, "masked": m})
-
-                out = "\n".join(json.dumps(o, ensure_ascii=False) for o in masked_items).encode("utf-8")
-                masked_file_base64 = base64.b64encode(out).decode("ascii")
-                masked_mime = "application/x-ndjson"
-                masked_name = f"masked_{name or 'data.jsonl'}"
-            else:
-                try:
-                    obj = json.loads(text)
-                except:
-                    return jsonify({"ok": False, "error": "bad json"}), 400
-                masked = _mask_json_obj(obj)
-
-                if isinstance(obj, list):
-                  for i, (o, m) in enumerate(zip(obj[:preview_limit], masked[:preview_limit])):
-                      preview_items.append({"kind": "json_item", "index": i, "original": o, "masked": m})
-                elif isinstance(obj, dict):
-                  keys = list(obj.keys())[:preview_limit]
-                  for k in keys:
-                      preview_items.append({"kind": "json_field", "path": k, "original": obj.get(k), "masked": masked.get(k)})
-                else:
-                  preview_items.append({"kind": "json_scalar", "original": obj, "masked": masked})
-
-                out = json.dumps(masked, ensure_ascii=False, indent=2).encode("utf-8")
-                masked_file_base64 = base64.b64encode(out).decode("ascii")
-                masked_mime = "application/json"
-                masked_name = f"masked_{name or 'data.json'}"
-
-            types, total_count = _collect_types_and_count(values_for_stats)
+            # JSONL은 한 줄씩, 최상위 배열 JSON은 원소 하나씩 읽어 배치 마스킹한다
+            is_jsonl = lower.endswith(".jsonl")
+            b64 = Base64Sink(chunks.append)
+            try:
+                summary = mask_json_stream(raw, b64, is_jsonl=is_jsonl, to_text=_text_value)
+            except json.JSONDecodeError:
+                return jsonify({"ok": False, "error": "bad json"}), 400
+            b64.close()
+
+            preview_items = summary["preview"]
+            types, total_count = summary["types"], summary["total_count"]
+            masked_file_base64 = "".join(chunks)
+            masked_mime = "application/x-ndjson" if is_jsonl else "application/json"
+            masked_name = f"masked_{name or ('data.jsonl' if is_jsonl else 'data.json')}"
         else:
             return jsonify({"ok": False, "error": "unsupported file type"}), 415
 
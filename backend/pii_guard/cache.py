@@ -0,0 +1,84 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+'''
+스레드 안전한 크기 제한 LRU 캐시. 적중/미적중/제거 횟수를 센다.
+max_bytes와 sizeof(값 → 추정 바이트)를 주면 항목 수와 함께 메모리 추정치로도 제거한다.
+name을 주면 cache_stats()에 등록된다.
+'''
+class LRUCache:
+    def __init__(self, maxsize: int, name: str | None = None, max_bytes: int = 0,
+                 sizeof: Callable[[Any], int] | None = None):
+        self.maxsize = max(0, int(maxsize))
+        self.max_bytes = max(0, int(max_bytes))
+        self.name = name
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        if name:
+            with _registry_lock:
+                _registry[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+        size = self._sizeof(value) if self._sizeof else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            self._bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (self.max_bytes and self._bytes > self.max_bytes):
+                old, _ = self._data.popitem(last=False)
+                self._bytes -= self._sizes.pop(old, 0)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+_registry_lock = threading.Lock()
+_registry: Dict[str, LRUCache] = {}
+
+'''
+이름이 등록된 캐시들의 통계를 반환한다.
+'''
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        caches = dict(_registry)
+    return {name: c.stats() for name, c in caches.items()}
@@ -1,19 +1,27 @@
 from __future__ import annotations
-import io, csv, json, base64
-from typing import Any, Dict, List, Tuple
-from pathlib import Path
-
-from .pii_masking import (
-    ner, mask_one, LABELS_KOR, normalize_text,
-)
+import io, csv, json, base64, os
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple
 
+from .inference import ner, ner_many
+from .rules import scan_text
+from .restore import restore_text
+from .normalize import NormalizedText, normalize
+from .json_stream import iter_json_array, iter_jsonl, read_head
+from .state_store import new_job_state, release_job_state
+from .span_rewriter import rewrite_spans
+from .pii_masking import detect_entities, mask_many, mask_entities_with_indexing, mask_entities_with_offsets
 from .pii_fakedata import (
-    ner, fake_one, LABELS_KOR, normalize_text,
+    detect_fake_entities, replace_entities_with_fake, replace_entities_with_fake_offsets,
+    LABELS_KOR, normalize_text,
 )
 
-def _ner_entities(text: str) -> List[Dict[str, Any]]:
-    text_norm = normalize_text(text or "")
-    raw = ner(text_norm)
+# 스트리밍 CSV 마스킹에서 한 번에 모아 처리하는 행 수 (최대 메모리가 이 크기에 비례)
+CSV_BATCH_ROWS = int(os.getenv("PII_CSV_BATCH_ROWS", "256"))
+# 스트리밍 JSONL/JSON 배열 마스킹에서 한 번에 모아 처리하는 레코드 수
+JSON_BATCH_ITEMS = int(os.getenv("PII_JSON_BATCH_ITEMS", "256"))
+
+def _ner_to_api(raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     ents: List[Dict[str, Any]] = []
     for e in raw:
         label = e.get("entity_group") or e.get("label") or e.get("entity") or ""
@@ -29,148 +37,374 @@ def _ner_entities(text: str) -> List[Dict[str, Any]]:
     return ents
 
 
-def _collect_types_and_count(texts: List[str]) -> Tuple[List[str], int]:
-    tset: set[str] = set()
-    total = 0
-    for t in texts:
-        ents = _ner_entities(t or "")
-        for e in ents:
-            tset.add(e["type"])
-        total += len(ents)
-    return sorted(tset), total
+def _ner_entities(text: str) -> List[Dict[str, Any]]:
+    text_norm = normalize_text(text or "")
+    return _ner_to_api(ner(text_norm))
+
+
+def _types_and_total(label_counts: Dict[str, int]) -> Tuple[List[str], int]:
+    """마스킹 중 모은 라벨별 엔티티 수(mask_many의 label_counts)를 (유형 이름 목록, 총 개수)로 바꾼다."""
+    return sorted({LABELS_KOR.get(label, label) for label in label_counts}), sum(label_counts.values())
+
+
+def _json_leaves(obj: Any, out: List[Any]) -> None:
+    if isinstance(obj, dict):
+        for v in obj.values():
+            _json_leaves(v, out)
+    elif isinstance(obj, list):
+        for v in obj:
+            _json_leaves(v, out)
+    else:
+        out.append(obj)
+
+
+def _json_fill(obj: Any, values) -> Any:
+    if isinstance(obj, dict):
+        return {k: _json_fill(v, values) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_json_fill(v, values) for v in obj]
+    else:
+        return next(values)
+
+
+def mask_json_objects(objs: List[Any], state: Dict[str, Any] | None = None, to_text=str,
+                      batch_size: int | None = None, pack: bool | None = None,
+                      label_counts: Dict[str, int] | None = None) -> Tuple[List[Any], List[str]]:
+    """JSON 객체들의 leaf 값을 순회 순서대로 모아 배치 마스킹한 뒤 같은 구조로 되돌린다.
+    (마스킹된 객체 리스트, leaf 텍스트 리스트)를 반환한다. label_counts는 mask_many에 그대로 넘긴다."""
+    leaves: List[Any] = []
+    for o in objs:
+        _json_leaves(o, leaves)
+    texts = [to_text(v) for v in leaves]
+    masked = iter(mask_many(texts, state=state, batch_size=batch_size, pack=pack, label_counts=label_counts))
+    return [_json_fill(o, masked) for o in objs], texts
 
 
 def _restore_with_map(text: str, restore_map: Dict[str, str]) -> str:
-    if not restore_map:
-        return text
-    restored = text
-    for fake in sorted(restore_map.keys(), key=len, reverse=True):
-        orig = restore_map[fake]
-        restored = restored.replace(fake, orig)
-    return restored
+    return restore_text(text, restore_map)
 
 
-def detect_and_redact(text: str) -> Dict[str, Any]:
-    text_norm = normalize_text(text or "")
+@dataclass
+class Detection:
+    """텍스트 한 건의 검출 결과. 정규화와 NER은 한 번만 수행하고 마스킹/가짜값/통계는 여기서 렌더링한다.
+    norm(정규화 뷰)이 있으면 결과를 원문 위치에 끼워 넣은 *_original 렌더링도 만들 수 있다."""
+    original_text: str
+    text: str
+    ner_results: List[Dict[str, Any]] = field(default_factory=list)
+    entities: List[Dict[str, Any]] = field(default_factory=list)
+    fake_entities: List[Dict[str, Any]] = field(default_factory=list)
+    norm: NormalizedText | None = None
+
+    def masked(self, state: Dict[str, Any] | None = None) -> str:
+        return mask_entities_with_indexing(self.text, self.entities, state=state)
+
+    def fake(self, state: Dict[str, Any] | None = None) -> str:
+        return replace_entities_with_fake(self.text, self.fake_entities, state=state)
+
+    def masked_with_offsets(self, state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
+        return mask_entities_with_offsets(self.text, self.entities, state=state)
+
+    def fake_with_offsets(self, state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
+        return replace_entities_with_fake_offsets(self.text, self.fake_entities, state=state)
+
+    def masked_original(self, state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
+        return self.splice_original(*self.masked_with_offsets(state=state))
+
+    def fake_original(self, state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
+        return self.splice_original(*self.fake_with_offsets(state=state))
+
+    def _view(self) -> NormalizedText:
+        if self.norm is None:
+            self.norm = normalize(self.original_text or "")
+        return self.norm
+
+    def splice_original(self, rendered: str, spans: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """정규화 텍스트 기준 치환 결과를 원문 위치로 옮겨 원문에 적용한다. (반환 spans의 src_*는 원문 기준)"""
+        view = self._view()
+        mapped = view.map_replacements([(s["src_start"], s["src_end"], rendered[s["start"]:s["end"]]) for s in spans])
+        out, offsets = rewrite_spans(view.original, [m[:3] for m in mapped])
+        return out, [
+            {"label": spans[m[3][0]]["label"], "start": o[2], "end": o[3], "src_start": o[0], "src_end": o[1]}
+            for m, o in zip(mapped, offsets)
+        ]
+
+    def api_entities(self) -> List[Dict[str, Any]]:
+        view = self._view()
+        out: List[Dict[str, Any]] = []
+        for e in self.entities:
+            label = e.get("entity_group") or ""
+            start, end = int(e.get("start", 0)), int(e.get("end", 0))
+            orig_start, orig_end = view.to_original(start, end)
+            out.append({
+                "label": label,
+                "type": LABELS_KOR.get(label, label),
+                "word": e.get("word", ""),
+                "start": start,
+                "end": end,
+                "original_start": orig_start,
+                "original_end": orig_end,
+                "score": float(e.get("score", 1.0)),
+            })
+        return out
+
+    def types(self) -> List[str]:
+        return sorted({LABELS_KOR.get(e.get("entity_group"), e.get("entity_group")) for e in self.entities})
+
 
-    entities = _ner_entities(text_norm)
-    types = sorted({e["type"] for e in entities})
+def detect(text: str, stages: Dict[str, bool] | None = None) -> Detection:
+    view = normalize(text or "")
+    text_norm = view.text
+    ner_results = ner(text_norm)
+    scan = scan_text(text_norm)
+    return Detection(
+        original_text=text,
+        text=text_norm,
+        ner_results=ner_results,
+        entities=detect_entities(text_norm, ner_results=ner_results, scan=scan, stages=stages),
+        fake_entities=detect_fake_entities(text_norm, ner_results=ner_results, scan=scan),
+        norm=view,
+    )
 
-    redacted = mask_one(text_norm, state=None)
+
+def detect_many(texts: List[str], batch_size: int | None = None,
+                stages: Dict[str, bool] | None = None) -> List[Detection]:
+    views = [normalize(t or "") for t in texts]
+    norms = [v.text for v in views]
+    raws = ner_many(norms, batch_size=batch_size)
+    scans = [scan_text(n) for n in norms]
+    return [
+        Detection(
+            original_text=t,
+            text=n,
+            ner_results=raw,
+            entities=detect_entities(n, ner_results=raw, scan=sc, stages=stages),
+            fake_entities=detect_fake_entities(n, ner_results=raw, scan=sc),
+            norm=v,
+        )
+        for t, v, n, raw, sc in zip(texts, views, norms, raws, scans)
+    ]
+
+
+def detect_and_redact(text: str, stages: Dict[str, bool] | None = None) -> Dict[str, Any]:
+    det = detect(text, stages=stages)
+
+    redacted, redacted_spans = det.masked_with_offsets(state=None)
 
     state_for_fake: Dict[str, Any] = {}
-    fake_text = fake_one(text_norm, state=state_for_fake)
+    fake_text, fake_spans = det.fake_with_offsets(state=state_for_fake)
     fake_map: Dict[str, str] = state_for_fake.get("fake_map", {})  
     restore_map: Dict[str, str] = {v: k for k, v in fake_map.items()}  
 
     restored_example = _restore_with_map(fake_text, restore_map)
+    redacted_original, redacted_original_spans = det.splice_original(redacted, redacted_spans)
+    fake_original, fake_original_spans = det.splice_original(fake_text, fake_spans)
 
     return {
         "ok": True,
         "original_text": text,
         "redacted_text": redacted,
-        "entities": entities,
-        "types": types,
+        "redacted_spans": redacted_spans,
+        "redacted_original": redacted_original,
+        "redacted_original_spans": redacted_original_spans,
+        "entities": det.api_entities(),
+        "types": det.types(),
         "fake_text": fake_text,
+        "fake_spans": fake_spans,
+        "fake_original": fake_original,
+        "fake_original_spans": fake_original_spans,
         "fake_map": fake_map,
         "restore_map": restore_map,
         "restored_example": restored_example,
     }
 
 
-def mask_csv_bytes(name: str, data: bytes) -> Dict[str, Any]:
-    sio = io.StringIO(data.decode("utf-8", errors="ignore"))
-    reader = csv.DictReader(sio)
-    rows = list(reader)
-    headers = list(reader.fieldnames or [])
+class Base64Sink:
+    """바이트 청크를 받는 대로 base64로 인코딩해 out(str 청크를 받는 함수)에 넘긴다.
+    3바이트 경계에 못 미친 꼬리만 들고 있다가 다음 청크와 잇고, close()에서 패딩과 함께 내보낸다.
+    청크들의 결과를 이어 붙이면 전체를 한 번에 인코딩한 것과 같다."""
+
+    def __init__(self, out: Callable[[str], Any]):
+        self._out = out
+        self._rest = b""
+
+    def write(self, chunk: bytes) -> None:
+        data = self._rest + chunk
+        cut = len(data) - len(data) % 3
+        if cut:
+            self._out(base64.b64encode(data[:cut]).decode("ascii"))
+        self._rest = data[cut:]
 
-    row_texts = [" | ".join(str(r.get(h, "") or "") for h in headers) for r in rows]
-    types, total = _collect_types_and_count(row_texts)
+    def close(self) -> None:
+        if self._rest:
+            self._out(base64.b64encode(self._rest).decode("ascii"))
+            self._rest = b""
 
-    state: Dict[str, Any] = {}
+
+def mask_csv_stream(src: BinaryIO | bytes, sink: Any, batch_rows: int | None = None,
+                    preview_limit: int = 5) -> Dict[str, Any]:
+    """CSV를 행 단위로 읽어 batch_rows개씩 마스킹하고, 마스킹된 CSV 바이트를 배치마다 sink.write()로 내보낸다.
+    유형 통계는 마스킹에서 검출한 엔티티로 세고(검출을 다시 하지 않음) 미리보기도 같은 한 번의 순회에서 모으므로,
+    메모리는 파일 크기가 아니라 배치 크기에 비례한다. 인덱싱 state는 파일 전체에서 공유하므로 결과는 전체를 한 번에 마스킹한 것과 같다.
+    즉 [유형_N] 번호는 셀마다 새로 매기지 않고 파일 전체에서 이어지며, 같은 값은 어느 행에서든 같은 토큰이 된다.
+    {"headers", "rows", "types", "total_count", "preview"}를 반환한다."""
+    batch_rows = batch_rows or CSV_BATCH_ROWS
+    raw = io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src
+    text = io.TextIOWrapper(raw, encoding="utf-8", errors="ignore", newline="")
+    counts: Dict[str, int] = {}
+    n_rows = 0
     preview: List[Dict[str, Any]] = []
-    for i, row in enumerate(rows[:5]):
-        orig = {h: row.get(h, "") for h in headers}
-        masked = {h: mask_one(str(row.get(h, "") or ""), state=state) for h in headers}
-        preview.append({"kind": "csv_row", "index": i, "original": orig, "masked": masked})
-
-    out_sio = io.StringIO()
-    w = csv.DictWriter(out_sio, fieldnames=headers)
-    if headers:
-        w.writeheader()
-    state_all: Dict[str, Any] = {}
-    for row in rows:
-        w.writerow({h: mask_one(str(row.get(h, "") or ""), state=state_all) for h in headers})
-    out_bytes = out_sio.getvalue().encode("utf-8")
+    state = new_job_state()
+    try:
+        reader = csv.DictReader(text)
+        headers = list(reader.fieldnames or [])
+        out_sio = io.StringIO()
+        w = csv.writer(out_sio)
+        if headers:
+            w.writerow(headers)
+
+        def flush(rows: List[Dict[str, Any]]) -> None:
+            nonlocal n_rows
+            n = len(headers)
+            cells = [str(row.get(h, "") or "") for row in rows for h in headers]
+            masked_cells = mask_many(cells, state=state, label_counts=counts)
+            for i, row in enumerate(rows):
+                masked = masked_cells[i * n:(i + 1) * n]
+                w.writerow(masked)
+                if n_rows + i < preview_limit:
+                    orig = {h: row.get(h, "") for h in headers}
+                    preview.append({"kind": "csv_row", "index": n_rows + i, "original": orig,
+                                    "masked": dict(zip(headers, masked))})
+            n_rows += len(rows)
+            sink.write(out_sio.getvalue().encode("utf-8"))
+            out_sio.seek(0)
+            out_sio.truncate()
+
+        batch: List[Dict[str, Any]] = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                flush(batch)
+                batch = []
+        if batch or out_sio.tell():
+            flush(batch)
+    finally:
+        release_job_state(state)
+        if not isinstance(src, (bytes, bytearray)):
+            text.detach()  # 호출자의 스트림은 닫지 않는다
+    types, total = _types_and_total(counts)
+    return {"headers": headers, "rows": n_rows, "types": types, "total_count": total, "preview": preview}
+
+
+def mask_csv_bytes(name: str, data: bytes) -> Dict[str, Any]:
+    chunks: List[str] = []
+    b64 = Base64Sink(chunks.append)
+    summary = mask_csv_stream(data, b64)
+    b64.close()
 
     return {
         "ok": True,
         "original_name": name,
-        "types": types,
-        "total_count": int(total),
-        "preview": preview,
-        "masked_base64": base64.b64encode(out_bytes).decode("ascii"),
+        "types": summary["types"],
+        "total_count": int(summary["total_count"]),
+        "preview": summary["preview"],
+        "masked_base64": "".join(chunks),
         "masked_mime": "text/csv",
         "masked_name": f"masked_{name or 'data.csv'}",
     }
 
-def mask_json_bytes(name: str, data: bytes, is_jsonl: bool = False) -> Dict[str, Any]:
-    text = data.decode("utf-8", errors="ignore").strip()
-
-    preview_limit = 5
-    state: Dict[str, Any] = {}
+def _mask_json_document(obj: Any, state: Dict[str, Any], to_text=str, preview_limit: int = 5,
+                        label_counts: Dict[str, int] | None = None) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """최상위가 배열이 아닌 JSON 값 하나를 통째로 마스킹한다. (마스킹된 JSON 바이트, 미리보기)"""
+    (masked,), _ = mask_json_objects([obj], state=state, to_text=to_text, label_counts=label_counts)
     preview: List[Dict[str, Any]] = []
-    values_for_stats: List[str] = []
-
-    def _mask_json(obj: Any) -> Any:
-        if isinstance(obj, dict):
-            return {k: _mask_json(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [_mask_json(v) for v in obj]
-        else:
-            values_for_stats.append(str(obj))
-            return mask_one(str(obj), state=state)
-
-    if is_jsonl:
-        items: List[Any] = []
-        for line in text.splitlines():
-            if not line.strip():
-                continue
-            try:
-                items.append(json.loads(line))
-            except Exception:
-                items.append({"_raw": line})
-        masked_items = [_mask_json(o) for o in items]
-
-        for i, (o, m) in enumerate(zip(items[:preview_limit], masked_items[:preview_limit])):
-            preview.append({"kind": "json_obj", "index": i, "original": o, "masked": m})
-
-        out_text = "\n".join(json.dumps(o, ensure_ascii=False) for o in masked_items)
-        out_bytes = out_text.encode("utf-8")
-        masked_mime = "application/x-ndjson"
-        masked_name = f"masked_{name or 'data.jsonl'}"
+    if isinstance(obj, dict):
+        for k in list(obj.keys())[:preview_limit]:
+            preview.append({"kind": "json_field", "path": k, "original": obj.get(k), "masked": masked.get(k)})
     else:
-        try:
-            obj = json.loads(text)
-        except Exception:
-            obj = text  
-
-        masked = _mask_json(obj)
-
-        if isinstance(obj, list):
-            for i, (o, m) in enumerate(zip(obj[:preview_limit], masked[:preview_limit])):
-                preview.append({"kind": "json_item", "index": i, "original": o, "masked": m})
-        elif isinstance(obj, dict):
-            for k in list(obj.keys())[:preview_limit]:
-                preview.append({"kind": "json_field", "path": k, "original": obj.get(k), "masked": masked.get(k)})
+        preview.append({"kind": "json_scalar", "original": obj, "masked": masked})
+    return json.dumps(masked, ensure_ascii=False, indent=2).encode("utf-8"), preview
+
+
+def mask_json_stream(src: BinaryIO | bytes, sink: Any, is_jsonl: bool = False, batch_items: int | None = None,
+                     preview_limit: int = 5, to_text=str) -> Dict[str, Any]:
+    """JSONL은 한 줄씩, 최상위가 배열인 JSON은 원소 하나씩 읽어 batch_items개씩 마스킹하고 결과를 sink.write()로 내보낸다.
+    출력은 전체를 json.dumps한 것과 같다. (JSONL은 한 줄에 하나, JSON 배열은 indent=2)
+    최상위가 배열이 아닌 JSON은 나눌 수 없으므로 통째로 읽어 처리한다.
+    유형 통계는 배치마다 마스킹에서 검출한 엔티티로 센다.
+    JSON 형식이 잘못되었으면 json.JSONDecodeError를 던지며, 그때까지의 출력은 이미 sink에 쓰였을 수 있다.
+    {"items", "types", "total_count", "preview"}를 반환한다."""
+    batch_items = batch_items or JSON_BATCH_ITEMS
+    raw = io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src
+    text = io.TextIOWrapper(raw, encoding="utf-8", errors="ignore", newline=None if is_jsonl else "")
+    counts: Dict[str, int] = {}
+    n_items = 0
+    preview: List[Dict[str, Any]] = []
+    state = new_job_state()
+    try:
+        if is_jsonl:
+            kind, records = "json_obj", iter_jsonl(text)
+            first, sep, close, empty = "", "\n", "", ""
+            dump = lambda o: json.dumps(o, ensure_ascii=False)
         else:
-            preview.append({"kind": "json_scalar", "original": obj, "masked": masked})
+            head = read_head(text)
+            if not head.startswith("["):
+                out_bytes, preview = _mask_json_document(json.loads(head + text.read()), state, to_text=to_text,
+                                                         preview_limit=preview_limit, label_counts=counts)
+                sink.write(out_bytes)
+                types, total = _types_and_total(counts)
+                return {"items": 1, "types": types, "total_count": total, "preview": preview}
+            kind, records = "json_item", iter_json_array(text, head)
+            first, sep, close, empty = "[\n  ", ",\n  ", "\n]", "[]"
+            # 배열 원소는 한 단계 안쪽이므로 원소의 indent=2 출력을 두 칸 더 들여 쓴다 (문자열 안의 줄바꿈은 이스케이프됨)
+            dump = lambda o: json.dumps(o, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+
+        def flush(batch: List[Any]) -> None:
+            nonlocal n_items
+            masked_items, _ = mask_json_objects(batch, state=state, to_text=to_text, label_counts=counts)
+            parts: List[str] = []
+            for i, (o, m) in enumerate(zip(batch, masked_items)):
+                if n_items + i < preview_limit:
+                    preview.append({"kind": kind, "index": n_items + i, "original": o, "masked": m})
+                parts.append((sep if n_items + i else first) + dump(m))
+            n_items += len(batch)
+            sink.write("".join(parts).encode("utf-8"))
 
-        out_bytes = json.dumps(masked, ensure_ascii=False, indent=2).encode("utf-8")
-        masked_mime = "application/json"
-        masked_name = f"masked_{name or 'data.json'}"
+        batch: List[Any] = []
+        for rec in records:
+            batch.append(rec)
+            if len(batch) >= batch_items:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        sink.write((close if n_items else empty).encode("utf-8"))
+    finally:
+        release_job_state(state)
+        if not isinstance(src, (bytes, bytearray)):
+            text.detach()  # 호출자의 스트림은 닫지 않는다
+    types, total = _types_and_total(counts)
+    return {"items": n_items, "types": types, "total_count": total, "preview": preview}
 
-    types, total = _collect_types_and_count(values_for_stats)
+
+def mask_json_bytes(name: str, data: bytes, is_jsonl: bool = False) -> Dict[str, Any]:
+    chunks: List[str] = []
+    b64 = Base64Sink(chunks.append)
+    try:
+        summary = mask_json_stream(data, b64, is_jsonl=is_jsonl)
+        b64.close()
+        types, total, preview = summary["types"], summary["total_count"], summary["preview"]
+    except json.JSONDecodeError:
+        # JSON이 아니면 전체 텍스트를 문자열 값 하나로 마스킹한다
+        chunks = []
+        counts: Dict[str, int] = {}
+        state = new_job_state()
+        try:
+            out_bytes, preview = _mask_json_document(data.decode("utf-8", errors="ignore").strip(), state,
+                                                     label_counts=counts)
+        finally:
+            release_job_state(state)
+        chunks.append(base64.b64encode(out_bytes).decode("ascii"))
+        types, total = _types_and_total(counts)
 
     return {
         "ok": True,
@@ -178,7 +412,7 @@ def mask_json_bytes(name: str, data: bytes, is_jsonl: bool = False) -> Dict[str,
         "types": types,
         "total_count": int(total),
         "preview": preview,
-        "masked_base64": base64.b64encode(out_bytes).decode("ascii"),
-        "masked_mime": masked_mime,
-        "masked_name": masked_name,
+        "masked_base64": "".join(chunks),
+        "masked_mime": "application/x-ndjson" if is_jsonl else "application/json",
+        "masked_name": f"masked_{name or ('data.jsonl' if is_jsonl else 'data.json')}",
     }
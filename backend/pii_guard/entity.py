@@ -0,0 +1,66 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator
+
+'''
+검출 단계 사이를 오가는 엔티티 span 레코드. (__slots__, 생성 후 변경하지 않는다)
+기존 dict 엔티티와 같은 키 조회(e["start"], e.get("word"))를 지원하므로 단계 함수들이 그대로 읽을 수 있고,
+바꿀 때는 replace()로 새 레코드를 만든다. dict가 필요한 API 경계에서만 to_dict()로 변환한다.
+'''
+class Span:
+    __slots__ = ("entity_group", "word", "start", "end", "score", "_source")
+    KEYS = __slots__
+
+    def __init__(self, entity_group: str, word: str, start: int, end: int,
+                 score: float = 1.0, _source: str | None = None):
+        self.entity_group = entity_group
+        self.word = word
+        self.start = start
+        self.end = end
+        self.score = score
+        self._source = _source
+
+    @classmethod
+    def from_dict(cls, e: Dict[str, Any]) -> "Span":
+        return e if isinstance(e, Span) else cls(
+            e.get("entity_group"), e.get("word", ""), e.get("start"), e.get("end"),
+            e.get("score", 1.0), e.get("_source"))
+
+    def replace(self, **changes: Any) -> "Span":
+        vals = {k: getattr(self, k) for k in self.KEYS}
+        vals.update(changes)
+        return Span(**vals)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS or (key == "_source" and self._source is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.KEYS:
+            return default
+        val = getattr(self, key)
+        return default if val is None else val
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.KEYS and (key != "_source" or self._source is not None)
+
+    def keys(self) -> Iterator[str]:
+        return (k for k in self.KEYS if k != "_source" or self._source is not None)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.keys()}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Span):
+            return all(getattr(self, k) == getattr(other, k) for k in self.KEYS)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Span({self.entity_group!r}, {self.word!r}, {self.start}, {self.end}, {self.score})"
@@ -0,0 +1,245 @@
+from __future__ import annotations
+import os
+import threading
+from collections import deque
+from math import gcd
+from typing import Callable, Deque, Dict, List
+
+import numpy as np
+
+# 가짜값 생성 시드 (비우면 실행마다 다름)
+FAKE_SEED = os.getenv("PII_FAKE_SEED")
+# 풀 한 번에 생성하는 개수. 남은 개수가 절반 아래로 떨어지면 백그라운드에서 다음 배치를 만든다.
+FAKE_POOL_BATCH = int(os.getenv("PII_FAKE_POOL_BATCH", "1024"))
+
+SURNAMES = list("김이박최정강조윤장임한오서신권황안송류전홍고문양손배백허유남심노하곽성차주우구민진나지엄변채원천방공현함염여추도소석선설마길연위표명기반왕금옥육인맹제모탁국어은편용")
+GIVEN_SYLLABLES = list("민서준지하윤도현우예수은주진영연성재정훈호원아유희경태동상혜미승나소다채가린빈건환석규철기선인용범한율솔별결")
+EMAIL_WORDS = ["user", "mail", "contact", "hello", "guest", "member", "info", "client"]
+EMAIL_DOMAINS = ["example.com", "example.net", "example.org"]
+CARD_PREFIXES = ["453201", "455673", "516732", "523941", "940412", "944116"]
+ACCT_PREFIXES = ["110", "302", "352", "621", "901"]
+SSN_BIRTH_START = np.datetime64("1950-01-01")
+SSN_BIRTH_DAYS = int((np.datetime64("2005-12-31") - SSN_BIRTH_START).astype(int)) + 1
+SSN_WEIGHTS = np.array([2, 3, 4, 5, 6, 7, 8, 9, 2, 3, 4, 5], dtype=np.int64)
+
+'''
+[0, n) 위의 아핀 치환 k → (a·k + b) mod n. (gcd(a, n) = 1이면 전단사)
+카운터를 차례로 넣으면 n개를 다 쓸 때까지 같은 값이 나오지 않는다. n은 a·k가 uint64를 넘지 않도록 3·10^9 미만으로 둔다.
+'''
+class AffinePermutation:
+    def __init__(self, n: int, rng: np.random.Generator):
+        if not 0 < n < 3_000_000_000:
+            raise ValueError("permutation size out of range")
+        self.n = n
+        a = int(rng.integers(1, n)) if n > 1 else 1
+        while gcd(a, n) != 1:
+            a = a + 1 if a + 1 < n else 1
+        self.a = a
+        self.b = int(rng.integers(0, n))
+
+    def __call__(self, ks: np.ndarray) -> np.ndarray:
+        return (ks.astype(np.uint64) * np.uint64(self.a) + np.uint64(self.b)) % np.uint64(self.n)
+
+'''
+숫자 배열을 자릿수 행렬(행마다 width자리, 앞자리부터)로 펼친다.
+'''
+def digits_of(values: np.ndarray, width: int) -> np.ndarray:
+    powers = np.uint64(10) ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+    return ((values.astype(np.uint64)[:, None] // powers) % np.uint64(10)).astype(np.int64)
+
+'''
+앞자리 행렬에 이어 붙일 Luhn 검증 숫자를 구한다.
+'''
+def luhn_digits(body: np.ndarray) -> np.ndarray:
+    d = body[:, ::-1].copy()
+    doubled = d[:, 0::2] * 2
+    d[:, 0::2] = doubled - 9 * (doubled > 9)
+    return (10 - d.sum(axis=1) % 10) % 10
+
+'''
+주민등록번호 앞 12자리 행렬의 검증 숫자를 구한다. (validate_ssn과 같은 규칙)
+'''
+def ssn_check_digits(body: np.ndarray) -> np.ndarray:
+    return (11 - (body @ SSN_WEIGHTS) % 11) % 10
+
+def _join(rows: np.ndarray) -> List[str]:
+    return ["".join(map(str, r)) for r in rows.tolist()]
+
+'''
+라벨별 가짜값 생성기. 카운터 구간 [k0, k0+count)을 받아 형식이 맞는 값 리스트를 만든다.
+값은 카운터를 아핀 치환한 번호에서 정해지므로, 한 치환 주기 안에서는 중복이 없다.
+'''
+def _gen_name(idx: np.ndarray) -> List[str]:
+    g = len(GIVEN_SYLLABLES)
+    s, rest = idx // (g * g), idx % (g * g)
+    return [SURNAMES[a] + GIVEN_SYLLABLES[b] + GIVEN_SYLLABLES[c]
+            for a, b, c in zip(s.tolist(), (rest // g).tolist(), (rest % g).tolist())]
+
+def _gen_phone(idx: np.ndarray) -> List[str]:
+    mid, last = 1000 + idx // 10000, idx % 10000
+    return [f"010-{m:04d}-{l:04d}" for m, l in zip(mid.tolist(), last.tolist())]
+
+def _gen_email(idx: np.ndarray) -> List[str]:
+    w, d = len(EMAIL_WORDS), len(EMAIL_DOMAINS)
+    return [f"{EMAIL_WORDS[i % w]}{i // (w * d):06d}@{EMAIL_DOMAINS[(i // w) % d]}" for i in idx.tolist()]
+
+def _gen_ssn(idx: np.ndarray) -> List[str]:
+    day, serial = idx // 100000, idx % 100000
+    born = SSN_BIRTH_START + day.astype("timedelta64[D]")
+    year = born.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = born.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    mday = (born - born.astype("datetime64[M]")).astype(np.int64) + 1
+    gender = np.where(year >= 2000, 3, 1) + (serial % 2)
+    front = (year % 100) * 10000 + month * 100 + mday
+    body = np.concatenate([digits_of(front, 6), gender.astype(np.int64)[:, None], digits_of(serial, 5)], axis=1)
+    check = ssn_check_digits(body)
+    return [f"{f:06d}-{g}{s:05d}{c}" for f, g, s, c in
+            zip(front.tolist(), gender.tolist(), serial.tolist(), check.tolist())]
+
+def _gen_card(prefix: str) -> Callable[[np.ndarray], List[str]]:
+    head = np.array([int(c) for c in prefix], dtype=np.int64)
+    def gen(idx: np.ndarray) -> List[str]:
+        body = np.concatenate([np.broadcast_to(head, (len(idx), len(head))), digits_of(idx, 9)], axis=1)
+        full = _join(np.concatenate([body, luhn_digits(body)[:, None]], axis=1))
+        return [f"{n[0:4]}-{n[4:8]}-{n[8:12]}-{n[12:16]}" for n in full]
+    return gen
+
+def _gen_acct(prefix: str) -> Callable[[np.ndarray], List[str]]:
+    return lambda idx: [f"{prefix}{i:09d}" for i in idx.tolist()]
+
+def _gen_dln(idx: np.ndarray) -> List[str]:
+    region, rest = 11 + idx // 100_000_000, idx % 100_000_000
+    year, serial = rest // 1_000_000, rest % 1_000_000
+    check = (serial * 7 + year * 3 + region) % 90 + 10
+    return [f"{r:02d}-{y:02d}-{s:06d}-{c:02d}" for r, y, s, c in
+            zip(region.tolist(), year.tolist(), serial.tolist(), check.tolist())]
+
+def _gen_pass(idx: np.ndarray) -> List[str]:
+    return [f"P{i:08d}" for i in idx.tolist()]
+
+'''
+한 라벨의 가짜값 풀. 값을 배치로 미리 만들어 두고 take()로 하나씩 꺼낸다.
+남은 값이 batch/2 아래로 떨어지면 백그라운드 스레드(동시에 하나만)가 다음 배치를 채우고, 비어 있으면 그 자리에서 만든다.
+배치는 카운터 순서대로 한 번에 하나씩 만들기 때문에 같은 시드면 꺼내는 순서도 같다.
+중복 없음은 풀 하나에서 꺼낸 처음 size개까지만 보장한다. 치환 주기(size개)를 다 쓰면 새 치환으로
+다음 주기를 시작하며, 이때부터는 이전 주기 값과 겹칠 수 있다. (pool_specs의 번호 공간 크기가 곧 한도)
+'''
+class FakePool:
+    def __init__(self, label: str, size: int, gen: Callable[[np.ndarray], List[str]],
+                 rng: np.random.Generator, batch: int = FAKE_POOL_BATCH):
+        self.label = label
+        self.size = size
+        self.batch = max(1, min(batch, size))
+        self._gen = gen
+        self._rng = rng
+        self._perm = AffinePermutation(size, rng)
+        self._counter = 0
+        self._values: Deque[str] = deque()
+        self._gen_lock = threading.Lock()
+        self._refill_lock = threading.Lock()  # 잡고 있는 동안 백그라운드 채우기가 진행 중
+
+    def _generate(self) -> None:
+        with self._gen_lock:
+            if self._counter >= self.size:
+                self._perm = AffinePermutation(self.size, self._rng)
+                self._counter = 0
+            k0 = self._counter
+            count = min(self.batch, self.size - k0)
+            ks = np.arange(k0, k0 + count, dtype=np.uint64)
+            self._values.extend(self._gen(self._perm(ks).astype(np.int64)))
+            self._counter = k0 + count
+
+    def _refill(self) -> None:
+        try:
+            self._generate()
+        finally:
+            self._refill_lock.release()
+
+    def take(self) -> str:
+        while True:
+            try:
+                value = self._values.popleft()
+                break
+            except IndexError:
+                self._generate()
+        if len(self._values) < self.batch // 2 and self._refill_lock.acquire(blocking=False):
+            try:
+                threading.Thread(target=self._refill, name=f"fake-pool-{self.label}", daemon=True).start()
+            except BaseException:
+                self._refill_lock.release()
+                raise
+        return value
+
+'''
+라벨별 (번호 공간 크기, 생성기). CC/ACCT는 앞자리(prefix)를 받아 생성기를 만든다.
+'''
+def pool_specs(card_prefix: str, acct_prefix: str) -> Dict[str, tuple]:
+    g = len(GIVEN_SYLLABLES)
+    return {
+        "NAME": (len(SURNAMES) * g * g, _gen_name),
+        "PHONE": (9000 * 10000, _gen_phone),
+        "EMAIL": (len(EMAIL_WORDS) * len(EMAIL_DOMAINS) * 1_000_000, _gen_email),
+        "SSN": (SSN_BIRTH_DAYS * 100000, _gen_ssn),
+        "CC": (10 ** 9, _gen_card(card_prefix)),
+        "ACCT": (10 ** 9, _gen_acct(acct_prefix)),
+        "DLN": (18 * 100_000_000, _gen_dln),
+        "PASS": (10 ** 8, _gen_pass),
+    }
+
+_KEYED_SPECS = {(c, a): pool_specs(c, a) for c in CARD_PREFIXES for a in ACCT_PREFIXES}
+
+'''
+큰 정수 n(예: 키 해시)에서 라벨의 가짜값 하나를 정한다. 같은 n이면 어디서나 같은 값이다.
+CC/ACCT 앞자리도 n에서 고른다. 번호 공간이 유한하므로 서로 다른 n이 같은 값을 낼 수 있다.
+'''
+def fake_at(label: str, n: int) -> str:
+    card_prefix = CARD_PREFIXES[n % len(CARD_PREFIXES)]
+    n //= len(CARD_PREFIXES)
+    acct_prefix = ACCT_PREFIXES[n % len(ACCT_PREFIXES)]
+    n //= len(ACCT_PREFIXES)
+    size, gen = _KEYED_SPECS[(card_prefix, acct_prefix)][label]
+    return gen(np.array([n % size], dtype=np.int64))[0]
+
+'''
+라벨별 가짜값 풀 묶음. 시드 하나에서 라벨마다 독립 난수열을 나눠 쓴다.
+'''
+class FakePools:
+    def __init__(self, seed: int | None = None, batch: int = FAKE_POOL_BATCH):
+        root = np.random.SeedSequence(seed)
+        rngs = [np.random.default_rng(s) for s in root.spawn(9)]
+        pick = rngs.pop()
+        card_prefix = CARD_PREFIXES[int(pick.integers(len(CARD_PREFIXES)))]
+        acct_prefix = ACCT_PREFIXES[int(pick.integers(len(ACCT_PREFIXES)))]
+        self._pools: Dict[str, FakePool] = {
+            label: FakePool(label, size, gen, rng, batch=batch)
+            for (label, (size, gen)), rng in zip(pool_specs(card_prefix, acct_prefix).items(), rngs)
+        }
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._pools
+
+    def take(self, label: str) -> str:
+        return self._pools[label].take()
+
+_pools_lock = threading.Lock()
+_pools: FakePools | None = None
+
+'''
+프로세스 공용 가짜값 풀. 처음 호출할 때 PII_FAKE_SEED로 만든다.
+'''
+def fake_pools() -> FakePools:
+    global _pools
+    if _pools is None:
+        with _pools_lock:
+            if _pools is None:
+                _pools = FakePools(int(FAKE_SEED) if FAKE_SEED else None)
+    return _pools
+
+'''
+공용 풀을 주어진 시드로 다시 만든다. (재현 가능한 가짜값이 필요할 때)
+'''
+def reset_fake_pools(seed: int | None = None) -> FakePools:
+    global _pools
+    with _pools_lock:
+        _pools = FakePools(seed)
+    return _pools
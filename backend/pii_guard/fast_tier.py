@@ -0,0 +1,261 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .cache import LRUCache
+from .model_registry import get_kiwi
+from .rules import PHONE_SEARCH_RE, scan_text
+
+# 검출 모드: full(모든 텍스트에 NER) / tiered(정규식·사전 단계에서 단서가 있을 때만 NER)
+DETECTION_MODE = os.getenv("PII_DETECTION_MODE", "full").strip().lower()
+
+# 성씨/행정구역 사전
+GAZETTEER_PATH = Path(__file__).parent / "data" / "gazetteer.json"
+
+# 이름 단서: 한글 어절, 대문자로 시작하는 라틴 단어
+HANGUL_RUN_RE = re.compile(r"[가-힣]+")
+LATIN_NAME_RE = re.compile(r"\b[A-Z][a-z]+\b")
+# 주소 단서: 번지/도로명 형태
+ADDR_HINT_RE = re.compile(r"[가-힣\d](?:번길|대로|로|길)\s*\d+|\d+\s*(?:번지|동|호|층)(?![가-힣])")
+
+# 이름 단서로 보는 어절 길이(호칭/조사를 뗀 뒤, 성 포함 음절 수)
+NAME_MIN_SYLLABLES, NAME_MAX_SYLLABLES = 2, 4
+# Kiwi가 없을 때 어절 끝에서 떼어 내는 호칭/조사와, 이름 단서에서 제외하는 용언 어미
+NAME_SUFFIX_RE = re.compile(r"(?:님|씨)?(?:께서|에게|한테|이고|이랑|으로|이|가|은|는|을|를|의|와|과|도|께|로|랑)?$")
+VERB_ENDING_RE = re.compile(r"(?:니다|세요|어요|아요|해요|다|요|까|죠|게|며|면|서)$")
+# Kiwi 분석에서 이름 뒤에 붙어 떼어 내는 형태소, 보통명사류(한 형태소면 이름이 아닌 단어), 용언 표지
+_NAME_TAIL_FORMS = {"님", "씨"}
+_COMMON_TAGS = ("NNG", "NNB", "MAG", "MAJ", "MM", "NR", "NP", "IC", "XR")
+_VERB_TAGS = ("VV", "VA", "VX")
+_DERIVED_VERB_TAGS = ("XSV", "XSA")
+
+# 어절별 이름 단서 판정 캐시 (어절 → bool)
+_name_cue_cache = LRUCache(int(os.getenv("PII_NAME_CUE_CACHE_SIZE", "20000")), name="name_cue")
+
+_END = ""
+
+'''
+문자 단위 트라이. 사전 단어를 등록하고 텍스트 위치에서 가장 긴 일치를 찾는다.
+'''
+class Trie:
+    def __init__(self, words: Sequence[str] = ()):
+        self.root: Dict[str, Any] = {}
+        self.size = 0
+        for w in words:
+            self.add(w)
+
+    def add(self, word: str) -> None:
+        if not word:
+            return
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = word
+
+    def longest_at(self, text: str, i: int) -> int:
+        node, best, j = self.root, 0, i
+        while j < len(text):
+            node = node.get(text[j])
+            if node is None:
+                break
+            j += 1
+            if _END in node:
+                best = j - i
+        return best
+
+    def find_all(self, text: str) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        i = 0
+        while i < len(text):
+            n = self.longest_at(text, i) if text[i] in self.root else 0
+            if n:
+                out.append((i, i + n))
+                i += n
+            else:
+                i += 1
+        return out
+
+_lock = threading.Lock()
+_surnames: Trie | None = None
+_districts: Trie | None = None
+
+_stats: Dict[str, Any] = {
+    "texts": 0,
+    "ner_texts": 0,
+    "skipped_texts": 0,
+    "regex_hits": {},
+    "gazetteer_hits": {"surname": 0, "district": 0},
+    "cue_hits": {"name": 0, "addr": 0},
+}
+
+'''
+tiered 모드가 켜져 있는지 반환한다.
+'''
+def tiered_enabled() -> bool:
+    return DETECTION_MODE == "tiered"
+
+'''
+gazetteer.json에서 성씨/행정구역 트라이를 만든다.
+'''
+def _gazetteers() -> Tuple[Trie, Trie]:
+    global _surnames, _districts
+    if _surnames is None or _districts is None:
+        with _lock:
+            if _surnames is None or _districts is None:
+                with open(GAZETTEER_PATH, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                _districts = Trie(data.get("districts", []))
+                _surnames = Trie(data.get("surnames", []))
+    return _surnames, _districts
+
+# 빠른 단계에서 히트를 세는 검출 규칙
+FAST_LABELS = ("SSN", "CC", "ACCT", "PASS", "DLN", "EMAIL", "PHONE")
+
+'''
+Kiwi 분석 결과(형태소 목록)로 성씨로 시작하는 어절이 이름일 수 있는지 판정한다.
+끝의 조사/호칭(님, 씨)/서술격 조사+어미(이고, 입니다)를 뗀 나머지가 2~4글자이고,
+보통명사·부사 등 한 단어(이메일, 정보, 오늘)나 용언(정하다, 시작하다), 보통명사 두 개의 합성어(전화번호)가 아니면 단서로 본다.
+'''
+def _kiwi_name_cue(run: str, tokens) -> bool:
+    toks = list(tokens)
+    while toks and (toks[-1].tag.startswith("J") or toks[-1].form in _NAME_TAIL_FORMS):
+        toks.pop()
+    k = next((i for i, t in enumerate(toks) if t.tag == "VCP"), None)
+    if k is not None and k > 0 and all(t.tag in ("EC", "EF", "EP") for t in toks[k + 1:]):
+        toks = toks[:k]
+    if not toks:
+        return False
+    stem = toks[-1].start + toks[-1].len
+    if not NAME_MIN_SYLLABLES <= stem <= NAME_MAX_SYLLABLES:
+        return False
+    if toks[0].tag in _VERB_TAGS or any(t.tag in _DERIVED_VERB_TAGS for t in toks):
+        return False
+    if len(toks) == 1:
+        return not toks[0].tag.startswith(_COMMON_TAGS)
+    return not all(t.tag == "NNG" and t.len >= 2 for t in toks)
+
+'''
+Kiwi가 없을 때의 판정. 끝의 호칭/조사를 뗀 나머지가 2~4글자이고 용언 어미로 끝나지 않으면 단서로 본다.
+'''
+def _syllable_name_cue(run: str) -> bool:
+    stem = NAME_SUFFIX_RE.sub("", run) or run
+    return NAME_MIN_SYLLABLES <= len(stem) <= NAME_MAX_SYLLABLES and not VERB_ENDING_RE.search(stem)
+
+'''
+성씨로 시작하는 어절들이 이름 단서인지 판정한다. ({어절: bool})
+캐시에 없는 어절만 모아 Kiwi 다중 텍스트 API로 한 번에 분석한다.
+'''
+def name_cues(runs: Sequence[str]) -> Dict[str, bool]:
+    out: Dict[str, bool] = {}
+    todo: List[str] = []
+    for r in dict.fromkeys(runs):
+        c = _name_cue_cache.get(r)
+        if c is None: todo.append(r)
+        else: out[r] = c
+    if not todo:
+        return out
+    kiwi = get_kiwi()
+    if kiwi:
+        cues = [_kiwi_name_cue(r, res[0][0]) for r, res in zip(todo, kiwi.analyze(todo))]
+    else:
+        cues = [_syllable_name_cue(r) for r in todo]
+    for r, c in zip(todo, cues):
+        _name_cue_cache.put(r, c)
+        out[r] = c
+    return out
+
+'''
+텍스트 한 건을 빠른 단계로 검사한다.
+(NER 필요 여부, 정규식 라벨별 히트 수, 단서 정보)를 반환한다.
+- 이름 단서: 성씨로 시작하고 이름으로 볼 수 있는 한글 어절(name_cues), 또는 대문자로 시작하는 라틴 단어
+- 주소 단서: 행정구역 사전 일치, 또는 도로명/번지 형태
+정규식으로 잡힌 구간은 단서 검사에서 제외한다.
+'''
+def scan(text: str) -> Tuple[bool, Dict[str, int], Dict[str, int]]:
+    surnames, districts = _gazetteers()
+    hits: Dict[str, int] = {}
+    chars = list(text)
+    found = scan_text(text)
+    for label in FAST_LABELS:
+        if found[label]:
+            hits[label] = len(found[label])
+        for s, e in found[label]:
+            chars[s:e] = " " * (e - s)
+    rest = "".join(chars)
+
+    cues = {"surname": 0, "district": len(districts.find_all(rest)), "name": 0, "addr": 0}
+    runs = [m.group() for m in HANGUL_RUN_RE.finditer(rest)]
+    runs = [r for r in runs if 0 < surnames.longest_at(r, 0) < len(r)]
+    if runs:
+        named = name_cues(runs)
+        cues["surname"] = sum(1 for r in runs if named[r])
+    cues["name"] = cues["surname"] + len(LATIN_NAME_RE.findall(rest))
+    cues["addr"] = cues["district"] + len(ADDR_HINT_RE.findall(rest))
+    return bool(cues["name"] or cues["addr"]), hits, cues
+
+'''
+NER을 건너뛴 텍스트에 대해 NER 결과 형식의 엔티티를 만든다.
+후처리에서 정규식이 다루지 않는 휴대폰 번호만 생성하고 나머지 라벨은 merge_entities 단계의 정규식에 맡긴다.
+'''
+def fast_entities(text: str) -> List[Dict[str, Any]]:
+    return [{"entity_group": "PHONE", "score": 1.0, "word": m.group(), "start": m.start(), "end": m.end()}
+            for m in PHONE_SEARCH_RE.finditer(text)]
+
+'''
+텍스트들을 빠른 단계로 분류한다. NER이 필요한 인덱스 목록과
+나머지 텍스트의 빠른 단계 결과({인덱스: 엔티티 목록})를 반환하고 단계별 카운터를 갱신한다.
+'''
+def route(texts: Sequence[str]) -> Tuple[List[int], Dict[int, List[Dict[str, Any]]]]:
+    need: List[int] = []
+    fast: Dict[int, List[Dict[str, Any]]] = {}
+    regex_hits: Dict[str, int] = {}
+    gaz = {"surname": 0, "district": 0}
+    cue = {"name": 0, "addr": 0}
+    for i, t in enumerate(texts):
+        if not t or not t.strip():
+            fast[i] = []
+            continue
+        needs_ner, hits, cues = scan(t)
+        for k, v in hits.items():
+            regex_hits[k] = regex_hits.get(k, 0) + v
+        for k in gaz:
+            gaz[k] += cues[k]
+        for k in cue:
+            cue[k] += cues[k]
+        if needs_ner:
+            need.append(i)
+        else:
+            fast[i] = fast_entities(t)
+
+    with _lock:
+        _stats["texts"] += len(texts)
+        _stats["ner_texts"] += len(need)
+        _stats["skipped_texts"] += len(texts) - len(need)
+        for k, v in regex_hits.items():
+            _stats["regex_hits"][k] = _stats["regex_hits"].get(k, 0) + v
+        for k, v in gaz.items():
+            _stats["gazetteer_hits"][k] += v
+        for k, v in cue.items():
+            _stats["cue_hits"][k] += v
+    return need, fast
+
+'''
+단계별 카운터를 반환한다. skipped_texts가 NER 호출을 건너뛴 텍스트 수다.
+'''
+def tier_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "mode": DETECTION_MODE,
+            "texts": _stats["texts"],
+            "ner_texts": _stats["ner_texts"],
+            "skipped_texts": _stats["skipped_texts"],
+            "regex_hits": dict(_stats["regex_hits"]),
+            "gazetteer_hits": dict(_stats["gazetteer_hits"]),
+            "cue_hits": dict(_stats["cue_hits"]),
+        }
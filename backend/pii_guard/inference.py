@@ -0,0 +1,269 @@
+from __future__ import annotations
+import os
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .model_registry import get_ner, get_tokenizer, inference_context, max_positions
+from . import fast_tier
+
+# 배치 추론 기본 배치 크기 (환경변수로 조정)
+NER_BATCH_SIZE = int(os.getenv("PII_NER_BATCH_SIZE", "16"))
+# 짧은 셀을 한 시퀀스로 묶어 추론할지 여부 기본값
+NER_PACK = os.getenv("PII_NER_PACK", "0").strip().lower() in ("1", "true", "yes", "on")
+# 패킹 시 셀 사이에 넣는 구분자 (필드 경계 "|" 규칙과 동일)
+PACK_SEPARATOR = " | "
+# 최대 위치 수를 넘는 긴 텍스트의 슬라이딩 윈도우 설정 (토큰 단위, 0이면 모델 최대치)
+NER_WINDOW_TOKENS = int(os.getenv("PII_NER_WINDOW_TOKENS", "0"))
+NER_WINDOW_OVERLAP = int(os.getenv("PII_NER_WINDOW_OVERLAP", "128"))
+
+# 모델 호출 통계
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"calls": 0, "sequences": 0, "texts": 0, "packed_texts": 0, "windowed_texts": 0}
+
+def _count(calls: int = 0, sequences: int = 0, texts: int = 0, packed_texts: int = 0,
+           windowed_texts: int = 0) -> None:
+    with _stats_lock:
+        _stats["calls"] += calls
+        _stats["sequences"] += sequences
+        _stats["texts"] += texts
+        _stats["packed_texts"] += packed_texts
+        _stats["windowed_texts"] += windowed_texts
+
+'''
+모델 호출 횟수/시퀀스 수/처리 텍스트 수를 반환한다.
+'''
+def inference_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+'''
+텍스트 한 건에 대해 NER을 수행한다.
+모델 최대 위치 수를 넘는 텍스트는 슬라이딩 윈도우(ner_windowed)로 처리한다.
+tiered 모드(tiered=None이면 PII_DETECTION_MODE)에서는 빠른 단계에서 이름/주소 단서가 없으면 모델을 건너뛴다.
+'''
+def ner(text: str, tiered: bool | None = None, **kwargs) -> List[Dict[str, Any]]:
+    if fast_tier.tiered_enabled() if tiered is None else tiered:
+        need, fast = fast_tier.route([text])
+        if not need:
+            return fast[0]
+    if text and len(text) > _window_size() and token_lengths([text])[0] > _window_size():
+        return ner_windowed(text)
+    pipe = get_ner()
+    _count(calls=1, sequences=1, texts=1)
+    with inference_context():
+        return pipe(text, **kwargs)
+
+'''
+여러 텍스트의 NER 결과를 dict 목록 대신 압축 span 배열(SpanArrays)로 반환한다.
+벡터 디코더를 쓰는 백엔드(direct/onnx)에서만 지원하며, 한 시퀀스에 들어가는 텍스트를 전제로 한다.
+'''
+def ner_spans(texts: Sequence[str]):
+    pipe = get_ner()
+    if not hasattr(pipe, "spans"):
+        raise RuntimeError("ner_spans requires the direct or onnx backend")
+    _count(calls=1, sequences=len(texts), texts=len(texts))
+    with inference_context():
+        return pipe.spans(list(texts))
+
+'''
+텍스트별 토큰 길이(특수 토큰 제외)를 반환한다.
+'''
+def token_lengths(texts: Sequence[str]) -> List[int]:
+    if not texts:
+        return []
+    enc = get_tokenizer()(list(texts), add_special_tokens=False)
+    return [len(ids) for ids in enc["input_ids"]]
+
+'''
+시퀀스 목록을 batch_size 단위로 파이프라인에 넣고 결과 리스트를 반환한다.
+'''
+def _run_pipeline(seqs: List[str], batch_size: int) -> List[List[Dict[str, Any]]]:
+    pipe = get_ner()
+    out: List[List[Dict[str, Any]]] = []
+    for b in range(0, len(seqs), batch_size):
+        chunk = seqs[b:b + batch_size]
+        with inference_context():
+            out.extend(list(o) for o in pipe(chunk, batch_size=batch_size))
+        _count(calls=1, sequences=len(chunk))
+    return out
+
+'''
+여러 텍스트에 대해 NER을 배치로 수행한다.
+토큰 길이순으로 정렬해 비슷한 길이끼리 batch_size 단위 버킷으로 묶어 패딩 낭비를 줄이고,
+결과는 입력 순서대로 돌려준다. 빈 문자열은 모델을 거치지 않는다.
+pack=True이면 짧은 텍스트를 한 시퀀스로 묶어 추론한다(ner_packed).
+tiered 모드에서는 빠른 단계가 단서를 찾은 텍스트만 모델에 넣는다.
+'''
+def ner_many(texts: Sequence[str], batch_size: int | None = None, pack: bool | None = None,
+             tiered: bool | None = None) -> List[List[Dict[str, Any]]]:
+    if fast_tier.tiered_enabled() if tiered is None else tiered:
+        need, fast = fast_tier.route(texts)
+        results = [fast.get(i, []) for i in range(len(texts))]
+        if need:
+            outs = ner_many([texts[i] for i in need], batch_size=batch_size, pack=pack, tiered=False)
+            for i, o in zip(need, outs):
+                results[i] = o
+        return results
+    if NER_PACK if pack is None else pack:
+        return ner_packed(texts, batch_size=batch_size)
+    bs = max(1, batch_size or NER_BATCH_SIZE)
+    results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+    todo = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not todo:
+        return results
+
+    lengths = token_lengths([texts[i] for i in todo])
+    limit = _window_size()
+    long_ids = [todo[k] for k in range(len(todo)) if lengths[k] > limit]
+    order = [todo[k] for k in sorted(range(len(todo)), key=lambda k: lengths[k]) if lengths[k] <= limit]
+
+    outs = _run_pipeline([texts[i] for i in order], bs)
+    for i, o in zip(order, outs):
+        results[i] = o
+    for i in long_ids:
+        results[i] = ner_windowed(texts[i])
+    _count(texts=len(order))
+    return results
+
+'''
+윈도우 하나에 들어가는 토큰 수([CLS]/[SEP] 제외)를 반환한다.
+'''
+def _window_size() -> int:
+    budget = max_positions() - 2
+    return min(NER_WINDOW_TOKENS, budget) if NER_WINDOW_TOKENS > 0 else budget
+
+'''
+토큰 오프셋 기준으로 (문자 시작, 문자 끝, 소유 구간 시작, 소유 구간 끝) 윈도우 목록을 만든다.
+인접 윈도우는 overlap 토큰만큼 겹치고, 겹침 구간마다 경계 하나를 정해 앞 윈도우의 소유 끝과 뒤 윈도우의 소유 시작으로 함께 쓴다.
+따라서 소유 구간들은 [0, text_len)을 빈틈이나 겹침 없이 나눈다.
+'''
+def _windows(offsets: List[Tuple[int, int]], text_len: int, size: int,
+             overlap: int) -> List[Tuple[int, int, int, int]]:
+    n = len(offsets)
+    overlap = max(0, min(overlap, size // 2))
+    step = size - overlap
+    out: List[Tuple[int, int, int, int]] = []
+    a = own_lo = 0
+    while True:
+        b = min(a + size, n)
+        if b >= n:
+            out.append((offsets[a][0], offsets[b - 1][1], own_lo, text_len))
+            return out
+        nxt = a + step
+        seam = offsets[nxt + overlap // 2][0]
+        out.append((offsets[a][0], offsets[b - 1][1], own_lo, seam))
+        a, own_lo = nxt, seam
+
+'''
+긴 텍스트를 겹치는 토큰 윈도우로 나눠 한 배치로 NER을 수행하고, 엔티티를 문서 좌표로 합친다.
+각 엔티티는 시작 위치를 소유한 윈도우의 결과만 채택하고, 같은 라벨이 겹치면 더 긴 쪽을 남긴다.
+'''
+def ner_windowed(text: str, window_tokens: int | None = None,
+                 overlap: int | None = None) -> List[Dict[str, Any]]:
+    size = min(window_tokens, _window_size()) if window_tokens else _window_size()
+    ov = NER_WINDOW_OVERLAP if overlap is None else overlap
+    enc = get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = [tuple(o) for o in enc["offset_mapping"]]
+    if not offsets:
+        return []
+    if len(offsets) <= size:
+        return ner(text, tiered=False)
+
+    wins = _windows(offsets, len(text), size, ov)
+    outs = _run_pipeline([text[c0:c1] for c0, c1, _, _ in wins], len(wins))
+    _count(windowed_texts=1, texts=1)
+
+    ents: List[Dict[str, Any]] = []
+    for (c0, _, own_lo, own_hi), win_ents in zip(wins, outs):
+        for e in win_ents:
+            start = int(e.get("start", 0)) + c0
+            if not (own_lo <= start < own_hi):
+                continue
+            e2 = dict(e)
+            e2["start"], e2["end"] = start, int(e.get("end", 0)) + c0
+            ents.append(e2)
+
+    ents.sort(key=lambda x: (x["start"], -(x["end"] - x["start"])))
+    merged: List[Dict[str, Any]] = []
+    last_by_label: Dict[str, Dict[str, Any]] = {}
+    for e in ents:
+        label = e.get("entity_group") or e.get("entity") or ""
+        prev = last_by_label.get(label)
+        if prev is not None and e["start"] < prev["end"]:
+            if e["end"] > prev["end"] and (e["end"] - e["start"]) > (prev["end"] - prev["start"]):
+                prev.update(e)
+            continue
+        merged.append(e)
+        last_by_label[label] = e
+    return merged
+
+'''
+패킹된 시퀀스의 엔티티를 각 셀 좌표로 나눈다.
+엔티티가 셀 경계(구분자)를 넘으면 각 셀 범위로 잘라내므로, 어떤 엔티티도 두 셀에 걸치지 않는다.
+'''
+def _split_packed(entities: List[Dict[str, Any]], cells: List[Tuple[int, int, int]],
+                  packed: str, results: List[List[Dict[str, Any]]]) -> None:
+    starts = [c[1] for c in cells]
+    for e in entities:
+        s, t = int(e.get("start", 0)), int(e.get("end", 0))
+        k = max(0, bisect_right(starts, s) - 1)
+        while k < len(cells) and cells[k][1] < t:
+            idx, cs, ce = cells[k]
+            a, b = max(s, cs), min(t, ce)
+            if a < b:
+                e2 = dict(e)
+                e2["start"], e2["end"] = a - cs, b - cs
+                e2["word"] = packed[a:b]
+                results[idx].append(e2)
+            k += 1
+
+'''
+짧은 텍스트 여러 개를 PACK_SEPARATOR로 이어 붙여 최대 위치 수 이내의 시퀀스로 묶고,
+시퀀스 단위로 NER을 수행한 뒤 엔티티 오프셋을 각 텍스트로 되돌린다.
+한 시퀀스에 들어가지 않는 긴 텍스트는 ner_many의 일반 경로로 처리한다.
+'''
+def ner_packed(texts: Sequence[str], batch_size: int | None = None,
+               max_tokens: int | None = None) -> List[List[Dict[str, Any]]]:
+    bs = max(1, batch_size or NER_BATCH_SIZE)
+    budget = (max_tokens or max_positions()) - 2  # [CLS], [SEP]
+    results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+    todo = [i for i, t in enumerate(texts) if t and t.strip()]
+    if not todo:
+        return results
+
+    lengths = dict(zip(todo, token_lengths([texts[i] for i in todo])))
+    sep_len = token_lengths([PACK_SEPARATOR])[0]
+
+    packs: List[Tuple[str, List[Tuple[int, int, int]]]] = []
+    long_ids: List[int] = []
+    parts: List[str] = []
+    cells: List[Tuple[int, int, int]] = []
+    pos = used = 0
+    for i in todo:
+        n = lengths[i]
+        if n > budget:
+            long_ids.append(i)
+            continue
+        need = n + (sep_len if parts else 0)
+        if parts and used + need > budget:
+            packs.append(("".join(parts), cells))
+            parts, cells, pos, used = [], [], 0, 0
+            need = n
+        if parts:
+            parts.append(PACK_SEPARATOR); pos += len(PACK_SEPARATOR)
+        cells.append((i, pos, pos + len(texts[i])))
+        parts.append(texts[i]); pos += len(texts[i])
+        used += need
+    if parts:
+        packs.append(("".join(parts), cells))
+
+    outs = _run_pipeline([p[0] for p in packs], bs)
+    for (packed, pcells), ents in zip(packs, outs):
+        _split_packed(ents, pcells, packed, results)
+    _count(packed_texts=len(todo) - len(long_ids))
+
+    if long_ids:
+        for i, o in zip(long_ids, ner_many([texts[i] for i in long_ids], batch_size=bs, pack=False, tiered=False)):
+            results[i] = o
+    return results
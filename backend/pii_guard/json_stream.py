@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import os
+import re
+from typing import Any, Iterator, TextIO
+
+# 최상위 배열을 읽을 때 한 번에 더 읽어 오는 글자 수
+_READ_CHUNK = 1 << 16
+# 버퍼 끝에서 이만큼 안쪽의 오류는 덜 읽힌 값(리터럴 "-Infinity", \\uXXXX 이스케이프 등)일 수 있다고 본다
+_TRUNCATED_TAIL = 16
+# 배열 원소 하나의 최대 글자 수. 넘으면 끝까지 읽지 않고 오류를 낸다 (닫히지 않은 문자열 등으로 메모리가 무한히 늘지 않도록)
+MAX_ITEM_CHARS = int(os.getenv("PII_JSON_MAX_ITEM_CHARS", str(64 << 20)))
+
+_WS_RE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+'''
+텍스트 스트림에서 JSONL 레코드를 한 줄씩 읽는다.
+빈 줄은 건너뛰고, JSON으로 읽을 수 없는 줄은 {"_raw": 줄}로 돌려준다.
+'''
+def iter_jsonl(fp: TextIO) -> Iterator[Any]:
+    for line in fp:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except Exception:
+            yield {"_raw": line}
+
+'''
+스트림을 조금씩 읽어 들이며 JSON 값을 하나씩 꺼내는 버퍼. 소비한 앞부분은 다음에 읽을 때 버린다.
+'''
+class _Reader:
+    def __init__(self, fp: TextIO, buf: str = ""):
+        self.fp = fp
+        self.buf = buf
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int | None = None) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(size or _READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    '''
+    공백을 건너뛴 다음 글자를 반환한다. (끝이면 "")
+    '''
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    '''
+    현재 위치의 JSON 값 하나를 읽는다.
+    버퍼 끝 가까이에서 끝난 값("12"는 "123"의, "-0."까지 읽혀 "-0"으로 끝난 값은 "-0.5"의 앞부분일 수 있음)이나
+    버퍼 끝에서 실패한 값은 더 읽은 뒤 다시 시도하고,
+    버퍼 중간의 문법 오류는 나머지를 읽지 않고 바로 던진다.
+    다시 시도할 때마다 지금까지 버퍼에 쌓인 만큼 더 읽어(버퍼가 두 배씩 커짐) 큰 원소도 선형 시간에 읽고,
+    원소 하나가 MAX_ITEM_CHARS 글자를 넘으면 오류를 던진다.
+    '''
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+                if len(self.buf) - end > _TRUNCATED_TAIL or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError as err:
+                if self.eof or not self._truncated(err):
+                    raise
+            pending = len(self.buf) - self.pos
+            if pending > MAX_ITEM_CHARS:
+                raise self.error(f"Array element longer than {MAX_ITEM_CHARS} characters")
+            self._fill(min(max(_READ_CHUNK, pending), MAX_ITEM_CHARS + 1 - pending))
+
+    '''
+    디코딩 실패가 값이 버퍼 끝에서 잘렸기 때문일 수 있는지 판정한다.
+    닫히지 않은 문자열이거나 오류 위치가 버퍼 끝 가까이일 때만 그렇다고 본다.
+    '''
+    def _truncated(self, err: json.JSONDecodeError) -> bool:
+        return err.msg.startswith("Unterminated string") or len(self.buf) - err.pos <= _TRUNCATED_TAIL
+
+    def error(self, msg: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+'''
+스트림 앞의 공백을 건너뛰고, 첫 글자부터 지금까지 읽은 텍스트를 반환한다. (비어 있으면 "")
+반환값의 첫 글자로 최상위 값의 종류를 보고, 나머지를 읽을 때 iter_json_array(fp, head)나 head + fp.read()에 넘긴다.
+'''
+def read_head(fp: TextIO) -> str:
+    head = ""
+    while not head:
+        chunk = fp.read(_READ_CHUNK)
+        if not chunk:
+            return ""
+        head = chunk.lstrip(" \t\n\r")
+    return head
+
+'''
+최상위가 배열인 JSON 문서에서 원소를 하나씩 읽는다. 메모리는 원소 하나와 읽기 단위 크기에 비례한다.
+head는 read_head()가 이미 읽은 앞부분이다.
+형식이 잘못되었으면 json.JSONDecodeError를 던진다. (그 전까지의 원소는 이미 나간 뒤다)
+'''
+def iter_json_array(fp: TextIO, head: str = "") -> Iterator[Any]:
+    r = _Reader(fp, head)
+    if r.peek() != "[":
+        raise r.error("Expecting '['")
+    r.pos += 1
+    if r.peek() == "]":
+        r.pos += 1
+    else:
+        while True:
+            yield r.value()
+            c = r.peek()
+            if c == "]":
+                r.pos += 1
+                break
+            if c != ",":
+                raise r.error("Expecting ',' delimiter")
+            r.pos += 1
+    if r.peek():
+        raise r.error("Extra data")
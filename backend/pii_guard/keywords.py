@@ -0,0 +1,118 @@
+from __future__ import annotations
+import json
+import os
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+# 문맥 키워드 목록 파일 (그룹 이름 → 키워드 리스트)
+KEYWORDS_PATH = Path(os.getenv("PII_KEYWORDS_PATH", str(Path(__file__).parent / "data" / "keywords.json")))
+
+'''
+키워드 설정 파일을 읽는다.
+'''
+def load_keywords(path: str | Path | None = None) -> Dict[str, List[str]]:
+    with open(path or KEYWORDS_PATH, "r", encoding="utf-8") as f:
+        return {group: list(words) for group, words in json.load(f).items()}
+
+'''
+여러 그룹의 키워드를 한 번에 찾는 Aho–Corasick 오토마톤.
+텍스트를 한 번 훑어 겹치는 것을 포함한 모든 키워드 출현을 (start, end, 그룹) 목록으로 돌려준다.
+'''
+class AhoCorasick:
+    def __init__(self, groups: Dict[str, Sequence[str]]):
+        self.groups: List[str] = list(groups)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]  # (길이, 그룹 번호)
+        for gi, group in enumerate(self.groups):
+            for word in groups[group]:
+                if word:
+                    self._add(word, gi)
+        self._build()
+
+    def _add(self, word: str, gi: int) -> None:
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._out.append([])
+            node = nxt
+        if (len(word), gi) not in self._out[node]:
+            self._out[node].append((len(word), gi))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: List[Tuple[int, int, str]] = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, gi in out[node]:
+                hits.append((i + 1 - length, i + 1, self.groups[gi]))
+        return hits
+
+    def index(self, text: str) -> "KeywordHits":
+        return KeywordHits(self, text)
+
+'''
+텍스트 한 건의 키워드 출현 인덱스. 처음 조회할 때 한 번 스캔한다.
+그룹별로 시작 위치 정렬 배열과 끝 위치의 뒤쪽 최소값을 두어,
+"text[lo:hi] 안에 그룹 키워드가 있는가"를 O(log n)에 판정한다. (kw in text[lo:hi]와 같다)
+'''
+class KeywordHits:
+    __slots__ = ("_automaton", "_text", "_groups")
+
+    def __init__(self, automaton: AhoCorasick, text: str):
+        self._automaton = automaton
+        self._text = text
+        self._groups: Dict[str, Tuple[List[int], List[int]]] | None = None
+
+    def _build(self) -> Dict[str, Tuple[List[int], List[int]]]:
+        by_group: Dict[str, List[Tuple[int, int]]] = {}
+        for s, e, g in self._automaton.find_all(self._text):
+            by_group.setdefault(g, []).append((s, e))
+        groups: Dict[str, Tuple[List[int], List[int]]] = {}
+        for g, hits in by_group.items():
+            hits.sort()
+            suffix_min = [e for _, e in hits]
+            for k in range(len(suffix_min) - 2, -1, -1):
+                suffix_min[k] = min(suffix_min[k], suffix_min[k + 1])
+            groups[g] = ([s for s, _ in hits], suffix_min)
+        return groups
+
+    def within(self, group: str, lo: int, hi: int) -> bool:
+        if self._groups is None:
+            self._groups = self._build()
+        entry = self._groups.get(group)
+        if entry is None:
+            return False
+        starts, suffix_min = entry
+        k = bisect_left(starts, max(0, lo))
+        return k < len(starts) and suffix_min[k] <= min(hi, len(self._text))
+
+KEYWORDS = load_keywords()
+CONTEXT_AUTOMATON = AhoCorasick(KEYWORDS)
+
+'''
+텍스트의 문맥 키워드 인덱스를 만든다. hits가 있으면 그대로 쓴다.
+'''
+def keyword_hits(text: str, hits: KeywordHits | None = None) -> KeywordHits:
+    return CONTEXT_AUTOMATON.index(text) if hits is None else hits
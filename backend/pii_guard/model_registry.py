@@ -0,0 +1,216 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from .precision import resolve_mode
+
+try:
+    from kiwipiepy import Kiwi
+    _KIWI_OK = True
+except Exception:
+    Kiwi = None
+    _KIWI_OK = False
+
+# 모델 디렉터리 설정
+MODEL_DIR = str((Path(__file__).parent / "models").resolve())
+
+# NER 추론 백엔드 (direct: torch 모델 + 벡터 span 디코더 | hf: transformers pipeline | onnx: onnxruntime)
+NER_BACKEND = os.getenv("PII_NER_BACKEND", "direct").strip().lower()
+
+# 추론 정밀도 (fp32 | bf16 | int8) 및 활성화 전 정확도 검증 여부. 잘못된 값은 기동 시 한 번 경고하고 fp32로 쓴다.
+NER_PRECISION = resolve_mode(os.getenv("PII_NER_PRECISION"))
+NER_PRECISION_CHECK = os.getenv("PII_NER_PRECISION_CHECK", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# 프로세스 전체에서 공유하는 모델/토크나이저/Kiwi 인스턴스 (최초 사용 시 로딩)
+_lock = threading.RLock()
+_tokenizer = None
+_model = None
+_ner = None
+_kiwi = None
+_kiwi_loaded = False
+_config: Dict[str, Any] | None = None
+_precision: Dict[str, Any] = {"requested": NER_PRECISION, "active": "fp32", "report": None}
+
+_load_stats: Dict[str, Dict[str, Any]] = {}
+
+'''
+현재 프로세스의 RSS(상주 메모리, byte)를 반환한다.
+/proc을 읽을 수 없으면 resource의 최대 RSS로 대체하고, 그것도 불가하면 None을 반환한다.
+'''
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+    except Exception:
+        return None
+
+'''
+로딩 함수를 실행하면서 소요 시간과 RSS 증가량을 기록한다.
+'''
+def _timed_load(name: str, loader):
+    rss_before = _rss_bytes()
+    t0 = time.perf_counter()
+    obj = loader()
+    elapsed = time.perf_counter() - t0
+    rss_after = _rss_bytes()
+    _load_stats[name] = {
+        "seconds": round(elapsed, 4),
+        "rss_before": rss_before,
+        "rss_after": rss_after,
+        "rss_delta": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+    }
+    return obj
+
+'''
+모델 디렉터리의 config.json을 반환한다. 가중치를 로딩하지 않고 구조 정보만 읽는다.
+'''
+def model_config() -> Dict[str, Any]:
+    global _config
+    if _config is None:
+        with open(Path(MODEL_DIR) / "config.json", "r", encoding="utf-8") as f:
+            _config = json.load(f)
+    return _config
+
+'''
+모델이 받을 수 있는 최대 위치(토큰) 수를 반환한다.
+'''
+def max_positions() -> int:
+    return int(model_config().get("max_position_embeddings", 512))
+
+'''
+공유 토크나이저를 반환한다. 최초 호출 시 한 번만 로딩한다.
+onnx 백엔드에서는 transformers 없이 tokenizer.json을 직접 읽는다.
+'''
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                if NER_BACKEND == "onnx":
+                    from .onnx_backend import FastTokenizer
+                    _tokenizer = _timed_load("tokenizer", lambda: FastTokenizer(Path(MODEL_DIR) / "tokenizer.json"))
+                else:
+                    from transformers import AutoTokenizer
+                    _tokenizer = _timed_load("tokenizer", lambda: AutoTokenizer.from_pretrained(MODEL_DIR, use_fast=True))
+    return _tokenizer
+
+'''
+공유 토큰 분류 모델을 반환한다. 최초 호출 시 한 번만 로딩한다.
+'''
+def get_model():
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from transformers import AutoModelForTokenClassification
+                mdl = _timed_load("model", lambda: AutoModelForTokenClassification.from_pretrained(MODEL_DIR))
+                _model = _timed_load("precision", lambda: _apply_precision(mdl)) if NER_PRECISION != "fp32" else mdl
+    return _model
+
+'''
+요청된 정밀도 모드를 적용한다. 검증이 켜져 있으면 샘플셋의 라벨별 F1 하락폭을 먼저 측정하고,
+허용치를 넘거나 지원되지 않으면 fp32 모델을 그대로 사용한다.
+'''
+def _apply_precision(mdl):
+    from .precision import apply_precision, check_precision
+    if not NER_PRECISION_CHECK:
+        _precision["active"] = NER_PRECISION
+        return apply_precision(mdl, NER_PRECISION)
+    candidate, report = check_precision(mdl, get_tokenizer(), NER_PRECISION)
+    _precision["report"] = report
+    if report.get("ok"):
+        _precision["active"] = NER_PRECISION
+        return candidate
+    return mdl
+
+'''
+활성 정밀도 모드에 맞는 추론 컨텍스트(bf16이면 CPU autocast)를 반환한다.
+'''
+def inference_context():
+    from .precision import autocast_context
+    return autocast_context(_precision["active"])
+
+'''
+공유 NER 파이프라인을 반환한다. 모든 백엔드는 HF pipeline("ner", aggregation_strategy="simple")과
+같은 형식(entity_group/score/word/start/end)의 결과를 낸다.
+- direct: torch 모델을 직접 호출하고 span_decoder로 배치 단위 벡터 디코딩 (기본값)
+- onnx: onnxruntime 세션 + 같은 벡터 디코더
+- hf: transformers pipeline
+'''
+def get_ner():
+    global _ner
+    if _ner is None:
+        with _lock:
+            if _ner is None:
+                if NER_BACKEND == "onnx":
+                    _ner = _load_onnx_ner()
+                elif NER_BACKEND == "direct":
+                    from .span_decoder import TorchNerPipeline
+                    tok, mdl = get_tokenizer(), get_model()
+                    _ner = _timed_load("pipeline", lambda: TorchNerPipeline(mdl, tok, model_config()["id2label"], max_positions()))
+                else:
+                    from transformers import pipeline
+                    tok, mdl = get_tokenizer(), get_model()
+                    _ner = _timed_load("pipeline", lambda: pipeline("ner", model=mdl, tokenizer=tok, aggregation_strategy="simple"))
+    return _ner
+
+'''
+ONNX 그래프가 없으면 한 번 내보낸 뒤(torch 필요) onnxruntime 파이프라인을 만든다.
+그래프가 캐시되어 있으면 torch를 import하지 않는다.
+'''
+def _load_onnx_ner():
+    from .onnx_backend import ONNX_PATH, OnnxNerPipeline, export_onnx
+    if not ONNX_PATH.exists():
+        _timed_load("onnx_export", lambda: export_onnx(MODEL_DIR))
+    tok = get_tokenizer()
+    return _timed_load("pipeline", lambda: OnnxNerPipeline(tok, model_config()["id2label"], max_positions()))
+
+'''
+공유 Kiwi 형태소 분석기를 반환한다. kiwipiepy가 없으면 None을 반환한다.
+'''
+def get_kiwi():
+    global _kiwi, _kiwi_loaded
+    if not _kiwi_loaded:
+        with _lock:
+            if not _kiwi_loaded:
+                _kiwi = _timed_load("kiwi", Kiwi) if _KIWI_OK else None
+                _kiwi_loaded = True
+    return _kiwi
+
+'''
+모델/토크나이저/Kiwi를 미리 로딩한다. 워커 기동 직후 예열이 필요할 때 호출한다.
+'''
+def warmup() -> Dict[str, Any]:
+    get_ner()
+    get_kiwi()
+    return load_stats()
+
+'''
+구성요소별 로딩 시간과 RSS 수치, 현재 RSS를 반환한다.
+'''
+def load_stats() -> Dict[str, Any]:
+    with _lock:
+        components = {k: dict(v) for k, v in _load_stats.items()}
+    return {
+        "loaded": {
+            "tokenizer": _tokenizer is not None,
+            "model": _model is not None,
+            "pipeline": _ner is not None,
+            "kiwi": _kiwi is not None,
+        },
+        "components": components,
+        "backend": NER_BACKEND,
+        "precision": dict(_precision),
+        "total_seconds": round(sum(v.get("seconds", 0.0) for v in components.values()), 4),
+        "rss_bytes": _rss_bytes(),
+    }
@@ -0,0 +1,142 @@
+from __future__ import annotations
+import re
+import unicodedata
+from typing import List, Sequence, Tuple
+
+from .span_rewriter import rewrite_spans
+
+WS_RE = re.compile(r"\s+")
+
+'''
+텍스트를 정규화한다.
+특수 기호를 표준 하이픈으로 치환, 공백 압축, 유니코드 NFKC 정규화를 적용한다.
+'''
+def normalize_text(text: str) -> str:
+    text = text.replace("–", "-").replace("ㅡ", "-")
+    text = WS_RE.sub(" ", text)
+    return unicodedata.normalize("NFKC", text)
+
+'''
+앞 글자와 합쳐질 수 없는(NFKC 조합의 시작이 되는) 글자인지 판정한다.
+결합 문자, 한글 자모 중성/종성, 반각 탁점은 앞 글자와 한 조각으로 묶는다.
+'''
+def _starts_chunk(c: str) -> bool:
+    if c < "\x80":
+        return True
+    if unicodedata.combining(c):
+        return False
+    o = ord(c)
+    if 0x1160 <= o <= 0x11FF or 0xD7B0 <= o <= 0xD7FF or o in (0xFF9E, 0xFF9F):
+        return False
+    return True
+
+'''
+NFKC를 조각 단위로 적용할 경계 [(start, end)]를 구한다.
+조각별 결과를 이어 붙인 것이 전체 NFKC와 다르면 공백 단위 조각으로, 그래도 다르면 전체 한 조각으로 물러선다.
+'''
+def _nfkc_chunks(text: str, expected: str) -> List[Tuple[int, int]]:
+    bounds = [i for i, c in enumerate(text) if i == 0 or _starts_chunk(c)] + [len(text)]
+    chunks = list(zip(bounds, bounds[1:]))
+    if "".join(unicodedata.normalize("NFKC", text[a:b]) for a, b in chunks) == expected:
+        return chunks
+    bounds = [0] + [m.start() for m in WS_RE.finditer(text) if m.start() > 0] + [len(text)]
+    chunks = list(zip(bounds, bounds[1:]))
+    if "".join(unicodedata.normalize("NFKC", text[a:b]) for a, b in chunks) == expected:
+        return chunks
+    return [(0, len(text))]
+
+'''
+정규화 결과와 원문 위치 매핑. normalize()가 만든다.
+text(정규화 문자열)의 i번째 글자는 원문 original[_starts[i]:_ends[i]]에서 왔다.
+정규화가 원문을 바꾸지 않았으면 매핑 배열 없이 항등으로 처리한다.
+'''
+class NormalizedText:
+    __slots__ = ("original", "text", "_starts", "_ends")
+
+    def __init__(self, original: str, text: str,
+                 starts: List[int] | None = None, ends: List[int] | None = None):
+        self.original = original
+        self.text = text
+        self._starts = starts
+        self._ends = ends
+
+    @property
+    def identity(self) -> bool:
+        return self._starts is None
+
+    def to_original(self, start: int, end: int) -> Tuple[int, int]:
+        if self._starts is None:
+            return start, end
+        n = len(self.text)
+        if start >= n:
+            return len(self.original), len(self.original)
+        if end <= start:
+            s = self._starts[start]
+            return s, s
+        return self._starts[start], self._ends[min(end, n) - 1]
+
+    '''
+    정규화 문자열 기준 치환 목록 [(start, end, 새 문자열)]을 원문 구간으로 옮긴다.
+    옮긴 뒤 겹치게 된 치환(한 원문 글자가 여러 정규화 글자로 펼쳐진 경우)은 하나로 합친다.
+    반환: [(원문 start, 원문 end, 새 문자열, 합쳐진 입력 번호들)] (원문 start 오름차순)
+    '''
+    def map_replacements(self, replacements: Sequence[Tuple[int, int, str]]) -> List[Tuple[int, int, str, List[int]]]:
+        order = sorted(range(len(replacements)), key=lambda k: (replacements[k][0], replacements[k][1]))
+        mapped: List[Tuple[int, int, str, List[int]]] = []
+        for k in order:
+            start, end, new = replacements[k]
+            s, e = self.to_original(start, end)
+            if mapped and s < mapped[-1][1]:
+                ps, pe, pnew, idx = mapped[-1]
+                mapped[-1] = (ps, max(pe, e), pnew + new, idx + [k])
+            else:
+                mapped.append((s, e, new, [k]))
+        return mapped
+
+    '''
+    정규화 문자열 기준 치환 목록을 원문에 적용한다.
+    반환: (치환된 원문, [(원문 start, 원문 end, 결과 start, 결과 end)])
+    '''
+    def splice(self, replacements: Sequence[Tuple[int, int, str]]) -> Tuple[str, List[Tuple[int, int, int, int]]]:
+        return rewrite_spans(self.original, [m[:3] for m in self.map_replacements(replacements)])
+
+'''
+이미 정규화된 입력(NormalizedText)이면 그 문자열을, 아니면 normalize_text 결과를 반환한다.
+engine처럼 한 번 정규화한 뷰를 넘기는 호출자가 다시 정규화하지 않게 한다.
+'''
+def as_normalized(text: "str | NormalizedText") -> str:
+    return text.text if isinstance(text, NormalizedText) else normalize_text(text)
+
+'''
+텍스트를 normalize_text와 같게 정규화하고 원문 위치 매핑을 함께 만든다.
+하이픈 치환은 글자 수가 같고, 공백 압축은 공백 구간 전체를 " " 한 글자로 매핑한다.
+NFKC는 이미 정규형이면 건너뛰고, 아니면 조각 단위로 적용해 조각의 결과 글자들을 조각의 원문 구간에 매핑한다.
+'''
+def normalize(text: str) -> NormalizedText:
+    dashed = text.replace("–", "-").replace("ㅡ", "-")
+    collapsed = WS_RE.sub(" ", dashed)
+    nfkc_same = unicodedata.is_normalized("NFKC", collapsed)
+    if collapsed == text and nfkc_same:
+        return NormalizedText(text, text)
+
+    starts: List[int] = []
+    ends: List[int] = []
+    pos = 0
+    for m in WS_RE.finditer(dashed):
+        starts.extend(range(pos, m.start())); ends.extend(range(pos + 1, m.start() + 1))
+        starts.append(m.start()); ends.append(m.end())
+        pos = m.end()
+    starts.extend(range(pos, len(dashed))); ends.extend(range(pos + 1, len(dashed) + 1))
+    if nfkc_same:
+        return NormalizedText(text, collapsed, starts, ends)
+
+    normalized = unicodedata.normalize("NFKC", collapsed)
+    n_starts: List[int] = []
+    n_ends: List[int] = []
+    for a, b in _nfkc_chunks(collapsed, normalized):
+        out_len = len(unicodedata.normalize("NFKC", collapsed[a:b]))
+        if out_len == b - a and b - a == 1:
+            n_starts.append(starts[a]); n_ends.append(ends[a])
+            continue
+        n_starts.extend([starts[a]] * out_len); n_ends.extend([ends[b - 1]] * out_len)
+    return NormalizedText(text, normalized, n_starts, n_ends)
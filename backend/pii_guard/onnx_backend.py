@@ -0,0 +1,112 @@
+from __future__ import annotations
+import inspect
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .span_decoder import SpanPipeline
+
+# ONNX 그래프 캐시 위치와 onnxruntime 스레드 수
+ONNX_PATH = Path(os.getenv("PII_ONNX_PATH", str(Path(__file__).parent / "models" / "onnx" / "model.onnx")))
+ORT_INTRA_THREADS = int(os.getenv("PII_ORT_INTRA_THREADS", str(os.cpu_count() or 1)))
+ORT_INTER_THREADS = int(os.getenv("PII_ORT_INTER_THREADS", "1"))
+
+'''
+ElectraForTokenClassification을 ONNX로 한 번 내보낸다. (이 경로에서만 torch를 import한다)
+배치/시퀀스 축은 동적으로 둔다.
+'''
+def export_onnx(model_dir: str, out_path: Path = ONNX_PATH, opset: int = 14) -> Path:
+    import torch
+    from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+    model = AutoModelForTokenClassification.from_pretrained(model_dir).eval()
+    tok = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+    dummy = tok(["홍길동 010-0000-0000"], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {n: {0: "batch", 1: "sequence"} for n in names}
+    axes["logits"] = {0: "batch", 1: "sequence"}
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(".tmp")
+    kwargs: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # dynamic_axes 기반 TorchScript 익스포터 사용
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(dummy[n] for n in names), str(tmp),
+            input_names=names, output_names=["logits"], dynamic_axes=axes, opset_version=opset, **kwargs,
+        )
+    os.replace(tmp, out_path)
+    return out_path
+
+'''
+tokenizers.Tokenizer(tokenizer.json)를 HF 토크나이저 호출 형식으로 감싼다.
+transformers(및 torch)를 import하지 않으므로 ONNX 서빙 경로에서 사용한다.
+inference/onnx 경로가 쓰는 인자(add_special_tokens, padding, truncation, max_length,
+return_offsets_mapping, return_special_tokens_mask, return_tensors="np")만 지원한다.
+'''
+class FastTokenizer:
+    def __init__(self, path: str | Path):
+        from tokenizers import Tokenizer
+        self._tok = Tokenizer.from_file(str(path))
+        self._tok.no_padding()
+        self._tok.no_truncation()
+        pad = self._tok.token_to_id("[PAD]")
+        self.pad_token_id = 0 if pad is None else pad
+
+    def __call__(self, texts: str | Sequence[str], add_special_tokens: bool = True, padding: bool = False,
+                 truncation: bool = False, max_length: int | None = None,
+                 return_offsets_mapping: bool = False, return_special_tokens_mask: bool = False,
+                 return_tensors: str | None = None, **kwargs) -> Dict[str, Any]:
+        single = isinstance(texts, str)
+        encs = self._tok.encode_batch([texts] if single else list(texts), add_special_tokens=add_special_tokens)
+        rows: Dict[str, List[list]] = {"input_ids": [], "attention_mask": [], "token_type_ids": [],
+                                       "offset_mapping": [], "special_tokens_mask": []}
+        for e in encs:
+            cols = [list(e.ids), list(e.attention_mask), list(e.type_ids),
+                    [tuple(o) for o in e.offsets], list(e.special_tokens_mask)]
+            if truncation and max_length and len(cols[0]) > max_length:
+                # 마지막 특수 토큰([SEP])은 유지하고 앞쪽만 자른다
+                keep = max_length - 1 if add_special_tokens else max_length
+                tail = slice(len(cols[0]) - 1, None) if add_special_tokens else slice(0, 0)
+                cols = [c[:keep] + c[tail] for c in cols]
+            for key, c in zip(rows, cols):
+                rows[key].append(c)
+
+        if padding:
+            width = max((len(r) for r in rows["input_ids"]), default=0)
+            fill = {"input_ids": self.pad_token_id, "attention_mask": 0, "token_type_ids": 0,
+                    "offset_mapping": (0, 0), "special_tokens_mask": 1}
+            for key, vals in rows.items():
+                for r in vals:
+                    r.extend([fill[key]] * (width - len(r)))
+
+        if not return_offsets_mapping:
+            rows.pop("offset_mapping")
+        if not return_special_tokens_mask:
+            rows.pop("special_tokens_mask")
+        if return_tensors == "np":
+            return {k: np.asarray(v, dtype=np.int64) for k, v in rows.items()}
+        return {k: v[0] for k, v in rows.items()} if single else rows
+
+'''
+onnxruntime 세션으로 토큰 분류를 수행하는 NER 파이프라인.
+토크나이즈/벡터 디코딩은 SpanPipeline을 그대로 쓰고 로짓 계산만 onnxruntime으로 한다.
+'''
+class OnnxNerPipeline(SpanPipeline):
+    def __init__(self, tokenizer, id2label: Dict[Any, str], max_length: int, path: Path = ONNX_PATH):
+        import onnxruntime as ort
+
+        super().__init__(tokenizer, id2label, max_length)
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = ORT_INTRA_THREADS
+        opts.inter_op_num_threads = ORT_INTER_THREADS
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _logits(self, enc: Dict[str, np.ndarray]) -> np.ndarray:
+        feeds = {k: np.asarray(enc[k], dtype=np.int64) for k in self.input_names if k in enc}
+        return self.session.run(["logits"], feeds)[0]
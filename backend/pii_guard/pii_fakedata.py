@@ -1,18 +1,24 @@
 from __future__ import annotations
 import re
-import unicodedata
-from pathlib import Path
-from typing import Any, Dict, List, Set
+import threading
+from typing import Any, Dict, List, Set, Sequence, Tuple
 
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 from faker import Faker
 
-try:
-    from kiwipiepy import Kiwi
-    _KIWI_OK = True
-except Exception:
-    Kiwi = None
-    _KIWI_OK = False
+from .model_registry import MODEL_DIR
+from .inference import ner, ner_many
+from .span_rewriter import rewrite_spans
+from .keywords import keyword_hits
+from .entity import Span
+from .normalize import NormalizedText, as_normalized, normalize_text
+from .fake_pool import fake_pools
+from .pii_masking import allow_labels_per_text
+from .pseudonym import pseudonym_fake, pseudonym_seed, state_key
+from .state_store import get_store
+from .rules import (
+    PHONE_PATTERNS, EMAIL_PATTERN, SSN_RE, CC_RE, ACCT_PATTERNS, ACCT_RE, PASS_RE, DLN_RE,
+    MONEY_RE, DATE_RE, TIME_RE, scan_text, spans_to_entities,
+)
 
 LABELS_KOR = {
     "SSN": "주민등록번호",
@@ -30,34 +36,9 @@ LABELS_KOR = {
 }
 
 faker = Faker("ko_KR")
-
-MODEL_DIR = str((Path(__file__).parent / "models").resolve())
-tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR, use_fast=True)
-model = AutoModelForTokenClassification.from_pretrained(MODEL_DIR)
-ner = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
-
-kiwi = Kiwi() if _KIWI_OK else None
-
-PHONE_PATTERNS = [re.compile(r"^010[- ]?\d{3,4}[- ]?\d{4}$")]
-EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
-
-SSN_RE = re.compile(r"\b\d{6}-\d{7}\b")
-CC_RE = re.compile(r"\b(?:\d{4}[- ]?){3}\d{4}\b")
-ACCT_PATTERNS = [r"\b\d{10}\b", r"\b\d{12}\b", r"\b\d{6}-\d{2}-\d{6}\b", r"\b\d{3}-\d{3}-\d{6}\b"]
-ACCT_RE = [re.compile(p) for p in ACCT_PATTERNS]
-PASS_RE = re.compile(r"[A-Z]\d{8}")
-DLN_RE = re.compile(r"\d{2}-\d{2}-\d{6}-\d{2}")
-
-MONEY_RE = re.compile(r"\d+(원|만원|천원|억원|조원|KRW|₩)")
-DATE_RE = [
-    re.compile(r"\d{4}[-/]\d{1,2}[-/]\d{1,2}"),
-    re.compile(r"\d{1,2}\s*월\s*\d{1,2}\s*일"),
-    re.compile(r"\d{2}[-/.]\d{1,2}[-/.]\d{1,2}"),
-]
-TIME_RE = [
-    re.compile(r"([01]?\d|2[0-3]):[0-5]\d"),
-    re.compile(r"([01]?\d|2[0-3]):[0-5]\d:[0-5]\d"),
-]
+_seeded_faker = Faker("ko_KR")
+_seeded_faker_lock = threading.Lock()
+EMAIL_VALIDATE_RE = re.compile(r"^[A-Za-z0-9._%+-]+@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}$")
 
 def validate_name(name: str) -> bool:
     return bool(re.fullmatch(r"[가-힣A-Za-z]{2,}", name or ""))
@@ -80,8 +61,7 @@ def validate_dln(dln: str) -> bool:
 def validate_email(email: str) -> bool:
     if not email or "@" not in email: return False
     if ".." in email: return False
-    regex = re.compile(r"^[A-Za-z0-9._%+-]+@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}$")
-    return bool(regex.fullmatch(email))
+    return bool(EMAIL_VALIDATE_RE.fullmatch(email))
 
 def luhn_check(card_number: str) -> bool:
     digits = [int(d) for d in card_number if d.isdigit()]
@@ -97,11 +77,6 @@ def luhn_check(card_number: str) -> bool:
         checksum += digit
     return checksum % 10 == 0
 
-def normalize_text(text: str) -> str:
-    text = text.replace("–", "-").replace("ㅡ", "-")
-    text = re.sub(r"\s+", " ", text)
-    return unicodedata.normalize("NFKC", text)
-
 def add_regex_entities(text: str, patterns, tag: str) -> List[Dict[str, Any]]:
     if isinstance(patterns, re.Pattern):
         patterns = [patterns]
@@ -109,87 +84,122 @@ def add_regex_entities(text: str, patterns, tag: str) -> List[Dict[str, Any]]:
     for p in patterns:
         if isinstance(p, str): p = re.compile(p)
         for m in p.finditer(text):
-            ents.append({"entity_group": tag,"word": m.group(),"start": m.start(),"end": m.end(),"score": 1.0})
+            ents.append(Span(tag, m.group(), m.start(), m.end(), 1.0))
     return ents
 
-def add_email_entities(text: str, existing_entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def add_email_entities(text: str, existing_entities: List[Dict[str, Any]],
+                       scan: Dict[str, List[Tuple[int, int]]] | None = None) -> List[Dict[str, Any]]:
     new_entities = existing_entities.copy()
     existing_words = {e["word"] for e in existing_entities if e.get("entity_group") == "EMAIL"}
-    for m in EMAIL_PATTERN.finditer(text):
-        email = m.group()
+    for s, t in scan_text(text, scan)["EMAIL"]:
+        email = text[s:t]
         if email not in existing_words:
-            new_entities.append({"entity_group": "EMAIL","word": email,"start": m.start(),"end": m.end(),"score": 1.0})
+            new_entities.append(Span("EMAIL", email, s, t, 1.0))
             existing_words.add(email)
     return new_entities
 
-def merge_entities(text: str, ner_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def merge_entities(text: str, ner_results: List[Dict[str, Any]],
+                   scan: Dict[str, List[Tuple[int, int]]] | None = None) -> List[Dict[str, Any]]:
     merged = []
     for e in ner_results:
-        merged.append({"entity_group": e.get("entity_group") or e.get("label") or e.get("entity"),
-                       "word": e.get("word", ""), "start": int(e.get("start", 0)),
-                       "end": int(e.get("end", 0)), "score": float(e.get("score", 1.0)), "_source": "ner"})
-    regex_ents = []
-    regex_ents += add_regex_entities(text, PASS_RE, "PASS")
-    regex_ents += add_regex_entities(text, DLN_RE, "DLN")
-    regex_ents += add_regex_entities(text, SSN_RE, "SSN")
-    regex_ents += add_regex_entities(text, CC_RE, "CC")
-    regex_ents += add_regex_entities(text, ACCT_RE, "ACCT")
-    regex_ents += add_regex_entities(text, MONEY_RE, "MONEY")
-    regex_ents += add_regex_entities(text, DATE_RE, "DATE")
-    regex_ents += add_regex_entities(text, TIME_RE, "TIME")
-    for e in regex_ents: e["_source"] = "regex"
-    merged.extend(regex_ents)
+        merged.append(Span(e.get("entity_group") or e.get("label") or e.get("entity"),
+                           e.get("word", ""), int(e.get("start", 0)), int(e.get("end", 0)),
+                           float(e.get("score", 1.0)), "ner"))
+    scan = scan_text(text, scan)
+    for tag in ("PASS", "DLN", "SSN", "CC", "ACCT", "MONEY", "DATE", "TIME"):
+        merged += spans_to_entities(text, scan[tag], tag, source="regex")
     return merged
 
+def seeded_address(seed: int) -> str:
+    with _seeded_faker_lock:
+        _seeded_faker.seed_instance(seed)
+        return _seeded_faker.address()
+
 def replace_entities_with_fake(text: str, entities: List[Dict[str, Any]], state: Dict[str, Any] | None = None) -> str:
+    return replace_entities_with_fake_offsets(text, entities, state=state)[0]
+
+# 치환 구간은 원문 좌표로 고른 뒤 rewrite_spans로 한 번에 적용한다.
+# 이미 바뀐 구간과 겹치는 엔티티는 건너뛴다. (값이 그대로인 치환은 구간을 차지하지 않는다)
+def replace_entities_with_fake_offsets(text: str, entities: List[Dict[str, Any]],
+                                       state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
     if state is None: state = {}
-    fake_map = state.setdefault("fake_map", {})
     ents = sorted(entities, key=lambda x: x["start"])
-    masked, offset = text, 0
-    NON_PII_CONTEXT = ["구매시간","구매 일시","주문시간","주문 일시","결제시간","등록일","작성시간","생성일자"]
+    pools = fake_pools()  # 주소 외 라벨은 미리 만든 형식 검증 통과 값 풀에서 꺼낸다
+    key = state_key(state)  # 있으면 (라벨, 값)의 키 해시로 가짜값을 정한다
+    if key is None:
+        store = get_store(state)  # state["store"]가 있으면 그 저장소, 없으면 state["fake_map"]
+        fake_map = store.get_fakes(text[e["start"]:e["end"]] for e in ents)
+        take = lambda label, value: pools.take(label)
+    else:
+        # 키 모드는 저장소를 거치지 않는다. 원래값만으로 찾으면 처리 순서/다른 라벨의 가짜값이 섞이므로 (라벨, 값)으로만 정한다
+        store, fake_map = None, {}
+        take = lambda label, value: pseudonym_fake(key, label, value)
+    new_fakes: Dict[str, str] = {}
+    chosen: List[Tuple[int, int, str, str]] = []
+    pos = 0
+    hits = keyword_hits(text)  # data/keywords.json의 fake_non_pii_context
 
     for e in ents:
-        label = e["entity_group"]; start, end = e["start"]+offset, e["end"]+offset
-        value = masked[start:end]
-        context_window = masked[max(0, start-5):min(len(masked), end+5)]
-        if any(ctx in context_window for ctx in NON_PII_CONTEXT): continue
+        label = e["entity_group"]; start, end = e["start"], e["end"]
+        if start < pos: continue
+        value = text[start:end]
+        if hits.within("fake_non_pii_context", start-5, end+5): continue
         if label in {"MONEY","DATE","TIME"}: continue
 
-        if value in fake_map:
-            fake_value = fake_map[value]
+        fkey = value if key is None else (label, value)
+        if fkey in fake_map:
+            fake_value = fake_map[fkey]
         else:
             fake_value = None
-            if label == "NAME" and validate_name(value): fake_value = faker.name()
-            elif label == "PHONE" and validate_phone(value): fake_value = f"010-{faker.random_number(digits=4, fix_len=True)}-{faker.random_number(digits=4, fix_len=True)}"
-            elif label == "EMAIL" and validate_email(value): fake_value = faker.unique.email()
-            elif label == "ADDR": fake_value = faker.address()
-            elif label == "SSN" and validate_ssn(value): fake_value = faker.ssn()
-            elif label == "CC":
-                candidate = faker.credit_card_number()
-                while not luhn_check(candidate):  
-                    candidate = faker.credit_card_number()
-                fake_value = candidate
-                fake_value = re.sub(r"(\d{4})(?=\d)", r"\1-", fake_value)
-            elif label == "ACCT": fake_value = str(faker.random_number(digits=12))
-            elif label == "DLN" and validate_dln(value):
-                fake_value = "{:02d}-{:02d}-{:06d}-{:02d}".format(
-                    faker.random_int(10,99),faker.random_int(10,99),
-                    faker.random_number(digits=6, fix_len=True),faker.random_int(10,99))
-            elif label == "PASS": fake_value = "P"+str(faker.random_number(digits=8, fix_len=True))
-            if fake_value: fake_map[value] = fake_value
+            if label == "NAME" and validate_name(value): fake_value = take("NAME", value)
+            elif label == "PHONE" and validate_phone(value): fake_value = take("PHONE", value)
+            elif label == "EMAIL" and validate_email(value): fake_value = take("EMAIL", value)
+            elif label == "ADDR": fake_value = faker.address() if key is None else seeded_address(pseudonym_seed(key, label, value))
+            elif label == "SSN" and validate_ssn(value): fake_value = take("SSN", value)
+            elif label == "CC": fake_value = take("CC", value)
+            elif label == "ACCT": fake_value = take("ACCT", value)
+            elif label == "DLN" and validate_dln(value): fake_value = take("DLN", value)
+            elif label == "PASS": fake_value = take("PASS", value)
+            if fake_value: fake_map[fkey] = new_fakes[value] = fake_value
             else: fake_value = value
 
-        masked = masked[:start]+fake_value+masked[end:]
-        offset += len(fake_value)-(end-start)
-    return masked
-
-def fake_one(raw_text: str, state: Dict[str, Any] | None = None, allow_labels: Set[str] | None = None) -> str:
-    text = normalize_text(raw_text)
-    final = merge_entities(text, ner(text))
-    final = add_email_entities(text, final)
+        if fake_value != value:
+            chosen.append((start, end, fake_value, label))
+            pos = end
+
+    if new_fakes and store is not None: store.put_fakes(new_fakes)
+    masked, offsets = rewrite_spans(text, [c[:3] for c in chosen])
+    spans = [{"label": c[3], "start": o[2], "end": o[3], "src_start": o[0], "src_end": o[1]}
+             for c, o in zip(chosen, offsets)]
+    return masked, spans
+
+def detect_fake_entities(text: str, ner_results: List[Dict[str, Any]] | None = None,
+                         allow_labels: Set[str] | None = None,
+                         scan: Dict[str, List[Tuple[int, int]]] | None = None) -> List[Dict[str, Any]]:
+    if ner_results is None: ner_results = ner(text)
+    scan = scan_text(text, scan)
+    final = merge_entities(text, ner_results, scan=scan)
+    final = add_email_entities(text, final, scan=scan)
     if allow_labels: final = [e for e in final if e.get("entity_group") in allow_labels]
+    return final
+
+def fake_one(raw_text: str | NormalizedText, state: Dict[str, Any] | None = None, allow_labels: Set[str] | None = None) -> str:
+    text = as_normalized(raw_text)
+    final = detect_fake_entities(text, allow_labels=allow_labels)
     return replace_entities_with_fake(text, final, state=state)
 
+def fake_many(raw_texts: Sequence[str | NormalizedText], state: Dict[str, Any] | None = None,
+              allow_labels: Set[str] | Sequence[Set[str] | None] | None = None,
+              batch_size: int | None = None, pack: bool | None = None) -> List[str]:
+    texts = [as_normalized(t) for t in raw_texts]
+    allows = allow_labels_per_text(allow_labels, len(texts))
+    ner_results = ner_many(texts, batch_size=batch_size, pack=pack)
+    out: List[str] = []
+    for text, ner_res, allow in zip(texts, ner_results, allows):
+        final = detect_fake_entities(text, ner_results=ner_res, allow_labels=allow)
+        out.append(replace_entities_with_fake(text, final, state=state))
+    return out
+
 if __name__ == "__main__":
     samples = [
         "구매시간 2025-08-18 15:32 결제완료 / 카드번호 1234-5678-9012-3456",
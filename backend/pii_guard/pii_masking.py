@@ -1,18 +1,27 @@
 from __future__ import annotations
+import hashlib
+import os
 import re
-import unicodedata
-from pathlib import Path
-from collections import defaultdict
-from typing import Any, Dict, List, Tuple, Set
-
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-
-try:
-    from kiwipiepy import Kiwi 
-    _KIWI_OK = True
-except Exception:
-    Kiwi = None  
-    _KIWI_OK = False
+import sys
+import time
+from typing import Any, Dict, List, Tuple, Set, Sequence
+
+from .model_registry import MODEL_DIR, get_kiwi
+from . import fast_tier, inference
+from .inference import ner, ner_many
+from .span_index import SpanIndex, drop_overlapping
+from .span_rewriter import rewrite_spans
+from .keywords import KEYWORDS, KeywordHits, keyword_hits
+from .cache import LRUCache
+from .entity import Span
+from .normalize import NormalizedText, as_normalized, normalize_text
+from .pipeline import Pipeline, Stage, register_pipeline
+from .pseudonym import pseudonym_suffix, state_key
+from .state_store import get_store
+from .rules import (
+    PHONE_PATTERNS, EMAIL_PATTERN, SSN_RE, CC_RE, ACCT_PATTERNS, ACCT_RE, PASS_RE, DLN_RE,
+    MONEY_RE, DATE_RE, TIME_RE, scan_text, spans_to_entities,
+)
 
 # 라벨 이름과 한국어 매핑
 LABELS_KOR = {
@@ -29,61 +38,30 @@ LABELS_KOR = {
     "DATE": "날짜",
 }
 
-# 모델 디렉터리 설정
-MODEL_DIR = str((Path(__file__).parent / "models").resolve())
-tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR, use_fast=True)
-model = AutoModelForTokenClassification.from_pretrained(MODEL_DIR)
-ner = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+# 정규식/패턴 정의 (rules.py에서 공유)
+SIMPLE_EMAIL_PATTERN = EMAIL_PATTERN
 
-kiwi = Kiwi() if _KIWI_OK else None
+CARD_NEAR_RE = re.compile(r"\d{4}-\d{4}-\d{4}-\d{4}")
 
-# 정규식/패턴 정의
-PHONE_PATTERNS = [ re.compile(r"^010[- ]?\d{3,4}[- ]?\d{4}$") ]
-EMAIL_PATTERN  = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
-SIMPLE_EMAIL_PATTERN = EMAIL_PATTERN
+# Kiwi 조사/어미 절단 결과 캐시 (표면형 → 잘라낼 글자 수)
+KIWI_CACHE_SIZE = int(os.getenv("PII_KIWI_CACHE_SIZE", "20000"))
+_kiwi_cut_cache = LRUCache(KIWI_CACHE_SIZE, name="kiwi_trim")
 
-SSN_RE  = re.compile(r"\b\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])-[1-4]\d{6}\b")
-CC_RE   = re.compile(r"\b(?:\d{4}[- ]?){3}\d{4}\b")
-ACCT_PATTERNS = [ r"\b\d{10}\b", r"\b\d{12}\b", r"\b\d{6}-\d{2}-\d{6}\b", r"\b\d{3}-\d{3}-\d{6}\b" ]
-ACCT_RE = [ re.compile(p) for p in ACCT_PATTERNS ]
-PASS_RE = re.compile(r"(?<![A-Z0-9])[A-Z]\s?-?\d{8}(?=\D|$)")
-
-# DLN: 카드/계좌/시간 내부 매칭 방지 (숫자 경계)
-DLN_RE  = re.compile(r"(?<!\d)(?:\d{2}-\d{2}-\d{6}-\d{2}|\d{12})(?!\d)")
-
-MONEY_RE = re.compile(r"(?<!\d)(\d{1,3}(?:,\d{3})*|\d+)\s*(원|만원|천원|억원|조원|KRW|₩)(?!\w)")
-DATE_RE  = [
-    re.compile(r"(?<!\d)\d{4}(?:[-/]|년)\d{1,2}(?:[-/]|월)\d{1,2}일?(?=\D|$)"),
-    re.compile(r"(?<!\d)\d{1,2}\s*월\s*\d{1,2}\s*일(?=\D|$)"),
-    re.compile(r"(?<!\d)\d{2}[-/.]\d{1,2}[-/.]\d{1,2}(?=\D|$)"),
-]
-# HH:MM 또는 HH:MM:SS (24h)
-TIME_RE = [
-    re.compile(r"(?<!\d)([01]?\d|2[0-3]):[0-5]\d(?!\d)"),
-    re.compile(r"(?<!\d)([01]?\d|2[0-3]):[0-5]\d:[0-5]\d(?!\d)"),
-]
+# 최종 엔티티 캐시 (정규화 텍스트 + allow_labels 해시 → 엔티티 목록). 0이면 사용하지 않는다.
+ENTITY_CACHE_SIZE = int(os.getenv("PII_ENTITY_CACHE_SIZE", "10000"))
+ENTITY_CACHE_MB   = float(os.getenv("PII_ENTITY_CACHE_MB", "64"))
 
-CARD_NEAR_RE = re.compile(r"\d{4}-\d{4}-\d{4}-\d{4}")
+def _entities_nbytes(ents: List[Dict[str, Any]]) -> int:
+    return sys.getsizeof(ents) + sum(sys.getsizeof(e) + sys.getsizeof(e.get("word", "")) for e in ents) + 64
 
-PUBLIC_INSTITUTIONS = ["시청","구청","경찰청","법원","우체국","도서관","초등학교","중학교","고등학교","공공기관"]
-BUSINESS_LABELS     = ["주문번호","주문 번호","주문No","주문ID","부서번호","대표번호","내선번호"]
+_entity_cache = LRUCache(ENTITY_CACHE_SIZE, name="entities",
+                         max_bytes=int(ENTITY_CACHE_MB * 1024 * 1024), sizeof=_entities_nbytes)
 
+# 문맥 키워드 (data/keywords.json). 검사는 텍스트마다 한 번 만든 키워드 인덱스로 한다.
+PUBLIC_INSTITUTIONS = KEYWORDS["public_institutions"]
+BUSINESS_LABELS     = KEYWORDS["business_labels"]
 # 비-PII 컨텍스트 키워드 (이 주변 숫자는 PII가 아님)
-NON_PII_CONTEXT = [
-    "구매시간","구매 일시","구매일시","주문시간","주문 일시","주문일시",
-    "결제시간","결제 일시","결제일시","등록일","작성시간","생성일자",
-    "발급일","만료일","거래시간","접속시간","로그인시간","방문시간","예약시간"
-]
-
-''' 
-텍스트를 정규화한다.
-특수 기호를 표준 하이픈으로 치환, 공백 압축, 유니코드 NFKC 정규화를 적용한다.
-'''
-def normalize_text(text: str) -> str:
-    text = text.replace("–", "-").replace("ㅡ", "-")
-    text = re.sub(r"\s+", " ", text)
-    text = unicodedata.normalize("NFKC", text)
-    return text
+NON_PII_CONTEXT     = KEYWORDS["non_pii_context"]
 
 '''
 문자열이 여권번호 형식(A+8자리)인지 검사한다.
@@ -112,7 +90,7 @@ def find_spans(text: str, patterns: List[re.Pattern]) -> List[Tuple[int,int]]:
     return spans
 
 '''
-정규식 매칭 결과를 엔티티(dict) 리스트로 변환하여 추가한다.
+정규식 매칭 결과를 엔티티(Span) 리스트로 변환하여 추가한다.
 - patterns: re.Pattern 또는 패턴 리스트
 - tag: 부여할 라벨명
 '''
@@ -121,36 +99,26 @@ def add_regex_entities(text: str, patterns, tag: str) -> List[Dict[str, Any]]:
     if isinstance(patterns, re.Pattern):
         patterns = [patterns]
     compiled = [re.compile(p) if isinstance(p, str) else p for p in patterns]
-    ents: List[Dict[str, Any]] = []
+    ents: List[Span] = []
     for p in compiled:
         for m in p.finditer(text):
-            ents.append({
-                "entity_group": tag,
-                "word": m.group(),
-                "start": m.start(),
-                "end": m.end(),
-                "score": 1.0
-            })
+            ents.append(Span(tag, m.group(), m.start(), m.end(), 1.0))
     return ents
 
 '''
 NER 결과에 이메일 정규식 매칭을 보강하여 EMAIL 엔티티를 추가한다.
 이미 존재하는 이메일 문자열은 중복 추가하지 않는다.
+scan(규칙 스캔 결과)을 넘기면 텍스트를 다시 스캔하지 않는다.
 '''
-def add_email_entities(text: str, existing_entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def add_email_entities(text: str, existing_entities: List[Dict[str, Any]],
+                       scan: Dict[str, List[Tuple[int,int]]] | None = None) -> List[Dict[str, Any]]:
     new_entities = existing_entities.copy()
     existing_words = {e["word"] for e in existing_entities if e.get("entity_group") == "EMAIL"}
-    for m in EMAIL_PATTERN.finditer(text):
-        email = m.group()
+    for s, t in scan_text(text, scan)["EMAIL"]:
+        email = text[s:t]
         if email in existing_words:
             continue
-        new_entities.append({
-            "entity_group": "EMAIL",
-            "word": email,
-            "start": m.start(),
-            "end": m.end(),
-            "score": 1.0
-        })
+        new_entities.append(Span("EMAIL", email, s, t, 1.0))
         existing_words.add(email)
     return new_entities
 
@@ -158,31 +126,27 @@ def add_email_entities(text: str, existing_entities: List[Dict[str, Any]]) -> Li
 NER 엔티티와 정규식 엔티티를 병합한다.
 동일 (start,end,label) 충돌 시 NER 결과를 우선한다.
 점수/길이를 보조 기준으로 더 신뢰도 높은 것을 선택한다.
+scan(규칙 스캔 결과)을 넘기면 텍스트를 다시 스캔하지 않는다.
 '''
-def merge_entities(text: str, ner_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    merged = []
+def merge_entities(text: str, ner_results: List[Dict[str, Any]],
+                   scan: Dict[str, List[Tuple[int,int]]] | None = None) -> List[Dict[str, Any]]:
+    merged: List[Span] = []
     for e in ner_results:
-        merged.append({
-            "entity_group": e.get("entity_group") or e.get("label") or e.get("entity"),
-            "word": e.get("word", ""),
-            "start": int(e.get("start", text.find(e.get("word", "")))),
-            "end": int(e.get("end", 0) or (text.find(e.get("word", "")) + len(e.get("word", "")))),
-            "score": float(e.get("score", 1.0)),
-            "_source": "ner",
-        })
-    regex_ents = []
-    regex_ents += add_regex_entities(text, PASS_RE, "PASS")
-    regex_ents += add_regex_entities(text, DLN_RE,  "DLN")
-    regex_ents += add_regex_entities(text, SSN_RE,  "SSN")
-    regex_ents += add_regex_entities(text, CC_RE,   "CC")
-    regex_ents += add_regex_entities(text, ACCT_RE, "ACCT")
-    regex_ents += add_regex_entities(text, MONEY_RE,"MONEY")
-    for e in regex_ents:
-        e["_source"] = "regex"
-    merged.extend(regex_ents)
+        word = e.get("word", "")
+        merged.append(Span(
+            e.get("entity_group") or e.get("label") or e.get("entity"),
+            word,
+            int(e.get("start", text.find(word))),
+            int(e.get("end", 0) or (text.find(word) + len(word))),
+            float(e.get("score", 1.0)),
+            "ner",
+        ))
+    scan = scan_text(text, scan)
+    for tag in ("PASS", "DLN", "SSN", "CC", "ACCT", "MONEY"):
+        merged += spans_to_entities(text, scan[tag], tag, source="regex")
 
     # 정확히 동일 (start,end,label) → NER 우선
-    exact: dict[tuple[int,int,str], dict] = {}
+    exact: dict[tuple[int,int,str], Span] = {}
     for e in merged:
         key = (e["start"], e["end"], e["entity_group"])
         if key not in exact:
@@ -218,11 +182,7 @@ def merge_pass_dln_fragments(entities: List[Dict[str, Any]], text: str) -> List[
                     end = max(end, ents[j]["end"])
                     skip.add(j)
                 j += 1
-            merged.append({
-                "entity_group": e["entity_group"],
-                "word": text[start:end],
-                "start": start, "end": end, "score": 1.0
-            })
+            merged.append(Span(e["entity_group"], text[start:end], start, end, 1.0))
         else:
             merged.append(e)
     return merged
@@ -231,53 +191,44 @@ def merge_pass_dln_fragments(entities: List[Dict[str, Any]], text: str) -> List[
 주민등록번호와 겹치는 계좌번호 라벨은 제거한다.
 '''
 def remove_account_if_ssn_overlap(entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    ssn_spans = [(e["start"], e["end"]) for e in entities if e["entity_group"] == "SSN"]
-    if not ssn_spans:
+    ssn_index = SpanIndex.of_label(entities, "SSN")
+    if not ssn_index:
         return entities
-    def overlap(a,b): return not (a[1] <= b[0] or a[0] >= b[1])
-    out = []
-    for e in entities:
-        if e["entity_group"] == "ACCT" and any(overlap((e["start"],e["end"]), s) for s in ssn_spans):
-            continue
-        out.append(e)
-    return out
+    return drop_overlapping(entities, ssn_index, ("ACCT",))
 
 '''
 특정 라벨(prefer)이 존재하는 범위에서는 suppress 라벨을 제거한다.
 '''
 def prefer_label_over(entities: List[Dict[str, Any]], prefer="CC", suppress=("DLN","ACCT")) -> List[Dict[str, Any]]:
-    spans = [(e["start"], e["end"]) for e in entities if e.get("entity_group") == prefer]
-    if not spans:
+    index = SpanIndex.of_label(entities, prefer)
+    if not index:
         return entities
-    def overlap(a,b): return not (a[1] <= b[0] or a[0] >= b[1])
-    out = []
-    for e in entities:
-        if e.get("entity_group") in suppress and any(overlap((e["start"], e["end"]), s) for s in spans):
-            continue
-        out.append(e)
-    return out
+    return drop_overlapping(entities, index, suppress)
 
 '''
 지정한 범위 주변 문맥에 비-PII 키워드가 있는지 검사한다.
 존재하면 해당 숫자 라벨을 민감정보로 보지 않는다.
+hits(텍스트의 키워드 인덱스)를 넘기면 텍스트를 다시 스캔하지 않는다.
 '''
-def context_has_non_pii(text: str, start: int, end: int, window: int = 18) -> bool:
+def context_has_non_pii(text: str, start: int, end: int, window: int = 18,
+                        hits: KeywordHits | None = None) -> bool:
     l = max(0, start - window)
     r = min(len(text), end + window)
-    ctx = text[l:r]
-    return any(kw in ctx for kw in NON_PII_CONTEXT)
+    return keyword_hits(text, hits).within("non_pii_context", l, r)
 
 '''
 엔티티 후처리를 수행한다.
 비-PII 문맥 제거, PHONE/EMAIL/ADDR의 간단 형식 검증,공공기관/업무성 키워드 주변 주소 제거를 진행한다. 
 '''
-def postprocess_entities(text: str, ents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def postprocess_entities(text: str, ents: List[Dict[str, Any]],
+                         hits: KeywordHits | None = None) -> List[Dict[str, Any]]:
+    hits = keyword_hits(text, hits)
     out: List[Dict[str, Any]] = []
     for e in ents:
         tag = e["entity_group"]; word = e["word"].replace(" ",""); keep = True
 
         if tag in {"DLN","ACCT","CC","PASS","SSN","PHONE","EMAIL"}:
-            if context_has_non_pii(text, e["start"], e["end"]):
+            if context_has_non_pii(text, e["start"], e["end"], hits=hits):
                 keep = False
 
         if keep and tag == "PHONE":
@@ -285,13 +236,11 @@ def postprocess_entities(text: str, ents: List[Dict[str, Any]]) -> List[Dict[str
         if keep and tag == "EMAIL":
             keep = bool(EMAIL_PATTERN.fullmatch(word))
         if keep and tag == "ADDR":
-            ctx = text[max(0, e["start"]-10): e["end"]+10]
-            if any(kw in ctx for kw in PUBLIC_INSTITUTIONS):
+            if hits.within("public_institutions", e["start"]-10, e["end"]+10):
                 keep = False
 
         if keep:
-            ctx2 = text[max(0, e["start"]-10): e["end"]+10]
-            if any(kw in ctx2 for kw in BUSINESS_LABELS):
+            if hits.within("business_labels", e["start"]-10, e["end"]+10):
                 keep = False
 
         if keep:
@@ -320,13 +269,14 @@ def find_time_spans(text: str) -> List[Tuple[int,int]]:
 날짜/시간/금액과의 겹침을 고려해 민감정보 오탐을 줄인다.
 날짜/시간과 겹치면 숫자 라벨 제거, 금액 인접 시 카드/여권/계좌/면허 제거를 진행한다.
 카드/여권 형식을 간단 검증한다.
+scan(규칙 스캔 결과)을 넘기면 텍스트를 다시 스캔하지 않는다.
 '''
-def post_filter_entities(text: str, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    money_spans = find_money_spans(text)
-    date_spans  = find_date_like_spans(text)
-    time_spans  = find_time_spans(text)
-
-    def overlaps(a_start,a_end,b_start,b_end): return not (a_end <= b_start or a_start >= b_end)
+def post_filter_entities(text: str, entities: List[Dict[str, Any]],
+                         scan: Dict[str, List[Tuple[int,int]]] | None = None) -> List[Dict[str, Any]]:
+    scan = scan_text(text, scan)
+    money_index = SpanIndex(scan["MONEY"])
+    date_index  = SpanIndex(scan["DATE"])
+    time_index  = SpanIndex(scan["TIME"])
 
     filtered: List[Dict[str, Any]] = []
     for e in entities:
@@ -336,13 +286,13 @@ def post_filter_entities(text: str, entities: List[Dict[str, Any]]) -> List[Dict
             s = text.find(e["word"]); start, end = s, s+len(e["word"])
 
         if tag in {"DLN","ACCT","CC","PASS","SSN","PHONE","EMAIL"}:
-            if any(overlaps(start,end,ds,de) for ds,de in date_spans):
+            if date_index.overlaps(start, end):
                 continue
-            if any(overlaps(start,end,ts,te) for ts,te in time_spans):
+            if time_index.overlaps(start, end):
                 continue
 
         if tag in {"CC","PASS","DLN","ACCT"}:
-            near_money = any(overlaps(start,end,ms,me) or abs(start-me) <= 1 for ms,me in money_spans)
+            near_money = money_index.overlaps(start, end) or money_index.end_within(start, 1)
             if near_money:
                 continue
 
@@ -351,7 +301,10 @@ def post_filter_entities(text: str, entities: List[Dict[str, Any]]) -> List[Dict
         if tag == "PASS" and not looks_like_passport(e["word"]):
             continue
 
-        filtered.append({"entity_group": tag, "word": e["word"], "start": start, "end": end, "score": e.get("score", 1.0)})
+        if start == e.get("start") and end == e.get("end"):
+            filtered.append(e)
+        else:
+            filtered.append(Span(tag, e["word"], start, end, e.get("score", 1.0)))
     return filtered
 
 '''
@@ -359,17 +312,10 @@ def post_filter_entities(text: str, entities: List[Dict[str, Any]]) -> List[Dict
 '''
 def remove_if_overlap_priority(entities: List[Dict[str, Any]], prefer: str = "SSN",
                                suppress: Tuple[str,...] = ("DLN","ACCT","CC","PASS")) -> List[Dict[str, Any]]:
-    pref_spans = [(e["start"], e["end"]) for e in entities if e.get("entity_group") == prefer]
-    if not pref_spans:
+    pref_index = SpanIndex.of_label(entities, prefer)
+    if not pref_index:
         return entities
-    def overlap(a:Tuple[int,int], b:Tuple[int,int]) -> bool: return not (a[1] <= b[0] or a[0] >= b[1])
-    out: List[Dict[str, Any]] = []
-    for e in entities:
-        if e.get("entity_group") in suppress:
-            if any(overlap((e["start"],e["end"]), s) for s in pref_spans):
-                continue
-        out.append(e)
-    return out
+    return drop_overlapping(entities, pref_index, suppress)
 
 '''
 같은 라벨이 서로 인접하거나 지정 간격(max_gap) 이내일 때 병합한다.
@@ -386,13 +332,7 @@ def merge_adjacent_same_label(entities: List[Dict[str, Any]], label: str, text:
             while j < len(ents) and ents[j].get("entity_group") == label and ents[j]["start"] <= end + max_gap:
                 end = max(end, ents[j]["end"])
                 j += 1
-            out.append({
-                "entity_group": label,
-                "word": text[start:end],
-                "start": start,
-                "end": end,
-                "score": 1.0
-            })
+            out.append(Span(label, text[start:end], start, end, 1.0))
             i = j
         else:
             out.append(e)
@@ -401,17 +341,21 @@ def merge_adjacent_same_label(entities: List[Dict[str, Any]], label: str, text:
 
 '''
 라벨별 일관된 인덱스를 유지하며 텍스트를 마스킹한다.
-state에 누적하여 파일 단위로 동일 값에 동일 인덱스를 부여한다.
+state에 누적하여 파일 단위로 동일 값에 동일 인덱스를 부여한다. (state["store"]가 있으면 그 저장소에 누적)
+state에 pseudonym_key가 있으면 순번 대신 (라벨, 값)의 키 해시를 인덱스로 쓰므로 state를 공유하지 않아도 같은 토큰이 나온다.
 MONEY/DATE 등 제외 라벨은 마스킹하지 않는다.
 '''
 def mask_entities_with_indexing(text: str, entities: List[Dict[str, Any]], state: Dict[str, Any] | None = None) -> str:
+    return mask_entities_with_offsets(text, entities, state=state)[0]
+
+'''
+mask_entities_with_indexing과 같이 마스킹하고, 마스킹된 토큰의 위치 정보도 함께 반환한다.
+위치 정보: [{"label", "start", "end"(결과 문자열 기준), "src_start", "src_end"(원문 기준)}]
+'''
+def mask_entities_with_offsets(text: str, entities: List[Dict[str, Any]],
+                               state: Dict[str, Any] | None = None) -> Tuple[str, List[Dict[str, Any]]]:
     EXCLUDE_LABELS = {"MONEY","DATE"}
-    if state is None:
-        label_value_map: Dict[str, Dict[str,int]] = defaultdict(dict)
-        label_counter:   Dict[str,int] = defaultdict(int)
-    else:
-        label_value_map = state.setdefault("label_value_map", defaultdict(dict))
-        label_counter   = state.setdefault("label_counter",   defaultdict(int))
+    key = state_key(state)
 
     PRIORITY = { "SSN":3, "EMAIL":2, "PHONE":2, "ADDR":2, "NAME":2, "DLN":1, "ACCT":1, "CC":1, "PASS":1, "MONEY":0, "DATE":0 }
 
@@ -419,80 +363,296 @@ def mask_entities_with_indexing(text: str, entities: List[Dict[str, Any]], state
     ents.sort(key=lambda x: (x.get("start",0), PRIORITY.get(x.get("entity_group"),0)), reverse=True)
 
     seen_email: set[str] = set()
-    for e in reversed(ents):
-        label = e["entity_group"]; value = e["word"]
-        if label == "EMAIL":
-            if not EMAIL_PATTERN.fullmatch(value): continue
-            if value in seen_email: continue
-            seen_email.add(value)
-        if value not in label_value_map[label]:
-            label_counter[label] += 1
-            label_value_map[label][value] = label_counter[label]
-
-    masked = text
-    used_spans: List[Tuple[int,int]] = []
+    indices: Dict[Tuple[str,str], int] = {}
+    if key is None:
+        pairs: List[Tuple[str,str]] = []
+        for e in reversed(ents):
+            label = e["entity_group"]; value = e["word"]
+            if label == "EMAIL":
+                if not EMAIL_PATTERN.fullmatch(value): continue
+                if value in seen_email: continue
+                seen_email.add(value)
+            pairs.append((label, value))
+        # state["store"]가 있으면 그 저장소에서, 없으면 state의 label_value_map/label_counter로 번호를 받는다
+        indices = get_store(state).assign_indices(pairs)
+
+    # 시작 위치 내림차순으로 치환 구간을 고르므로 이미 고른 구간은 모두 현재 시작 이후에 있다.
+    # 겹침은 (비어 있지 않은 구간의 최소 시작 < 현재 끝)으로 판정하고, 빈 구간만 따로 검사한다.
+    chosen: List[Tuple[int,int,str,str]] = []
+    used_min_start: int | None = None
+    used_empty: List[int] = []
     for e in ents:
         label = e["entity_group"]; value = e["word"]
         start = e.get("start", text.find(value)); end = e.get("end", start + len(value))
-        if any(not (end <= s or start >= t) for s,t in used_spans):  
+        if used_min_start is not None and used_min_start < end:
+            continue
+        if any(start < s < end for s in used_empty):
             continue
-        idx = label_value_map[label].get(value)
+        if key is not None:
+            if label == "EMAIL" and not EMAIL_PATTERN.fullmatch(value):
+                continue
+            idx = pseudonym_suffix(key, label, value)
+        else:
+            idx = indices.get((label, value))
         if idx is None: 
             continue
         kor = LABELS_KOR.get(label, label)
         token = f"[{kor}_{idx}]"
-        masked = masked[:start] + token + masked[end:]
-        used_spans.append((start, end))
-    return masked
+        chosen.append((start, end, token, label))
+        if end > start:
+            used_min_start = start if used_min_start is None else min(used_min_start, start)
+        else:
+            used_empty.append(start)
+
+    chosen.sort(key=lambda c: (c[0], c[1]))
+    masked, offsets = rewrite_spans(text, [c[:3] for c in chosen])
+    spans = [{"label": c[3], "start": o[2], "end": o[3], "src_start": o[0], "src_end": o[1]}
+             for c, o in zip(chosen, offsets)]
+    return masked, spans
+
+'''
+마스킹 검출 파이프라인 단계들. (ctx: text, ner_results, scan, allow_labels, cuts)
+merge_pass_dln은 PASS/DLN이 없으면 start 정렬만 하므로, 그 정렬은 email 단계에서 미리 해 둔다.
+'''
+def _stage_merge(ctx, ents):
+    return merge_entities(ctx["text"], ctx["ner_results"], scan=ctx["scan"])
+
+def _stage_email(ctx, ents):
+    return sorted(add_email_entities(ctx["text"], ents, scan=ctx["scan"]), key=lambda x: x.get("start", 0))
+
+def _stage_postprocess(ctx, ents):
+    return postprocess_entities(ctx["text"], ents, hits=keyword_hits(ctx["text"]))
+
+def _stage_allow(ctx, ents):
+    allow = ctx["allow_labels"]
+    if allow is None:
+        return ents
+    return [e for e in ents if e.get("entity_group") in allow]
+
+MASK_PIPELINE = register_pipeline(Pipeline("mask", [
+    Stage("merge", _stage_merge, source=True),
+    Stage("email", _stage_email, source=True),
+    Stage("merge_pass_dln", lambda ctx, ents: merge_pass_dln_fragments(ents, ctx["text"]), needs=("PASS", "DLN")),
+    Stage("postprocess", _stage_postprocess),
+    Stage("post_filter", lambda ctx, ents: post_filter_entities(ctx["text"], ents, scan=ctx["scan"]),
+          needs=("DLN", "ACCT", "CC", "PASS", "SSN", "PHONE", "EMAIL")),
+    Stage("ssn_over_acct", lambda ctx, ents: remove_account_if_ssn_overlap(ents), needs=("SSN",)),
+    Stage("ssn_priority", lambda ctx, ents: remove_if_overlap_priority(ents, "SSN", ("DLN","ACCT","CC","PASS")),
+          needs=("SSN",)),
+    Stage("cc_priority", lambda ctx, ents: prefer_label_over(ents, "CC", ("DLN", "ACCT")), needs=("CC",)),  # 카드 우선
+    Stage("merge_names", lambda ctx, ents: merge_adjacent_same_label(ents, "NAME", ctx["text"], max_gap=1),
+          needs=("NAME",)),
+    Stage("allow", _stage_allow),
+    # Kiwi 조사 절단은 기본으로 끈다. 켜면(stages={"trim": True}) 체언 뒤의 조사만 자른다 (_postposition_cut)
+    Stage("trim", lambda ctx, ents: trim_postpositions_with_kiwi(ents, ctx["text"], cuts=ctx.get("cuts")),
+          enabled=False),
+]))
+
+'''
+정규화된 텍스트 한 건에서 마스킹 대상 엔티티를 검출한다.
+NER + 정규식 결과 병합 및 각종 후처리를 거친 최종 엔티티 목록을 반환한다.
+ner_results를 넘기면 NER을 다시 돌리지 않고 그 결과를 사용한다.
+규칙 스캔은 한 번만 수행하고(scan을 넘기면 재사용) 병합/이메일/필터 단계가 공유한다.
+allow_labels가 지정되면 해당 라벨만 유지한다.
+trim=False이면 Kiwi 조사 절단을 호출자에게 맡긴다. (여러 텍스트를 모아 한 번에 분석할 때)
+stages({단계 이름: True/False})로 이번 호출에서 단계를 켜고 끌 수 있다. (MASK_PIPELINE 참고)
+'''
+def detect_entities(text: str,
+                    ner_results: List[Dict[str, Any]] | None = None,
+                    allow_labels: Set[str] | None = None,
+                    scan: Dict[str, List[Tuple[int,int]]] | None = None,
+                    trim: bool = True,
+                    stages: Dict[str, bool] | None = None) -> List[Dict[str, Any]]:
+    if ner_results is None:
+        ner_results = ner(text)
+    overrides = MASK_PIPELINE.check_overrides(stages)
+    if not trim:
+        overrides["trim"] = False
+    ctx = _mask_context(text, ner_results, allow_labels, scan)
+    return MASK_PIPELINE.run(ctx, [], overrides)
+
+def _mask_context(text: str, ner_results: List[Dict[str, Any]], allow_labels: Set[str] | None = None,
+                  scan: Dict[str, List[Tuple[int,int]]] | None = None) -> Dict[str, Any]:
+    return {"text": text, "ner_results": ner_results, "scan": scan_text(text, scan),
+            "allow_labels": allow_labels, "cuts": None}
+
+'''
+엔티티 캐시 키: 정규화 텍스트, allow_labels, 단계 설정, NER 모드(pack/tiered)의 해시. (None과 빈 집합은 다른 키)
+pack/tiered는 NER 결과 자체를 바꾸므로 호출자가 실제로 적용되는 값을 넘긴다.
+'''
+def entity_cache_key(text: str, allow_labels: Set[str] | None = None,
+                     stages: Dict[str, bool] | None = None,
+                     pack: bool = False, tiered: bool = False) -> bytes:
+    h = hashlib.blake2b(text.encode("utf-8"), digest_size=16)
+    h.update(bytes((0x03, int(pack), int(tiered))))
+    if allow_labels is None:
+        h.update(b"\x01")
+    else:
+        h.update(b"\x00" + "\x1f".join(sorted(allow_labels)).encode("utf-8"))
+    if stages:
+        h.update(b"\x02" + "\x1f".join(f"{k}={int(v)}" for k, v in sorted(stages.items())).encode("utf-8"))
+    return h.digest()
+
+'''
+정규화된 텍스트들의 최종 엔티티를 엔티티 캐시를 거쳐 구한다.
+캐시에 없는 텍스트만(같은 텍스트는 한 번만) 배치 NER과 후처리를 거치고 결과를 캐시에 넣는다.
+조사 절단(trim) 단계 직전에 멈춰 모든 단어를 모은 뒤 Kiwi 분석을 한 번에 하고 나머지 단계를 잇는다.
+인덱싱(마스킹 번호 부여)은 캐시 대상이 아니므로 호출자가 매번 수행한다.
+'''
+def detect_entities_cached(texts: Sequence[str], allows: Sequence[Set[str] | None],
+                           batch_size: int | None = None, pack: bool | None = None,
+                           stages: Dict[str, bool] | None = None) -> List[List[Dict[str, Any]]]:
+    overrides = MASK_PIPELINE.check_overrides(stages)
+    packed = inference.NER_PACK if pack is None else pack
+    tiered = fast_tier.tiered_enabled()
+    results: List[List[Dict[str, Any]] | None] = [None] * len(texts)
+    misses: Dict[bytes, List[int]] = {}
+    for i, (text, allow) in enumerate(zip(texts, allows)):
+        key = entity_cache_key(text, allow, overrides, packed, tiered)
+        hit = _entity_cache.get(key) if key not in misses else None
+        if hit is not None:
+            results[i] = hit
+        else:
+            misses.setdefault(key, []).append(i)
+
+    if misses:
+        firsts = [pos[0] for pos in misses.values()]
+        ner_results = ner_many([texts[i] for i in firsts], batch_size=batch_size, pack=packed, tiered=tiered)
+        ctxs = [_mask_context(texts[i], r, allows[i]) for i, r in zip(firsts, ner_results)]
+        found = [MASK_PIPELINE.run(ctx, [], overrides, stop="trim") for ctx in ctxs]
+        if MASK_PIPELINE.is_enabled("trim", overrides):
+            t0 = time.perf_counter()
+            cuts = postposition_cuts([e["word"] for ents in found for e in ents])
+            MASK_PIPELINE.timings.record([("kiwi_batch", "runs", (time.perf_counter() - t0) * 1000.0)])
+            for ctx in ctxs:
+                ctx["cuts"] = cuts
+        for (key, pos), ctx, ents in zip(misses.items(), ctxs, found):
+            final = MASK_PIPELINE.run(ctx, ents, overrides, start="trim")
+            _entity_cache.put(key, final)
+            for j in pos:
+                results[j] = final
+    return [list(ents) for ents in results]
 
 '''
 텍스트 한 건을 마스킹한다.
-NER + 정규식 결과 병합 및 각종 후처리를 거친 뒤 마스킹한다.
+정규화 후(이미 정규화된 NormalizedText면 그대로) detect_entities로 엔티티를 검출하고 마스킹한다.
 state를 넘기면 파일 단위 인덱싱을 누적 유지한다.
 allow_labels가 지정되면 해당 라벨만 유지한다.
+stages({단계 이름: True/False})로 검출 단계를 켜고 끌 수 있다.
 '''
-def mask_one(raw_text: str,
+def mask_one(raw_text: str | NormalizedText,
              state: Dict[str, Any] | None = None,
-             allow_labels: Set[str] | None = None) -> str:
-    text = normalize_text(raw_text)
-    ner_results = ner(text)
-
-    final = merge_entities(text, ner_results)
-    final = add_email_entities(text, final)
-    final = merge_pass_dln_fragments(final, text)
-    final = postprocess_entities(text, final)
-    final = post_filter_entities(text, final)
-    final = remove_account_if_ssn_overlap(final)
-    final = remove_if_overlap_priority(final, "SSN", ("DLN","ACCT","CC","PASS"))
-    final = prefer_label_over(final, "CC", ("DLN", "ACCT"))  # 카드 우선
-    final = merge_adjacent_same_label(final, "NAME", text, max_gap=1)
-    if allow_labels is not None:
-        final = [e for e in final if e.get("entity_group") in allow_labels]
-    final = trim_postpositions_with_kiwi(final, text)
-
+             allow_labels: Set[str] | None = None,
+             stages: Dict[str, bool] | None = None) -> str:
+    text = as_normalized(raw_text)
+    final = detect_entities_cached([text], [allow_labels], stages=stages)[0]
     masked = mask_entities_with_indexing(text, final, state=state)
     return masked
 
 '''
-형태소 분석이 가능하면 조사/어미(J/E류)를 잘라서 깔끔한 토큰 경계를 만든다.
-'''
-def trim_postpositions_with_kiwi(entities: List[Dict[str, Any]], text: str) -> List[Dict[str, Any]]:
+allow_labels 인자를 텍스트별 목록으로 펼친다.
+단일 집합(또는 None)이면 모든 텍스트에 공통 적용하고, 리스트/튜플이면 텍스트별 값으로 본다.
+'''
+def allow_labels_per_text(allow_labels, n: int) -> List[Set[str] | None]:
+    if isinstance(allow_labels, (list, tuple)):
+        if len(allow_labels) != n:
+            raise ValueError("allow_labels length must match texts")
+        return list(allow_labels)
+    return [allow_labels] * n
+
+'''
+여러 텍스트를 한 번에 마스킹한다.
+NER은 길이 버킷 단위 배치(ner_many)로 수행하고, 인덱싱은 입력 순서대로 state에 누적하므로
+mask_one을 순서대로 호출한 결과와 동일하다.
+allow_labels는 공통 집합 또는 텍스트별 집합 리스트를 받는다.
+pack=True이면 짧은 셀들을 한 시퀀스로 묶어 모델 호출 수를 줄인다.
+label_counts를 넘기면 검출된 최종 엔티티 수를 라벨별로 더한다. (파일 통계를 검출을 다시 하지 않고 모을 때)
+'''
+def mask_many(raw_texts: Sequence[str | NormalizedText],
+              state: Dict[str, Any] | None = None,
+              allow_labels: Set[str] | Sequence[Set[str] | None] | None = None,
+              batch_size: int | None = None,
+              pack: bool | None = None,
+              stages: Dict[str, bool] | None = None,
+              label_counts: Dict[str, int] | None = None) -> List[str]:
+    texts = [as_normalized(t) for t in raw_texts]
+    allows = allow_labels_per_text(allow_labels, len(texts))
+    found = detect_entities_cached(texts, allows, batch_size=batch_size, pack=pack, stages=stages)
+    if label_counts is not None:
+        for ents in found:
+            for e in ents:
+                label_counts[e["entity_group"]] = label_counts.get(e["entity_group"], 0) + 1
+    return [mask_entities_with_indexing(text, final, state=state) for text, final in zip(texts, found)]
+
+# 조사를 떼어낼 수 있는 앞 형태소 (체언/명사 파생 접미사/숫자·외국어·시리얼)
+_TRIM_STEM_TAGS = ("NN", "NP", "NR", "XSN", "SN", "SL", "W_")
+
+'''
+형태소 분석 결과 한 건에서 잘라낼 끝부분 조사(J류) 길이를 구한다.
+마지막 형태소가 조사이고 그 앞이 체언류이며, 조사가 단어 끝까지 이어질 때만 자른다.
+길이는 원형이 아니라 단어 안에서 조사가 차지하는 표면 구간(start)으로 정한다.
+이름 끝 글자가 어미/조사로 분석되는 경우(정하나, 김수야, 이도)를 피하려고 어미(E류)는 자르지 않고, 남는 부분이 두 글자 미만이면 자르지 않는다.
+'''
+def _postposition_cut(word: str, analyzed) -> int:
+    if not analyzed or not analyzed[0]:
+        return 0
+    tokens = analyzed[0][0]
+    if len(tokens) < 2:
+        return 0
+    last, prev = tokens[-1], tokens[-2]
+    if not last.tag.startswith("J") or not prev.tag.startswith(_TRIM_STEM_TAGS):
+        return 0
+    if last.start + last.len != len(word) or last.start < 2:
+        return 0
+    return len(word) - last.start
+
+'''
+단어(표면형)별 잘라낼 길이를 구한다.
+캐시에 없는 단어만 모아 Kiwi 다중 텍스트 API로 한 번에 분석하고 결과를 LRU에 저장한다.
+'''
+def postposition_cuts(words: Sequence[str]) -> Dict[str, int]:
+    cuts: Dict[str, int] = {}
+    todo: List[str] = []
+    for w in dict.fromkeys(words):
+        c = _kiwi_cut_cache.get(w)
+        if c is None: todo.append(w)
+        else: cuts[w] = c
+    if not todo:
+        return cuts
+    kiwi = get_kiwi()
     if not kiwi:
-        return entities
-    trimmed: List[Dict[str, Any]] = []
-    for e in entities:
-        start,end = e["start"], e["end"]; word = e["word"]
+        return {w: 0 for w in words}
+    try:
+        results = list(kiwi.analyze(todo))
+    except Exception:
+        results = None
+    for i, w in enumerate(todo):
         try:
-            a = kiwi.analyze(word)
-            if not a or not a[0]:
-                trimmed.append(e); continue
-            morphs = a[0][1]; last = morphs[-1] if morphs else None
-            if last and last[1].startswith(("J","E")) and len(morphs) > 1:
-                cut = len(last[0]); end -= cut; word = word[:-cut]
+            c = _postposition_cut(w, results[i] if results is not None else kiwi.analyze(w))
         except Exception:
-            pass
-        e2 = e.copy(); e2["end"] = end; e2["word"] = word
-        trimmed.append(e2)
+            c = 0
+        cuts[w] = c
+        _kiwi_cut_cache.put(w, c)
+    return cuts
+
+'''
+형태소 분석이 가능하면 끝의 조사(J류)를 잘라서 깔끔한 토큰 경계를 만든다.
+엔티티 단어들은 postposition_cuts로 한 번에 분석한다. (cuts를 넘기면 그 결과를 쓴다)
+'''
+def trim_postpositions_with_kiwi(entities: List[Dict[str, Any]], text: str,
+                                 cuts: Dict[str, int] | None = None) -> List[Dict[str, Any]]:
+    if not entities:
+        return entities
+    if cuts is None:
+        if not get_kiwi():
+            return entities
+        cuts = postposition_cuts([e["word"] for e in entities])
+    trimmed: List[Span] = []
+    for e in entities:
+        cut = cuts.get(e["word"], 0)
+        if cut:
+            e = Span.from_dict(e).replace(end=e["end"] - cut, word=e["word"][:-cut])
+        trimmed.append(e)
     return trimmed
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+from __future__ import annotations
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Sequence
+
+# 단계별 소요 시간 히스토그램 구간 상한 (ms). 마지막 구간은 그 이상 전부.
+TIMING_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+'''
+파이프라인의 한 단계.
+fn(ctx, entities) -> entities 형태이며, ctx는 텍스트/규칙 스캔 등 단계들이 공유하는 값이다.
+needs가 주어지면 현재 엔티티에 그 라벨 중 하나라도 있을 때만 실행하고(없으면 건너뜀),
+source=True인 단계(엔티티를 새로 만드는 단계)는 엔티티가 없어도 실행한다.
+enabled=False인 단계는 요청에서 켜야만 실행한다.
+'''
+class Stage:
+    __slots__ = ("name", "fn", "needs", "source", "enabled")
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any], List[Any]], List[Any]],
+                 needs: Iterable[str] | None = None, source: bool = False, enabled: bool = True):
+        self.name = name
+        self.fn = fn
+        self.needs: FrozenSet[str] | None = frozenset(needs) if needs is not None else None
+        self.source = source
+        self.enabled = enabled
+
+    def applies(self, labels: FrozenSet[str] | set) -> bool:
+        if self.source:
+            return True
+        if not labels:
+            return False
+        return self.needs is None or not self.needs.isdisjoint(labels)
+
+'''
+단계별 실행 횟수/건너뛴 횟수/누적 시간과 소요 시간 히스토그램.
+'''
+class StageTimings:
+    def __init__(self, names: Sequence[str]):
+        self._lock = threading.Lock()
+        self._data = {n: self._empty() for n in names}
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"runs": 0, "skipped": 0, "disabled": 0, "total_ms": 0.0,
+                "buckets": [0] * (len(TIMING_BUCKETS_MS) + 1)}
+
+    def record(self, runs: Sequence[tuple]) -> None:
+        with self._lock:
+            for name, outcome, ms in runs:
+                d = self._data.setdefault(name, self._empty())
+                if outcome != "runs":
+                    d[outcome] += 1
+                    continue
+                d["runs"] += 1
+                d["total_ms"] += ms
+                d["buckets"][bisect_left(TIMING_BUCKETS_MS, ms)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in TIMING_BUCKETS_MS] + [f">{TIMING_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return {
+                name: {
+                    "runs": d["runs"],
+                    "skipped": d["skipped"],
+                    "disabled": d["disabled"],
+                    "total_ms": round(d["total_ms"], 3),
+                    "mean_ms": round(d["total_ms"] / d["runs"], 4) if d["runs"] else 0.0,
+                    "histogram": dict(zip(labels, d["buckets"])),
+                }
+                for name, d in self._data.items()
+            }
+
+'''
+선언된 단계들을 순서대로 실행하는 파이프라인.
+각 단계 전에 현재 엔티티의 라벨 집합으로 실행 여부를 판단하고, 실행한 단계의 시간을 기록한다.
+overrides({단계 이름: True/False})로 요청마다 단계를 켜고 끌 수 있다.
+start/stop을 주면 [start, stop) 구간의 단계만 실행한다. (여러 텍스트를 모아 중간 단계를 배치로 처리할 때)
+'''
+class Pipeline:
+    def __init__(self, name: str, stages: Sequence[Stage]):
+        self.name = name
+        self.stages = list(stages)
+        names = [s.name for s in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate stage name in pipeline {name}")
+        self.timings = StageTimings(names)
+
+    def stage_names(self) -> List[str]:
+        return [s.name for s in self.stages]
+
+    '''
+    overrides를 적용했을 때 단계가 켜져 있는지 반환한다.
+    '''
+    def is_enabled(self, name: str, overrides: Mapping[str, bool] | None = None) -> bool:
+        stage = self.stages[self.stage_names().index(name)]
+        return bool((overrides or {}).get(name, stage.enabled))
+
+    def check_overrides(self, overrides: Mapping[str, bool] | None) -> Dict[str, bool]:
+        if not overrides:
+            return {}
+        unknown = set(overrides) - set(self.stage_names())
+        if unknown:
+            raise ValueError(f"unknown stage(s): {', '.join(sorted(unknown))}")
+        return {k: bool(v) for k, v in overrides.items()}
+
+    def run(self, ctx: Dict[str, Any], entities: List[Any],
+            overrides: Mapping[str, bool] | None = None,
+            start: str | None = None, stop: str | None = None) -> List[Any]:
+        overrides = overrides or {}
+        names = self.stage_names()
+        lo = names.index(start) if start is not None else 0
+        hi = names.index(stop) if stop is not None else len(names)
+        runs: List[tuple] = []
+        labels = None
+        for stage in self.stages[lo:hi]:
+            if not overrides.get(stage.name, stage.enabled):
+                runs.append((stage.name, "disabled", 0.0))
+                continue
+            if labels is None:
+                labels = {e["entity_group"] for e in entities}
+            if not stage.applies(labels):
+                runs.append((stage.name, "skipped", 0.0))
+                continue
+            t0 = time.perf_counter()
+            out = stage.fn(ctx, entities)
+            runs.append((stage.name, "runs", (time.perf_counter() - t0) * 1000.0))
+            if out is not entities:
+                entities, labels = out, None
+        self.timings.record(runs)
+        return entities
+
+_registry_lock = threading.Lock()
+_registry: Dict[str, Pipeline] = {}
+
+'''
+파이프라인을 이름으로 등록한다. (stage_stats()에 노출)
+'''
+def register_pipeline(pipeline: Pipeline) -> Pipeline:
+    with _registry_lock:
+        _registry[pipeline.name] = pipeline
+    return pipeline
+
+'''
+등록된 파이프라인들의 단계별 통계를 반환한다.
+'''
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        pipes = dict(_registry)
+    return {name: p.timings.snapshot() for name, p in pipes.items()}
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import contextlib
+import json
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# 지원하는 추론 정밀도 모드
+PRECISION_MODES = ("fp32", "bf16", "int8")
+
+# 정밀도 검증용 라벨링 샘플과 허용 F1 하락폭
+SAMPLES_PATH = Path(__file__).parent / "data" / "precision_samples.json"
+MAX_F1_DRIFT = float(os.getenv("PII_NER_PRECISION_MAX_DRIFT", "0.02"))
+
+log = logging.getLogger(__name__)
+
+'''
+CPU에서 bf16 연산(oneDNN)을 지원하는지 검사한다.
+'''
+def bf16_supported() -> bool:
+    try:
+        import torch
+        return bool(torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+'''
+Linear 레이어를 동적 int8로 양자화한 모델 사본을 반환한다.
+'''
+def quantize_int8(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+'''
+정밀도 모드에 맞는 추론 컨텍스트를 반환한다. bf16은 CPU autocast, 나머지는 빈 컨텍스트다.
+'''
+def autocast_context(mode: str):
+    if mode == "bf16":
+        import torch
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+'''
+설정값을 정밀도 모드로 바꾼다. 지원하지 않는 값이면 경고를 남기고 fp32로 대체한다.
+'''
+def resolve_mode(raw: str | None) -> str:
+    mode = (raw or "fp32").strip().lower()
+    if mode in PRECISION_MODES:
+        return mode
+    log.warning("unknown precision mode %r, falling back to fp32 (supported: %s)", raw, ", ".join(PRECISION_MODES))
+    return "fp32"
+
+'''
+fp32 모델에 정밀도 모드를 적용한 모델을 반환한다. (bf16은 가중치를 유지하고 autocast로 처리)
+'''
+def apply_precision(model, mode: str):
+    if mode not in PRECISION_MODES:
+        raise ValueError(f"unknown precision mode: {mode}")
+    if mode == "int8":
+        return quantize_int8(model)
+    return model
+
+'''
+라벨링 샘플([{"text", "entities": [{"label","start","end"}]}])을 읽는다.
+'''
+def load_samples(path: str | Path | None = None) -> List[Dict[str, Any]]:
+    with open(path or SAMPLES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+'''
+NER 함수의 예측을 샘플 정답과 (라벨, 시작, 끝) 완전 일치로 비교해 라벨별 precision/recall/F1을 계산한다.
+'''
+def per_label_f1(predict: Callable[[str], List[Dict[str, Any]]],
+                 samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    tp: Dict[str, int] = defaultdict(int)
+    fp: Dict[str, int] = defaultdict(int)
+    fn: Dict[str, int] = defaultdict(int)
+    for s in samples:
+        gold = {(e["label"], int(e["start"]), int(e["end"])) for e in s.get("entities", [])}
+        pred = set()
+        for e in predict(s["text"]):
+            label = e.get("entity_group") or e.get("label") or e.get("entity") or ""
+            pred.add((label, int(e.get("start", 0)), int(e.get("end", 0))))
+        for key in pred & gold: tp[key[0]] += 1
+        for key in pred - gold: fp[key[0]] += 1
+        for key in gold - pred: fn[key[0]] += 1
+
+    report: Dict[str, Dict[str, float]] = {}
+    for label in sorted(set(tp) | set(fp) | set(fn)):
+        p = tp[label] / (tp[label] + fp[label]) if tp[label] + fp[label] else 0.0
+        r = tp[label] / (tp[label] + fn[label]) if tp[label] + fn[label] else 0.0
+        f1 = 2 * p * r / (p + r) if p + r else 0.0
+        report[label] = {"precision": round(p, 4), "recall": round(r, 4), "f1": round(f1, 4),
+                         "support": tp[label] + fn[label]}
+    return report
+
+'''
+리포트에서 라벨의 F1을 꺼낸다.
+리포트에 없는 라벨은 정답도 예측도 없는 라벨이므로 1로 본다. (정답 없이 오탐만 있으면 F1은 0)
+'''
+def _f1(report: Dict[str, Dict[str, float]], label: str) -> float:
+    return report.get(label, {}).get("f1", 1.0)
+
+'''
+주어진 모델/정밀도로 샘플을 추론하는 함수를 만든다.
+'''
+def _predictor(model, tokenizer, mode: str) -> Callable[[str], List[Dict[str, Any]]]:
+    from transformers import pipeline
+    pipe = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+    def predict(text: str) -> List[Dict[str, Any]]:
+        with autocast_context(mode):
+            return pipe(text)
+    return predict
+
+'''
+정밀도 모드를 활성화하기 전에 fp32 대비 라벨별 F1 하락폭을 측정한다.
+(후보 모델, 리포트)를 반환하며, 리포트의 ok가 False면 후보 모델을 쓰지 않아야 한다.
+'''
+def check_precision(model, tokenizer, mode: str,
+                    samples: List[Dict[str, Any]] | None = None,
+                    max_drift: float | None = None) -> Tuple[Any, Dict[str, Any]]:
+    limit = MAX_F1_DRIFT if max_drift is None else max_drift
+    if mode == "bf16" and not bf16_supported():
+        return model, {"mode": mode, "supported": False, "ok": False}
+    samples = samples if samples is not None else load_samples()
+
+    baseline = per_label_f1(_predictor(model, tokenizer, "fp32"), samples)
+    candidate = apply_precision(model, mode)
+    measured = per_label_f1(_predictor(candidate, tokenizer, mode), samples)
+
+    # 후보 모델에서만 나온 라벨(새 오탐)도 하락으로 잡히도록 두 리포트의 라벨 합집합을 본다
+    drift = {label: round(_f1(baseline, label) - _f1(measured, label), 4)
+             for label in sorted(set(baseline) | set(measured))}
+    worst = max(drift.values()) if drift else 0.0
+    return candidate, {
+        "mode": mode,
+        "supported": True,
+        "samples": len(samples),
+        "baseline": baseline,
+        "measured": measured,
+        "f1_drift": drift,
+        "max_drift": worst,
+        "allowed_drift": limit,
+        "ok": worst <= limit,
+    }
+
+if __name__ == "__main__":
+    # python -m pii_guard.precision : 모드별 F1 하락폭 리포트 출력
+    from transformers import AutoModelForTokenClassification
+    from .model_registry import MODEL_DIR, get_tokenizer
+    for mode in ("bf16", "int8"):
+        mdl = AutoModelForTokenClassification.from_pretrained(MODEL_DIR)
+        _, report = check_precision(mdl, get_tokenizer(), mode)
+        print(json.dumps({k: report.get(k) for k in ("mode", "supported", "f1_drift", "max_drift", "ok")},
+                         ensure_ascii=False))
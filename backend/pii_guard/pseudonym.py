@@ -0,0 +1,70 @@
+from __future__ import annotations
+import hashlib
+import hmac
+import os
+import re
+from typing import Any, Dict
+
+from .fake_pool import fake_at
+
+# 키 기반 가명화 모드의 기본 작업 비밀키 (비우면 기존 순번 인덱싱)
+PSEUDONYM_KEY = os.getenv("PII_PSEUDONYM_KEY", "")
+# 마스킹 토큰에 붙이는 키 해시 길이 (16진수 글자 수). 64비트(16글자) 미만이면 라벨당 수십만 값에서 충돌이 생기므로 16 이상으로 맞춘다
+PSEUDONYM_TOKEN_HEX = max(16, int(os.getenv("PII_PSEUDONYM_TOKEN_HEX", "16")))
+
+_NON_ALNUM_RE = re.compile(r"[^0-9A-Za-z]")
+_DIGIT_LABELS = {"PHONE", "SSN", "CC", "ACCT", "DLN", "PASS"}
+
+'''
+가명화 키를 바이트로 바꾼다. (str이면 UTF-8)
+'''
+def _key_bytes(key: str | bytes) -> bytes:
+    return key if isinstance(key, bytes) else key.encode("utf-8")
+
+'''
+값의 표기 차이를 없앤 비교용 형태. 숫자형 라벨은 구분자를 지우고 대문자로, 이메일은 소문자로, 그 외는 공백을 지운다.
+같은 번호를 "010-1234-5678"과 "01012345678"로 적어도 같은 가명이 나온다.
+'''
+def canonical_value(label: str, value: str) -> str:
+    if label in _DIGIT_LABELS:
+        return _NON_ALNUM_RE.sub("", value).upper()
+    if label == "EMAIL":
+        return value.strip().lower()
+    return "".join(value.split())
+
+'''
+(라벨, 정규화 값)의 HMAC-SHA256 다이제스트.
+'''
+def keyed_digest(key: str | bytes, label: str, value: str) -> bytes:
+    msg = f"{label}\x1f{canonical_value(label, value)}".encode("utf-8")
+    return hmac.new(_key_bytes(key), msg, hashlib.sha256).digest()
+
+'''
+마스킹 토큰에 쓸 키 해시 접미사. 같은 키/라벨/값이면 어느 프로세스에서나 같다.
+'''
+def pseudonym_suffix(key: str | bytes, label: str, value: str) -> str:
+    return keyed_digest(key, label, value).hex()[:PSEUDONYM_TOKEN_HEX]
+
+'''
+키 해시에서 형식이 맞는 가짜값을 정한다. (fake_pool의 생성기를 그대로 써서 Luhn/주민번호 검증을 통과한다)
+가짜값 풀이 없는 라벨이면 None.
+'''
+def pseudonym_fake(key: str | bytes, label: str, value: str) -> str | None:
+    try:
+        return fake_at(label, int.from_bytes(keyed_digest(key, label, value), "big"))
+    except KeyError:
+        return None
+
+'''
+키 해시에서 임의 정수 시드를 만든다. (풀이 없는 라벨을 Faker로 만들 때)
+'''
+def pseudonym_seed(key: str | bytes, label: str, value: str) -> int:
+    return int.from_bytes(keyed_digest(key, label, value)[:8], "big")
+
+'''
+state에 가명화 키가 있으면 반환한다.
+'''
+def state_key(state: Dict[str, Any] | None) -> str | bytes | None:
+    if not state:
+        return None
+    return state.get("pseudonym_key") or None
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+
+from .keywords import AhoCorasick
+from .span_rewriter import rewrite_spans
+
+# job state에 컴파일된 매처를 보관하는 키 (release_job_state가 지운다)
+STATE_MATCHER_KEY = "restore_matcher"
+
+'''
+복원 맵({가짜값: 원래값})의 모든 가짜값을 한 번에 찾는 매처.
+왼쪽부터 가장 긴 가짜값을 골라 한 번에 치환하므로, 복원된 값 안에 다른 가짜값이 있어도 다시 치환되지 않는다.
+'''
+class RestoreMatcher:
+    def __init__(self, restore_map: Dict[str, str]):
+        self.restore_map = {k: v for k, v in restore_map.items() if k}
+        self._ac = AhoCorasick({fake: [fake] for fake in self.restore_map})
+
+    def spans(self, text: str) -> List[Tuple[int, int, str]]:
+        hits = sorted(self._ac.find_all(text), key=lambda h: (h[0], h[0] - h[1]))
+        out: List[Tuple[int, int, str]] = []
+        pos = 0
+        for start, end, fake in hits:
+            if start >= pos:
+                out.append((start, end, self.restore_map[fake]))
+                pos = end
+        return out
+
+    def restore(self, text: str) -> str:
+        if not self.restore_map or not text:
+            return text
+        return rewrite_spans(text, self.spans(text))[0]
+
+'''
+복원 맵에 해당하는 매처를 반환한다.
+state(job state)를 넘기면 매처를 state에 보관해 같은 version이면 다시 쓴다. (version 기본값은 맵 크기)
+복원 맵을 바꾸는 호출자는 version을 올려야 하고, 보관된 매처는 release_job_state에서 지워진다.
+state가 없으면 캐시하지 않는다.
+'''
+def get_matcher(restore_map: Dict[str, str], state: Dict[str, Any] | None = None,
+                version: int | None = None) -> RestoreMatcher:
+    if state is None:
+        return RestoreMatcher(restore_map)
+    version = len(restore_map) if version is None else version
+    held = state.get(STATE_MATCHER_KEY)
+    if held is not None and held[0] == version:
+        return held[1]
+    m = RestoreMatcher(restore_map)
+    state[STATE_MATCHER_KEY] = (version, m)
+    return m
+
+'''
+텍스트 안의 가짜값을 복원 맵에 따라 원래 값으로 되돌린다. (왼쪽부터 최장 일치, 한 번의 패스)
+같은 맵으로 여러 텍스트를 복원할 때는 state/version을 넘겨 매처를 재사용한다. (get_matcher 참고)
+'''
+def restore_text(text: str, restore_map: Dict[str, str], state: Dict[str, Any] | None = None,
+                 version: int | None = None) -> str:
+    if not restore_map or not text:
+        return text
+    return get_matcher(restore_map, state, version).restore(text)
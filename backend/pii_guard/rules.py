@@ -0,0 +1,89 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .entity import Span
+
+# 정규식/패턴 정의 (pii_masking, pii_fakedata, fast_tier가 공유)
+PHONE_PATTERNS = [ re.compile(r"^010[- ]?\d{3,4}[- ]?\d{4}$") ]
+# PHONE_PATTERNS와 같은 형식을 텍스트 안에서 검색
+PHONE_SEARCH_RE = re.compile(r"(?<!\d)010[- ]?\d{3,4}[- ]?\d{4}(?!\d)")
+EMAIL_PATTERN  = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
+
+SSN_RE  = re.compile(r"\b\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])-[1-4]\d{6}\b")
+CC_RE   = re.compile(r"\b(?:\d{4}[- ]?){3}\d{4}\b")
+ACCT_PATTERNS = [ r"\b\d{10}\b", r"\b\d{12}\b", r"\b\d{6}-\d{2}-\d{6}\b", r"\b\d{3}-\d{3}-\d{6}\b" ]
+ACCT_RE = [ re.compile(p) for p in ACCT_PATTERNS ]
+PASS_RE = re.compile(r"(?<![A-Z0-9])[A-Z]\s?-?\d{8}(?=\D|$)")
+
+# DLN: 카드/계좌/시간 내부 매칭 방지 (숫자 경계)
+DLN_RE  = re.compile(r"(?<!\d)(?:\d{2}-\d{2}-\d{6}-\d{2}|\d{12})(?!\d)")
+
+MONEY_RE = re.compile(r"(?<!\d)(\d{1,3}(?:,\d{3})*|\d+)\s*(원|만원|천원|억원|조원|KRW|₩)(?!\w)")
+DATE_RE  = [
+    re.compile(r"(?<!\d)\d{4}(?:[-/]|년)\d{1,2}(?:[-/]|월)\d{1,2}일?(?=\D|$)"),
+    re.compile(r"(?<!\d)\d{1,2}\s*월\s*\d{1,2}\s*일(?=\D|$)"),
+    re.compile(r"(?<!\d)\d{2}[-/.]\d{1,2}[-/.]\d{1,2}(?=\D|$)"),
+]
+# HH:MM 또는 HH:MM:SS (24h)
+TIME_RE = [
+    re.compile(r"(?<!\d)([01]?\d|2[0-3]):[0-5]\d(?!\d)"),
+    re.compile(r"(?<!\d)([01]?\d|2[0-3]):[0-5]\d:[0-5]\d(?!\d)"),
+]
+
+'''
+검출/필터 규칙 전체를 한 번 컴파일해 두고 텍스트 한 건을 한 번 스캔해 라벨별 구간을 돌려준다.
+- 규칙: (라벨, 패턴 또는 패턴 리스트, 게이트). 게이트는 매칭에 반드시 필요한 문자열/정규식으로,
+  텍스트에 게이트가 없으면 그 규칙은 실행하지 않는다. (예: 숫자가 없는 셀은 이메일만 검사)
+- 결과는 라벨별 (start, end) 목록이며 각 패턴을 finditer로 돌린 것과 같다. (리스트 패턴은 패턴 순서대로 이어 붙인다)
+'''
+class RuleSet:
+    def __init__(self, rules: Sequence[Tuple[str, Any, Any]]):
+        self._rules: List[Tuple[str, List[re.Pattern], Any]] = []
+        for name, pats, gate in rules:
+            pats = pats if isinstance(pats, (list, tuple)) else [pats]
+            self._rules.append((name, [re.compile(p) if isinstance(p, str) else p for p in pats], gate))
+        self.names: List[str] = [name for name, _, _ in self._rules]
+
+    def scan(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        gates: Dict[Any, bool] = {}
+        out: Dict[str, List[Tuple[int, int]]] = {}
+        for name, pats, gate in self._rules:
+            spans = out.setdefault(name, [])
+            if gate is not None:
+                ok = gates.get(gate)
+                if ok is None:
+                    ok = gates[gate] = (gate in text) if isinstance(gate, str) else bool(gate.search(text))
+                if not ok:
+                    continue
+            for p in pats:
+                spans.extend(m.span() for m in p.finditer(text))
+        return out
+
+'''
+스캔 결과의 구간을 정규식 엔티티(Span) 리스트로 변환한다.
+'''
+def spans_to_entities(text: str, spans: List[Tuple[int, int]], tag: str,
+                      source: str | None = None) -> List[Span]:
+    return [Span(tag, text[s:e], s, e, 1.0, source) for s, e in spans]
+
+# 검출(PASS/DLN/SSN/CC/ACCT/EMAIL/PHONE)과 필터(MONEY/DATE/TIME) 규칙 전체
+_DIGIT = re.compile(r"\d")
+PII_RULES = RuleSet([
+    ("PASS",  PASS_RE,         _DIGIT),
+    ("DLN",   DLN_RE,          _DIGIT),
+    ("SSN",   SSN_RE,          _DIGIT),
+    ("CC",    CC_RE,           _DIGIT),
+    ("ACCT",  ACCT_RE,         _DIGIT),
+    ("MONEY", MONEY_RE,        _DIGIT),
+    ("EMAIL", EMAIL_PATTERN,   "@"),
+    ("PHONE", PHONE_SEARCH_RE, _DIGIT),
+    ("DATE",  DATE_RE,         _DIGIT),
+    ("TIME",  TIME_RE,         _DIGIT),
+])
+
+'''
+텍스트 한 건을 전체 규칙으로 스캔한다. 이미 스캔한 결과(scan)가 있으면 그대로 쓴다.
+'''
+def scan_text(text: str, scan: Dict[str, List[Tuple[int, int]]] | None = None) -> Dict[str, List[Tuple[int, int]]]:
+    return PII_RULES.scan(text) if scan is None else scan
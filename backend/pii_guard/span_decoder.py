@@ -0,0 +1,163 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+'''
+BIO 라벨 이름을 (B/I, 타입)으로 나눈다. 접두어가 없으면 I로 간주한다. (HF simple 집계와 동일)
+'''
+def _split_tag(name: str) -> Tuple[str, str]:
+    if name.startswith("B-"):
+        return "B", name[2:]
+    if name.startswith("I-"):
+        return "I", name[2:]
+    return "I", name
+
+'''
+토큰 로짓을 softmax 확률로 바꾼다.
+'''
+def softmax(logits: np.ndarray) -> np.ndarray:
+    m = logits.max(axis=-1, keepdims=True)
+    e = np.exp(logits - m)
+    return e / e.sum(axis=-1, keepdims=True)
+
+'''
+id2label에서 라벨 id → (타입 id, B 여부) 조회 배열과 타입 이름 목록을 만든다.
+'''
+class LabelScheme:
+    def __init__(self, id2label: Dict[Any, str]):
+        id2label = {int(k): v for k, v in id2label.items()}
+        n = max(id2label) + 1
+        self.types: List[str] = []
+        self.type_of = np.zeros(n, dtype=np.int16)
+        self.is_begin = np.zeros(n, dtype=bool)
+        for lid, name in id2label.items():
+            bi, tag = _split_tag(name)
+            if tag not in self.types:
+                self.types.append(tag)
+            self.type_of[lid] = self.types.index(tag)
+            self.is_begin[lid] = bi == "B"
+        self.outside = self.types.index("O") if "O" in self.types else -1
+
+'''
+배치 디코딩 결과를 담는 압축 span 배열.
+seq(시퀀스 번호), label(타입 id), start/end(문자 오프셋), score를 배열로 보관하고
+필요할 때만 dict 목록으로 변환한다.
+'''
+class SpanArrays:
+    __slots__ = ("seq", "label", "start", "end", "score", "types", "n_seqs")
+
+    def __init__(self, seq: np.ndarray, label: np.ndarray, start: np.ndarray, end: np.ndarray,
+                 score: np.ndarray, types: List[str], n_seqs: int):
+        self.seq, self.label, self.start, self.end, self.score = seq, label, start, end, score
+        self.types, self.n_seqs = types, n_seqs
+
+    def __len__(self) -> int:
+        return int(self.seq.shape[0])
+
+    def to_dicts(self, texts: Sequence[str]) -> List[List[Dict[str, Any]]]:
+        out: List[List[Dict[str, Any]]] = [[] for _ in range(self.n_seqs)]
+        for b, lab, s, e, sc in zip(self.seq.tolist(), self.label.tolist(), self.start.tolist(),
+                                    self.end.tolist(), self.score.tolist()):
+            out[b].append({"entity_group": self.types[lab], "score": sc, "word": texts[b][s:e], "start": s, "end": e})
+        return out
+
+'''
+배치 전체의 토큰 확률을 벡터 연산으로 엔티티 span으로 디코딩한다. (HF aggregation_strategy="simple"과 동일 규칙)
+- 토큰별 argmax 라벨/점수를 한 번에 구하고 특수/패딩 토큰을 제외한다.
+- 시퀀스가 바뀌거나, 타입이 바뀌거나, B- 토큰이면 새 그룹을 시작한다.
+- 그룹 점수는 토큰 점수 평균, 오프셋은 첫 토큰 시작~마지막 토큰 끝이며 "O" 그룹은 버린다.
+'''
+def decode_batch(probs: np.ndarray, offsets: np.ndarray, special_mask: np.ndarray,
+                 scheme: LabelScheme) -> SpanArrays:
+    n_seqs = int(probs.shape[0])
+    label_ids = probs.argmax(axis=-1)
+    scores = np.take_along_axis(probs, label_ids[..., None], axis=-1)[..., 0]
+
+    seq_idx, tok_idx = np.nonzero(~special_mask.astype(bool))
+    if seq_idx.size == 0:
+        empty_i = np.zeros(0, dtype=np.int32)
+        return SpanArrays(empty_i, empty_i.astype(np.int16), empty_i, empty_i,
+                          np.zeros(0, dtype=np.float32), scheme.types, n_seqs)
+
+    lids = label_ids[seq_idx, tok_idx]
+    types = scheme.type_of[lids]
+    new_group = np.ones(seq_idx.size, dtype=bool)
+    new_group[1:] = (seq_idx[1:] != seq_idx[:-1]) | (types[1:] != types[:-1]) | scheme.is_begin[lids[1:]]
+
+    first = np.flatnonzero(new_group)
+    last = np.append(first[1:] - 1, seq_idx.size - 1)
+    tok_scores = scores[seq_idx, tok_idx].astype(np.float64)
+    mean = np.add.reduceat(tok_scores, first) / (last - first + 1)
+
+    keep = types[first] != scheme.outside
+    first, last, mean = first[keep], last[keep], mean[keep]
+    return SpanArrays(
+        seq_idx[first].astype(np.int32),
+        types[first],
+        offsets[seq_idx[first], tok_idx[first], 0].astype(np.int32),
+        offsets[seq_idx[last], tok_idx[last], 1].astype(np.int32),
+        mean.astype(np.float32),
+        scheme.types,
+        n_seqs,
+    )
+
+'''
+시퀀스 한 건의 토큰 확률을 엔티티 dict 목록으로 변환한다.
+'''
+def decode_simple(text: str, probs: np.ndarray, offsets: Sequence[Sequence[int]],
+                  special_mask: Sequence[int], id2label: Dict[int, str]) -> List[Dict[str, Any]]:
+    spans = decode_batch(probs[None], np.asarray(offsets)[None], np.asarray(special_mask)[None],
+                         LabelScheme(id2label))
+    return spans.to_dicts([text])[0]
+
+'''
+토크나이저 → 로짓 → 벡터 디코딩으로 NER을 수행하는 파이프라인 공통 부분.
+HF pipeline("ner", aggregation_strategy="simple")과 같은 호출 방식/결과 형식
+(entity_group, score, word, start, end)을 제공하고, spans()로 압축 span 배열을 받을 수 있다.
+하위 클래스는 _logits(enc)만 구현한다.
+'''
+class SpanPipeline:
+    def __init__(self, tokenizer, id2label: Dict[Any, str], max_length: int):
+        self.tokenizer = tokenizer
+        self.scheme = LabelScheme(id2label)
+        self.max_length = max_length
+
+    def _logits(self, enc: Dict[str, np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+    def spans(self, texts: List[str]) -> SpanArrays:
+        enc = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length,
+            return_offsets_mapping=True, return_special_tokens_mask=True, return_tensors="np",
+        )
+        probs = softmax(np.asarray(self._logits(enc), dtype=np.float32))
+        special = (np.asarray(enc["special_tokens_mask"]) == 1) | (np.asarray(enc["attention_mask"]) == 0)
+        return decode_batch(probs, np.asarray(enc["offset_mapping"]), special, self.scheme)
+
+    def __call__(self, inputs: str | Sequence[str], batch_size: int | None = None, **kwargs):
+        if isinstance(inputs, str):
+            return self.spans([inputs]).to_dicts([inputs])[0]
+        texts = list(inputs)
+        bs = max(1, batch_size or len(texts) or 1)
+        out: List[List[Dict[str, Any]]] = []
+        for b in range(0, len(texts), bs):
+            chunk = texts[b:b + bs]
+            out.extend(self.spans(chunk).to_dicts(chunk))
+        return out
+
+'''
+torch 모델을 직접 호출하는 NER 파이프라인. (HF pipeline의 토큰별 dict 집계를 거치지 않는다)
+'''
+class TorchNerPipeline(SpanPipeline):
+    def __init__(self, model, tokenizer, id2label: Dict[Any, str], max_length: int):
+        super().__init__(tokenizer, id2label, max_length)
+        self.model = model.eval()
+
+    def _logits(self, enc: Dict[str, np.ndarray]) -> np.ndarray:
+        import torch
+        feeds = {k: torch.from_numpy(np.asarray(enc[k], dtype=np.int64))
+                 for k in ("input_ids", "attention_mask", "token_type_ids") if k in enc}
+        with torch.inference_mode():
+            logits = self.model(**feeds).logits
+        return logits.float().numpy()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Tuple
+
+'''
+(start, end) 구간 집합에 대한 정적 인덱스.
+시작 위치 정렬 배열과 누적 최대 끝 위치로 겹침 여부를, 끝 위치 정렬 배열로 인접 여부를 O(log n)에 판정한다.
+겹침 규칙은 후처리 단계와 같다: not (a_end <= s or a_start >= t)
+'''
+class SpanIndex:
+    __slots__ = ("starts", "max_end", "ends")
+
+    def __init__(self, spans: Iterable[Tuple[int, int]] = ()):
+        ordered = sorted(spans)
+        self.starts: List[int] = [s for s, _ in ordered]
+        self.max_end: List[int] = list(accumulate((t for _, t in ordered), max))
+        self.ends: List[int] = sorted(t for _, t in ordered)
+
+    @classmethod
+    def of_label(cls, entities: Iterable[Dict[str, Any]], label: str) -> "SpanIndex":
+        return cls((e["start"], e["end"]) for e in entities if e.get("entity_group") == label)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        k = bisect_left(self.starts, end)
+        return k > 0 and self.max_end[k - 1] > start
+
+    def end_within(self, pos: int, dist: int) -> bool:
+        k = bisect_left(self.ends, pos - dist)
+        return k < len(self.ends) and self.ends[k] <= pos + dist
+
+'''
+suppress 라벨 중 index 구간과 겹치는 엔티티를 제거한다.
+'''
+def drop_overlapping(entities: List[Dict[str, Any]], index: SpanIndex,
+                     suppress: Iterable[str]) -> List[Dict[str, Any]]:
+    suppress = set(suppress)
+    return [e for e in entities
+            if not (e.get("entity_group") in suppress and index.overlaps(e["start"], e["end"]))]
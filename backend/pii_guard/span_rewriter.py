@@ -0,0 +1,35 @@
+from __future__ import annotations
+from bisect import bisect_right
+from typing import List, Sequence, Tuple
+
+'''
+치환 목록 [(start, end, 새 문자열)]을 원문에 한 번에 적용한다. (start 오름차순, 서로 겹치지 않아야 한다)
+조각 리스트로 결과를 만들고, 치환마다 (원문 start, 원문 end, 결과 start, 결과 end) 오프셋 매핑을 함께 반환한다.
+'''
+def rewrite_spans(text: str, replacements: Sequence[Tuple[int, int, str]]) -> Tuple[str, List[Tuple[int, int, int, int]]]:
+    parts: List[str] = []
+    offsets: List[Tuple[int, int, int, int]] = []
+    pos = out_len = 0
+    for start, end, new in replacements:
+        if start < pos:
+            raise ValueError(f"overlapping replacement at {start}")
+        parts.append(text[pos:start])
+        out_len += start - pos
+        parts.append(new)
+        offsets.append((start, end, out_len, out_len + len(new)))
+        out_len += len(new)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts), offsets
+
+'''
+원문 위치를 결과 문자열 위치로 옮긴다. 치환된 구간 내부 위치는 해당 치환 결과의 시작으로 옮긴다.
+'''
+def map_position(offsets: Sequence[Tuple[int, int, int, int]], pos: int) -> int:
+    k = bisect_right([o[0] for o in offsets], pos) - 1
+    if k < 0:
+        return pos
+    src_start, src_end, dst_start, dst_end = offsets[k]
+    if pos < src_end:
+        return dst_start
+    return dst_end + (pos - src_end)
@@ -0,0 +1,392 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from .pseudonym import PSEUDONYM_KEY
+
+# 설정하면 파일/작업 state를 이 SQLite 파일에 둔다 (비우면 메모리)
+STATE_DB = os.getenv("PII_STATE_DB", "")
+# SQLite 잠금 대기 시간 (초)
+STATE_DB_TIMEOUT = float(os.getenv("PII_STATE_DB_TIMEOUT", "30"))
+# SQLite를 쓰지 않을 때 작업 state를 압축 저장소(원문 미보관)에 둘지 여부
+STATE_COMPACT = os.getenv("PII_STATE_COMPACT", "1") not in ("0", "false", "False", "")
+
+'''
+마스킹 인덱스/가짜값 매핑 저장소 인터페이스.
+assign_indices: [(라벨, 값)]을 순서대로 보며 처음 보는 값에 라벨별 다음 번호를 준다. (한 번에 원자적으로)
+get_fakes / put_fakes: 원래값 → 가짜값 조회와 저장. put_fakes는 이미 있는 값은 덮어쓰지 않고, 실제 저장된 매핑을 돌려준다.
+'''
+class StateStore(ABC):
+    @abstractmethod
+    def assign_indices(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        ...
+
+    @abstractmethod
+    def get_fakes(self, values: Iterable[str]) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    def put_fakes(self, pairs: Dict[str, str]) -> Dict[str, str]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+'''
+state dict 위의 메모리 저장소. 기존 state 키(label_value_map, label_counter, fake_map)를 그대로 쓰므로
+state를 직접 읽는 코드와 호환된다.
+'''
+class MemoryStateStore(StateStore):
+    def __init__(self, state: Dict[str, Any] | None = None):
+        self.state = {} if state is None else state
+
+    def assign_indices(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        label_value_map = self.state.setdefault("label_value_map", defaultdict(dict))
+        label_counter = self.state.setdefault("label_counter", defaultdict(int))
+        out: Dict[Tuple[str, str], int] = {}
+        for label, value in pairs:
+            values = label_value_map[label]
+            if value not in values:
+                label_counter[label] += 1
+                values[value] = label_counter[label]
+            out[(label, value)] = values[value]
+        return out
+
+    def get_fakes(self, values: Iterable[str]) -> Dict[str, str]:
+        fake_map = self.state.setdefault("fake_map", {})
+        return {v: fake_map[v] for v in values if v in fake_map}
+
+    def put_fakes(self, pairs: Dict[str, str]) -> Dict[str, str]:
+        fake_map = self.state.setdefault("fake_map", {})
+        for v, f in pairs.items():
+            fake_map.setdefault(v, f)
+        return {v: fake_map[v] for v in pairs}
+
+'''
+SQLite 저장소. 여러 프로세스가 같은 파일과 job 이름을 쓰면 같은 값에 같은 인덱스를 받는다.
+WAL 모드로 읽기와 쓰기가 서로 막지 않고, 호출 한 번(텍스트 한 건 또는 배치)의 쓰기를 트랜잭션 하나로 묶는다.
+인덱스 부여는 BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡아 카운터 증가가 프로세스 사이에서 겹치지 않는다.
+'''
+class SQLiteStateStore(StateStore):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS pii_counter (job TEXT, label TEXT, n INTEGER NOT NULL, PRIMARY KEY (job, label))",
+        "CREATE TABLE IF NOT EXISTS pii_index (job TEXT, label TEXT, value TEXT, n INTEGER NOT NULL, "
+        "PRIMARY KEY (job, label, value)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS pii_fake (job TEXT, value TEXT, fake TEXT NOT NULL, "
+        "PRIMARY KEY (job, value)) WITHOUT ROWID",
+    )
+    CHUNK = 500  # IN (...) 한 번에 넣는 값 개수
+
+    def __init__(self, path: str, job: str = "default", ephemeral: bool = False):
+        self.path = path
+        self.job = job
+        self.ephemeral = ephemeral
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=STATE_DB_TIMEOUT, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in self.SCHEMA:
+            self._conn.execute(ddl)
+
+    def _chunks(self, items: List[Any]):
+        for i in range(0, len(items), self.CHUNK):
+            yield items[i:i + self.CHUNK]
+
+    def _lookup_indices(self, label: str, values: List[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        for chunk in self._chunks(values):
+            q = f"SELECT value, n FROM pii_index WHERE job=? AND label=? AND value IN ({','.join('?' * len(chunk))})"
+            found.update(self._conn.execute(q, (self.job, label, *chunk)).fetchall())
+        return found
+
+    def assign_indices(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        by_label: Dict[str, List[str]] = {}
+        for label, value in pairs:
+            by_label.setdefault(label, []).append(value)
+        if not by_label:
+            return {}
+        with self._lock:
+            # 이미 있는 값만이면 쓰기 잠금 없이 끝낸다
+            known = {label: self._lookup_indices(label, list(dict.fromkeys(vs))) for label, vs in by_label.items()}
+            if any(v not in known[label] for label, v in pairs):
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    known = {label: self._lookup_indices(label, list(dict.fromkeys(vs)))
+                             for label, vs in by_label.items()}
+                    counters = dict(self._conn.execute(
+                        "SELECT label, n FROM pii_counter WHERE job=?", (self.job,)).fetchall())
+                    new_rows: List[Tuple[str, str, str, int]] = []
+                    for label, value in pairs:
+                        if value not in known[label]:
+                            counters[label] = counters.get(label, 0) + 1
+                            known[label][value] = counters[label]
+                            new_rows.append((self.job, label, value, counters[label]))
+                    self._conn.executemany("INSERT INTO pii_index (job, label, value, n) VALUES (?, ?, ?, ?)", new_rows)
+                    self._conn.executemany(
+                        "INSERT INTO pii_counter (job, label, n) VALUES (?, ?, ?) "
+                        "ON CONFLICT (job, label) DO UPDATE SET n=excluded.n",
+                        [(self.job, label, n) for label, n in counters.items()])
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return {(label, value): known[label][value] for label, value in pairs}
+
+    def get_fakes(self, values: Iterable[str]) -> Dict[str, str]:
+        values = list(dict.fromkeys(values))
+        found: Dict[str, str] = {}
+        with self._lock:
+            for chunk in self._chunks(values):
+                q = f"SELECT value, fake FROM pii_fake WHERE job=? AND value IN ({','.join('?' * len(chunk))})"
+                found.update(self._conn.execute(q, (self.job, *chunk)).fetchall())
+        return found
+
+    def put_fakes(self, pairs: Dict[str, str]) -> Dict[str, str]:
+        if not pairs:
+            return {}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO pii_fake (job, value, fake) VALUES (?, ?, ?)",
+                                       [(self.job, v, f) for v, f in pairs.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get_fakes(pairs)
+
+    def drop(self) -> None:
+        with self._lock:
+            for table in ("pii_counter", "pii_index", "pii_fake"):
+                self._conn.execute(f"DELETE FROM {table} WHERE job=?", (self.job,))
+
+    def close(self) -> None:
+        if self.ephemeral:
+            self.drop()
+        self._conn.close()
+
+'''
+64비트 키 → 32비트 값 열린 주소(선형 탐사) 해시 테이블. 키와 값을 array에 두어 항목당 12바이트(+빈 칸)만 쓴다.
+키 0은 빈 칸 표시이므로 쓰지 않는다. (호출자가 0을 1로 바꿔 넣는다)
+'''
+class DigestTable:
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = 1024):
+        cap = 1
+        while cap < capacity:
+            cap <<= 1
+        self._keys = array("Q", bytes(8 * cap))
+        self._vals = array("I", bytes(4 * cap))
+        self._mask = cap - 1
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _slot(self, key: int) -> int:
+        keys, mask = self._keys, self._mask
+        i = key & mask
+        while keys[i] and keys[i] != key:
+            i = (i + 1) & mask
+        return i
+
+    def get(self, key: int) -> int | None:
+        i = self._slot(key)
+        return self._vals[i] if self._keys[i] else None
+
+    def put(self, key: int, value: int) -> None:
+        i = self._slot(key)
+        if not self._keys[i]:
+            if self._n + 1 > self.MAX_LOAD * (self._mask + 1):
+                self._grow()
+                i = self._slot(key)
+            self._keys[i] = key
+            self._n += 1
+        self._vals[i] = value
+
+    def _grow(self) -> None:
+        old_keys, old_vals = self._keys, self._vals
+        cap = (self._mask + 1) * 2
+        self._keys = array("Q", bytes(8 * cap))
+        self._vals = array("I", bytes(4 * cap))
+        self._mask = cap - 1
+        for k, v in zip(old_keys, old_vals):
+            if k:
+                i = self._slot(k)
+                self._keys[i] = k
+                self._vals[i] = v
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.itemsize * len(self._keys) + self._vals.itemsize * len(self._vals)
+
+'''
+원문 PII를 보관하지 않는 압축 메모리 저장소.
+(라벨, 값)을 저장소마다 새로 만든 비밀키의 64비트 blake2b 다이제스트로 바꿔 DigestTable에 두고,
+가짜값은 UTF-8로 이어 붙인 바이트 배열과 오프셋 배열에 둔다. 다이제스트 충돌 확률은 항목 n개에 대해 약 n²/2⁶⁵이다.
+'''
+class CompactStateStore(StateStore):
+    def __init__(self, capacity: int = 1024):
+        self._secret = os.urandom(16)
+        self._lock = threading.Lock()
+        self._index = DigestTable(capacity)
+        self._counters: Dict[str, int] = {}
+        self._fakes = DigestTable(capacity)
+        self._blob = bytearray()
+        self._offsets = array("I", [0])
+
+    def _digest(self, label: str, value: str) -> int:
+        d = hashlib.blake2b(f"{label}\x1f{value}".encode("utf-8"), digest_size=8, key=self._secret).digest()
+        return int.from_bytes(d, "little") or 1
+
+    def assign_indices(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        out: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            for label, value in pairs:
+                k = self._digest(label, value)
+                n = self._index.get(k)
+                if n is None:
+                    n = self._counters[label] = self._counters.get(label, 0) + 1
+                    self._index.put(k, n)
+                out[(label, value)] = n
+        return out
+
+    def _fake_at(self, i: int) -> str:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def get_fakes(self, values: Iterable[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        with self._lock:
+            for v in values:
+                i = self._fakes.get(self._digest("", v))
+                if i is not None:
+                    out[v] = self._fake_at(i)
+        return out
+
+    def put_fakes(self, pairs: Dict[str, str]) -> Dict[str, str]:
+        with self._lock:
+            for v, f in pairs.items():
+                k = self._digest("", v)
+                if self._fakes.get(k) is None:
+                    self._blob += f.encode("utf-8")
+                    self._offsets.append(len(self._blob))
+                    self._fakes.put(k, len(self._offsets) - 2)
+        return self.get_fakes(pairs)
+
+    def footprint(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._index) + len(self._fakes)
+            total = (self._index.nbytes + self._fakes.nbytes + len(self._blob)
+                     + self._offsets.itemsize * len(self._offsets))
+            return {"entries": entries, "index_entries": len(self._index), "fake_entries": len(self._fakes),
+                    "bytes": total, "bytes_per_entry": round(total / entries, 2) if entries else 0.0}
+
+'''
+state dict 방식(MemoryStateStore)의 메모리 사용량 추정치. CompactStateStore.footprint()와 비교할 때 쓴다.
+문자열/dict 객체 크기의 합이며, 여러 곳에서 공유되는 문자열도 각각 센다.
+'''
+def dict_state_footprint(state: Dict[str, Any]) -> Dict[str, Any]:
+    total = entries = 0
+    for values in state.get("label_value_map", {}).values():
+        total += sys.getsizeof(values)
+        for v, n in values.items():
+            total += sys.getsizeof(v) + sys.getsizeof(n)
+            entries += 1
+    fake_map = state.get("fake_map", {})
+    total += sys.getsizeof(fake_map)
+    for v, f in fake_map.items():
+        total += sys.getsizeof(v) + sys.getsizeof(f)
+        entries += 1
+    return {"entries": entries, "bytes": total, "bytes_per_entry": round(total / entries, 2) if entries else 0.0}
+
+'''
+state의 저장소 메모리 사용량. 압축 저장소면 footprint(), state dict면 추정치, 그 밖(SQLite 등)이면 None.
+'''
+def state_footprint(state: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    store = (state or {}).get("store")
+    if store is None:
+        return dict_state_footprint(state or {})
+    return store.footprint() if isinstance(store, CompactStateStore) else None
+
+'''
+state에서 저장소를 꺼낸다. state["store"]가 있으면 그것을, 없으면 state dict 위의 메모리 저장소를 쓴다.
+'''
+def get_store(state: Dict[str, Any] | None) -> StateStore:
+    if state is not None and state.get("store") is not None:
+        return state["store"]
+    return MemoryStateStore(state)
+
+'''
+작업 한 건의 저장소를 만든다.
+PII_STATE_DB가 설정되어 있으면 SQLite, 아니면 PII_STATE_COMPACT에 따라 압축 저장소 또는 None(state dict 사용).
+job을 주지 않으면 임시 job 이름을 만든다. SQLite 행(원래값 매핑)은 close()할 때 지우고,
+keep=True일 때만 남긴다. (여러 프로세스가 같은 job을 나눠 처리할 때. 다 끝나면 drop_run/drop_job으로 지운다)
+'''
+def open_job_store(job: str | None = None, keep: bool = False) -> StateStore | None:
+    if not STATE_DB:
+        return CompactStateStore() if STATE_COMPACT else None
+    if job is None:
+        return SQLiteStateStore(STATE_DB, job=uuid.uuid4().hex, ephemeral=True)
+    return SQLiteStateStore(STATE_DB, job=job, ephemeral=not keep)
+
+'''
+SQLite 상태 파일에서 job 하나의 행을 지운다.
+'''
+def drop_job(job: str) -> None:
+    if STATE_DB:
+        store = SQLiteStateStore(STATE_DB, job=job)
+        store.drop()
+        store.close()
+
+'''
+SQLite 상태 파일에서 이름이 ":<run_id>"로 끝나는 job들의 행을 모두 지운다. (run_flow가 실행 id를 붙인 job들)
+'''
+def drop_run(run_id: str) -> None:
+    if not STATE_DB:
+        return
+    suffix = f":{run_id}"
+    conn = sqlite3.connect(STATE_DB, timeout=STATE_DB_TIMEOUT, isolation_level=None)
+    try:
+        for ddl in SQLiteStateStore.SCHEMA:
+            conn.execute(ddl)
+        for table in ("pii_counter", "pii_index", "pii_fake"):
+            conn.execute(f"DELETE FROM {table} WHERE substr(job, ?) = ?", (-len(suffix), suffix))
+    finally:
+        conn.close()
+
+'''
+파일/작업 한 건의 state를 새로 만든다.
+key(없으면 PII_PSEUDONYM_KEY)가 있으면 키 기반 가명화 모드로, store(없으면 open_job_store(job, keep))가 있으면 그 저장소로 동작한다.
+다 쓴 뒤 release_job_state()로 저장소를 닫는다. (예외가 나도 닫히도록 try/finally에서)
+'''
+def new_job_state(key: str | bytes | None = None, store: StateStore | None = None,
+                  job: str | None = None, keep: bool = False) -> Dict[str, Any]:
+    state: Dict[str, Any] = {}
+    key = key or PSEUDONYM_KEY
+    if key:
+        state["pseudonym_key"] = key
+    store = store if store is not None else open_job_store(job, keep=keep)
+    if store is not None:
+        state["store"] = store
+    return state
+
+'''
+state의 저장소를 닫는다. (임시 job이면 저장된 행도 지운다)
+state에 보관된 복원 매처도 함께 지운다.
+'''
+def release_job_state(state: Dict[str, Any] | None) -> None:
+    if not state:
+        return
+    state.pop("restore_matcher", None)
+    if state.get("store") is not None:
+        state.pop("store").close()
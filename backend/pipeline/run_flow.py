@@ -2,12 +2,26 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 import json
+import os
+import uuid
 from typing import Any, Dict, List
 
 from pii_guard.parsers.json_parser import json_parser as JP_JSON
 from pii_guard.parsers.csv_parser import csv_parser as JP_CSV
 
-from pii_guard.pii_masking import mask_one
+from pii_guard.pii_masking import mask_many
+from pii_guard.state_store import new_job_state, release_job_state
+
+# 실행 id. job 이름에 붙여 다시 실행해도 이전 실행의 인덱스를 이어 쓰지 않게 한다.
+# 여러 프로세스가 같은 실행을 나눠 처리하면 PII_RUN_ID를 같게 주고, 이때는 행을 남기므로 끝난 뒤 drop_run(RUN_ID)로 지운다.
+RUN_ID = os.getenv("PII_RUN_ID") or uuid.uuid4().hex
+SHARED_RUN = bool(os.getenv("PII_RUN_ID"))
+
+'''
+파일 한 건의 job state를 만든다. (PII_STATE_DB가 있으면 SQLite job "<이름>:<RUN_ID>")
+'''
+def _job_state(name: str) -> Dict[str, Any]:
+    return new_job_state(job=f"{name}:{RUN_ID}", keep=SHARED_RUN)
 
 '''
 JSON 파일을 로드한다. 
@@ -27,14 +41,17 @@ def save_json(p: Path, data):
 '''
 *_parsed.json 파일을 읽어서 *_masked.json 파일을 생성한다.
 stateful=True이면 파일 단위 state를 공유하여 인덱스를 누적한다.
+PII_STATE_DB가 설정되어 있으면 state는 파일 이름과 실행 id를 job으로 하는 SQLite 저장소에 두므로,
+같은 PII_RUN_ID로 같은 파일을 나눠 처리하는 여러 프로세스가 같은 값에 같은 인덱스를 받는다.
 '''
 def mask_parsed_file(parsed_path: Path, out_suffix: str, stateful: bool = False) -> Path:
     rows = load_json(parsed_path)  # [{"text": "..."} ...]
-    state = {} if stateful else None
-    masked_rows = []
-    for row in rows:
-        t = row.get("text", "")
-        masked_rows.append({"text": t, "masked": mask_one(t, state=state)})
+    state = _job_state(f"{parsed_path.name}:masked") if stateful else None
+    texts = [row.get("text", "") for row in rows]
+    try:
+        masked_rows = [{"text": t, "masked": m} for t, m in zip(texts, mask_many(texts, state=state))]
+    finally:
+        release_job_state(state)
     out = parsed_path.with_name(parsed_path.name.replace(out_suffix, "_masked.json"))
     save_json(out, masked_rows)
     return out
@@ -78,17 +95,26 @@ def restore_to_json(file_stem: str, result_dir: Path, file_dir: Path, joiner: st
     maps = load_json(map_path) 
     _    = load_json(in_json)  
 
-    state   = {}  # 파일 단위 인덱싱 공유
     restored: List[Dict[str, Any]] = []
     overlay:  List[Dict[str, Any]] = []
 
+    # 모든 map의 parts를 순서대로 모아 한 번에 stateful 배치 마스킹
+    all_parts: List[str] = []
+    for m in maps:
+        n = min(len(m.get("paths", [])), len(m.get("parts", [])))
+        all_parts.extend(str(p) for p in m.get("parts", [])[:n])
+    state = _job_state(f"{file_stem}.json:restored")  # 파일 단위 인덱싱 공유
+    try:
+        all_masked = iter(mask_many(all_parts, state=state))
+    finally:
+        release_job_state(state)
+
     for i, m in enumerate(maps):
         paths: List[str]      = m.get("paths", [])
         orig_parts: List[str] = m.get("parts", [])
         n = min(len(paths), len(orig_parts))
 
-        # parts를 직접 stateful 마스킹
-        masked_parts = [mask_one(str(orig_parts[k]), state=state) for k in range(n)]
+        masked_parts = [next(all_masked) for _ in range(n)]
 
         # path → masked 매핑 후 원래 구조로 복원
         flat_masked  = {paths[k]: masked_parts[k] for k in range(n)}
@@ -155,66 +181,81 @@ def restore_to_csv(file_stem: str, result_dir: Path, file_dir: Path, joiner: str
         return False
 
     # 파일 단위 인덱싱 state 공유
-    state = {}
-
-    # 컬럼별 허용 라벨
-    label_whitelist: Dict[str, set] = {
-        "주민등록번호": {"SSN"},
-        "여권번호": {"PASS"},
-        "신용카드번호": {"CC"},
-        "계좌번호": {"ACCT"},
-    }
-
-    # 각 필드(original)에 대해 열 단위 마스킹 수행
-    for m in maps:
-        fields = m.get("fields") or _paths_to_fields(m.get("paths", []))
-        for field in fields:
-            r = field.get("row")
-            c = field.get("column")
-            if r is None or c is None or not (0 <= r < len(rows)):
-                continue
-            want = _norm(str(c))
-            actual_col = header_alias.get(want)
-            if not actual_col:
-                print(f"[warn] column not found: want='{c}' (norm='{want}')")
-                continue
-
-            original_val = field.get("original", "")
-            base_col = actual_col.strip().lstrip("\ufeff")
-            allow = label_whitelist.get(base_col)
-            rows[r][actual_col] = mask_one(str(original_val), state=state, allow_labels=allow)
-
-    # 저장 (복원 CSV)
-    out_csv = result_dir / f"{file_stem}_restored.csv"
-    with out_csv.open("w", newline="", encoding="utf-8") as f:
-        import csv as _csv
-        writer = _csv.DictWriter(f, fieldnames=original_headers)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow({h: row.get(h, "") for h in original_headers})
-
-    # 오버레이 (원본 vs 마스킹 비교표)
-    overlay = []
-    for m in maps:
-        fields = m.get("fields") or _paths_to_fields(m.get("paths", []))
-        fields_out = []
-        for field in fields:
-            r = field.get("row")
-            c = field.get("column")
-            want = _norm(str(c))
-            actual_col = header_alias.get(want, c)
-            base_col = (actual_col or "").strip().lstrip("\ufeff")
-            original_val = field.get("original", "")
-            allow = label_whitelist.get(base_col)
-            masked_val   = mask_one(str(original_val), state=state, allow_labels=allow)
-            fields_out.append({
-                "path": f"row[{r}].{actual_col}" if r is not None and actual_col else (field.get("path", "") or ""),
-                "original": original_val,
-                "masked": masked_val
-            })
-        overlay.append({"fields": fields_out})
-
-    save_json(result_dir / f"{file_stem}_overlay.json", overlay)
+    state = _job_state(f"{file_stem}.csv:restored")
+    try:
+        # 컬럼별 허용 라벨
+        label_whitelist: Dict[str, set] = {
+            "주민등록번호": {"SSN"},
+            "여권번호": {"PASS"},
+            "신용카드번호": {"CC"},
+            "계좌번호": {"ACCT"},
+        }
+
+        # 각 필드(original)에 대해 열 단위 마스킹 대상 수집 후 배치 마스킹
+        targets: List[tuple] = []
+        for m in maps:
+            fields = m.get("fields") or _paths_to_fields(m.get("paths", []))
+            for field in fields:
+                r = field.get("row")
+                c = field.get("column")
+                if r is None or c is None or not (0 <= r < len(rows)):
+                    continue
+                want = _norm(str(c))
+                actual_col = header_alias.get(want)
+                if not actual_col:
+                    print(f"[warn] column not found: want='{c}' (norm='{want}')")
+                    continue
+
+                original_val = field.get("original", "")
+                base_col = actual_col.strip().lstrip("\ufeff")
+                targets.append((r, actual_col, str(original_val), label_whitelist.get(base_col)))
+
+        masked_vals = mask_many([t[2] for t in targets], state=state, allow_labels=[t[3] for t in targets])
+        for (r, actual_col, _, _), masked_val in zip(targets, masked_vals):
+            rows[r][actual_col] = masked_val
+
+        # 저장 (복원 CSV)
+        out_csv = result_dir / f"{file_stem}_restored.csv"
+        with out_csv.open("w", newline="", encoding="utf-8") as f:
+            import csv as _csv
+            writer = _csv.DictWriter(f, fieldnames=original_headers)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({h: row.get(h, "") for h in original_headers})
+
+        # 오버레이 (원본 vs 마스킹 비교표)
+        overlay = []
+        overlay_fields: List[List[Dict[str, Any]]] = []
+        overlay_texts: List[str] = []
+        overlay_allow: List[set | None] = []
+        for m in maps:
+            fields = m.get("fields") or _paths_to_fields(m.get("paths", []))
+            fields_out = []
+            for field in fields:
+                r = field.get("row")
+                c = field.get("column")
+                want = _norm(str(c))
+                actual_col = header_alias.get(want, c)
+                base_col = (actual_col or "").strip().lstrip("\ufeff")
+                original_val = field.get("original", "")
+                overlay_texts.append(str(original_val))
+                overlay_allow.append(label_whitelist.get(base_col))
+                fields_out.append({
+                    "path": f"row[{r}].{actual_col}" if r is not None and actual_col else (field.get("path", "") or ""),
+                    "original": original_val,
+                    "masked": None
+                })
+            overlay_fields.append(fields_out)
+
+        overlay_masked = iter(mask_many(overlay_texts, state=state, allow_labels=overlay_allow))
+        for fields_out in overlay_fields:
+            for fo in fields_out:
+                fo["masked"] = next(overlay_masked)
+            overlay.append({"fields": fields_out})
+
+        save_json(result_dir / f"{file_stem}_overlay.json", overlay)
+    finally:
+        release_job_state(state)
     return True
 
 def main():
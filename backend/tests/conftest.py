@@ -0,0 +1,83 @@
+from __future__ import annotations
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pii_guard import inference, pii_masking  # noqa: E402
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+NAMES = ("이민형", "홍길동", "김철수", "정하나")
+PHONE_RE = re.compile(r"010-\d{4}-\d{4}")
+ADDR_RE = re.compile(r"서울시 \S+구")
+
+'''
+단어/기호 단위로 자르는 테스트용 토크나이저. (HF fast tokenizer와 같은 호출 형식)
+'''
+class FakeTokenizer:
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False, **kw):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        offs = [[m.span() for m in TOKEN_RE.finditer(t)] for t in batch]
+        out: Dict[str, Any] = {"input_ids": [[0] * len(o) for o in offs]}
+        if return_offsets_mapping:
+            out["offset_mapping"] = offs
+        if single:
+            out = {k: v[0] for k, v in out.items()}
+        return out
+
+'''
+이름 목록/전화번호/주소 정규식으로 엔티티를 내는 테스트용 NER 파이프라인.
+HF pipeline("ner", aggregation_strategy="simple")과 같은 결과 형식을 쓴다.
+'''
+class FakeNer:
+    def __init__(self):
+        self.calls = 0
+
+    def _one(self, text: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for name in NAMES:
+            for m in re.finditer(name, text):
+                out.append({"entity_group": "NAME", "word": name, "start": m.start(), "end": m.end(), "score": 0.99})
+        for label, rx in (("PHONE", PHONE_RE), ("ADDR", ADDR_RE)):
+            for m in rx.finditer(text):
+                out.append({"entity_group": label, "word": m.group(), "start": m.start(), "end": m.end(), "score": 0.9})
+        return sorted(out, key=lambda e: e["start"])
+
+    def __call__(self, texts, batch_size=None, **kw):
+        self.calls += 1
+        if isinstance(texts, str):
+            return self._one(texts)
+        return [self._one(t) for t in texts]
+
+@pytest.fixture
+def fake_ner(monkeypatch):
+    pipe = FakeNer()
+    monkeypatch.setattr(inference, "get_ner", lambda: pipe)
+    monkeypatch.setattr(inference, "get_tokenizer", lambda: FakeTokenizer())
+    monkeypatch.setattr(inference, "max_positions", lambda: 512)
+    pii_masking._entity_cache.clear()
+    yield pipe
+    pii_masking._entity_cache.clear()
+
+'''
+models/config.json의 라벨 체계와 실제 토크나이저를 쓰되 층/차원을 줄인 무작위 초기화 모델.
+분류층 가중치를 키워 토큰마다 다양한 라벨이 나오게 한다. (torch/transformers가 없으면 건너뜀)
+'''
+@pytest.fixture(scope="session")
+def tiny_model():
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from pii_guard.model_registry import MODEL_DIR
+    cfg = transformers.ElectraConfig.from_pretrained(MODEL_DIR, hidden_size=32, embedding_size=32, num_hidden_layers=2,
+                                                     num_attention_heads=2, intermediate_size=64)
+    torch.manual_seed(0)
+    model = transformers.ElectraForTokenClassification(cfg).eval()
+    with torch.no_grad():
+        model.classifier.weight.mul_(50)
+    tok = transformers.AutoTokenizer.from_pretrained(MODEL_DIR, use_fast=True)
+    return model, tok
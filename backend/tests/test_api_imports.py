@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+# cv2/easyocr/torch/transformers를 막아 둔 채 api를 불러오고, 그 모듈들이 로드되지 않았는지 확인한다
+_SCRIPT = """
+import sys
+BLOCKED = ("cv2", "easyocr", "torch", "transformers", "onnxruntime")
+
+class _Block:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in BLOCKED:
+            raise ImportError("blocked: " + name)
+        return None
+
+sys.meta_path.insert(0, _Block())
+import pii_guard.api
+loaded = sorted(m for m in sys.modules if m.split(".")[0] in BLOCKED)
+assert not loaded, loaded
+"""
+
+
+def test_api_imports_without_ocr_or_model_stacks():
+    res = subprocess.run([sys.executable, "-c", _SCRIPT], cwd=BACKEND, capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
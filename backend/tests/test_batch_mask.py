@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+from pii_guard import inference, pii_masking
+from pii_guard.engine import mask_csv_stream
+from pii_guard.inference import PACK_SEPARATOR
+from pii_guard.pii_fakedata import fake_many, fake_one
+from pii_guard.pii_masking import mask_many, mask_one
+
+TEXTS = [
+    "홍길동 010-1234-5678",
+    "",
+    "김철수와 홍길동은 서울시 강남구에 산다",
+    "메모 없음",
+    "이민형 a@b.com, 이민형 c@d.com",
+    "010-1234-5678 다시 연락",
+    "정하나 010-9999-0000 서울시 마포구",
+] * 2
+ALLOWS = [None, {"NAME"}, {"PHONE", "ADDR"}, None, {"EMAIL"}, set(), {"NAME", "PHONE"}] * 2
+
+
+@pytest.mark.parametrize("pack", [False, True])
+@pytest.mark.parametrize("batch_size", [1, 3, 16])
+def test_mask_many_equals_sequential_mask_one(fake_ner, batch_size, pack):
+    seq_state, batch_state = {}, {}
+    expected = [mask_one(t, state=seq_state) for t in TEXTS]
+    assert mask_many(TEXTS, state=batch_state, batch_size=batch_size, pack=pack) == expected
+
+
+def test_mask_many_per_text_allow_labels(fake_ner):
+    seq_state, batch_state = {}, {}
+    expected = [mask_one(t, state=seq_state, allow_labels=a) for t, a in zip(TEXTS, ALLOWS)]
+    assert mask_many(TEXTS, state=batch_state, allow_labels=ALLOWS) == expected
+
+
+def test_fake_many_equals_sequential_fake_one(fake_ner):
+    # 키가 없으면 가짜값이 무작위이므로 키 모드로 비교한다
+    seq_state, batch_state = {"pseudonym_key": "k"}, {"pseudonym_key": "k"}
+    expected = [fake_one(t, state=seq_state, allow_labels=a) for t, a in zip(TEXTS, ALLOWS)]
+    assert fake_many(TEXTS, state=batch_state, allow_labels=ALLOWS) == expected
+
+
+@pytest.mark.parametrize("fn", [mask_many, fake_many])
+def test_allow_labels_length_mismatch(fake_ner, fn):
+    with pytest.raises(ValueError):
+        fn(TEXTS, allow_labels=ALLOWS[:-1])
+
+
+def test_csv_numbering_is_file_wide(fake_ner):
+    src = "name,memo\n홍길동,김철수 지인\n김철수,홍길동 동료\n".encode("utf-8")
+    out = io.BytesIO()
+    mask_csv_stream(src, out, batch_rows=1)
+    assert out.getvalue().decode("utf-8").splitlines() == [
+        "name,memo", "[이름_1],[이름_2] 지인", "[이름_2],[이름_1] 동료"]
+
+
+def test_entity_cache_separates_packed_and_unpacked(monkeypatch, fake_ner):
+    # 묶인 시퀀스에서만 엔티티를 내는 파이프라인: pack 여부에 따라 결과가 달라야 한다
+    def packed_only(seqs, batch_size):
+        return [[{"entity_group": "ADDR", "start": 0, "end": len(s), "word": s, "score": 0.9}]
+                if PACK_SEPARATOR in s else [] for s in seqs]
+    monkeypatch.setattr(inference, "_run_pipeline", packed_only)
+    texts = ["서울시 강남구", "서울시 마포구"]
+    fresh = {}
+    for pack in (True, False):
+        pii_masking._entity_cache.clear()
+        fresh[pack] = mask_many(texts, pack=pack)
+    assert fresh[True] != fresh[False]
+    pii_masking._entity_cache.clear()
+    for pack in (True, False, True, False):
+        assert mask_many(texts, pack=pack) == fresh[pack]
@@ -0,0 +1,76 @@
+import base64
+import csv
+import io
+
+import pytest
+
+from pii_guard import pii_masking
+from pii_guard.engine import Base64Sink, detect_many, mask_csv_stream
+from pii_guard.pii_masking import mask_many
+from pii_guard.state_store import new_job_state, release_job_state
+
+ROWS = [
+    {"name": "홍길동", "phone": "010-1234-5678", "memo": "서울시 강남구 거주"},
+    {"name": "김철수", "phone": "", "memo": "홍길동의 지인, 쉼표, \"따옴표\""},
+    {"name": "", "phone": "010-9999-0000", "memo": "줄\n바꿈"},
+    {"name": "이민형", "phone": "010-1234-5678", "memo": "메모 없음"},
+] * 3
+
+
+def _csv_bytes(rows):
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=list(rows[0]))
+    w.writeheader()
+    w.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def _whole(rows):
+    headers = list(rows[0])
+    cells = [r[h] for r in rows for h in headers]
+    state = new_job_state()
+    try:
+        masked = mask_many(cells, state=state)
+    finally:
+        release_job_state(state)
+    n = len(headers)
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=headers)
+    w.writeheader()
+    w.writerows(dict(zip(headers, masked[i * n:(i + 1) * n])) for i in range(len(rows)))
+    return out.getvalue().encode("utf-8")
+
+
+@pytest.mark.parametrize("batch_rows", [1, 2, 5, 100])
+def test_streamed_csv_equals_whole_file(fake_ner, batch_rows):
+    out = io.BytesIO()
+    summary = mask_csv_stream(_csv_bytes(ROWS), out, batch_rows=batch_rows)
+    assert out.getvalue() == _whole(ROWS)
+    assert summary["rows"] == len(ROWS)
+    assert [p["index"] for p in summary["preview"]] == list(range(5))
+
+
+def test_stats_come_from_masking_detections(fake_ner):
+    cells = [r[h] for r in ROWS for h in ROWS[0]]
+    dets = detect_many(cells)
+    expected_types = sorted({t for d in dets for t in d.types()})
+    expected_total = sum(len(d.entities) for d in dets)
+
+    pii_masking._entity_cache.clear()
+    fake_ner.calls = 0
+    mask_many(cells)
+    masking_calls = fake_ner.calls
+
+    pii_masking._entity_cache.clear()
+    fake_ner.calls = 0
+    summary = mask_csv_stream(_csv_bytes(ROWS), io.BytesIO(), batch_rows=len(ROWS))
+    assert (summary["types"], summary["total_count"]) == (expected_types, expected_total)
+    assert fake_ner.calls == masking_calls
+
+
+def test_base64_sink_output(fake_ner):
+    chunks = []
+    b64 = Base64Sink(chunks.append)
+    mask_csv_stream(_csv_bytes(ROWS), b64, batch_rows=3)
+    b64.close()
+    assert base64.b64decode("".join(chunks)) == _whole(ROWS)
@@ -0,0 +1,100 @@
+import random
+import threading
+import re
+from datetime import date
+
+import numpy as np
+import pytest
+
+from pii_guard.fake_pool import AffinePermutation, FakePool, FakePools, fake_at
+from pii_guard.pii_fakedata import luhn_check, validate_email, validate_ssn
+from pii_guard.pii_masking import is_card_candidate, looks_like_passport
+from pii_guard.rules import ACCT_RE, DLN_RE, PHONE_PATTERNS, SSN_RE
+
+LABELS = ("NAME", "PHONE", "EMAIL", "SSN", "CC", "ACCT", "DLN", "PASS")
+
+
+def _valid(label, v):
+    if label == "NAME":
+        return bool(re.fullmatch(r"[가-힣]{3}", v))
+    if label == "PHONE":
+        return any(p.match(v) for p in PHONE_PATTERNS)
+    if label == "EMAIL":
+        return validate_email(v) and v.split("@")[1].startswith("example.")
+    if label == "SSN":
+        yy, mm, dd, g = int(v[:2]), int(v[2:4]), int(v[4:6]), int(v[7])
+        year = (2000 if g in (3, 4) else 1900) + yy
+        date(year, mm, dd)  # 실제 날짜여야 한다
+        return bool(SSN_RE.fullmatch(v)) and validate_ssn(v)
+    if label == "CC":
+        return luhn_check(v) and is_card_candidate(v)
+    if label == "ACCT":
+        return any(r.fullmatch(v) for r in ACCT_RE)
+    if label == "DLN":
+        return bool(DLN_RE.fullmatch(v))
+    if label == "PASS":
+        return looks_like_passport(v)
+    raise AssertionError(label)
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_pool_values_are_valid_and_unique(label):
+    pools = FakePools(seed=7, batch=256)
+    values = [pools.take(label) for _ in range(3000)]
+    assert len(set(values)) == len(values)
+    bad = [v for v in values if not _valid(label, v)]
+    assert not bad, bad[:5]
+
+
+@pytest.mark.parametrize("label", LABELS)
+def test_keyed_values_are_valid_and_stable(label):
+    rng = random.Random(label)
+    for _ in range(300):
+        n = rng.getrandbits(64)
+        v = fake_at(label, n)
+        assert v == fake_at(label, n) and _valid(label, v)
+
+
+def test_same_seed_gives_same_order():
+    a, b = FakePools(seed=3, batch=64), FakePools(seed=3, batch=64)
+    assert [a.take("EMAIL") for _ in range(200)] == [b.take("EMAIL") for _ in range(200)]
+    assert FakePools(seed=4, batch=64).take("EMAIL") != FakePools(seed=3, batch=64).take("EMAIL")
+
+
+@pytest.mark.parametrize("n", [1, 2, 12, 97, 1000, 4096])
+def test_affine_permutation_is_a_bijection(n):
+    perm = AffinePermutation(n, np.random.default_rng(n))
+    assert sorted(perm(np.arange(n, dtype=np.uint64)).tolist()) == list(range(n))
+
+
+def test_pool_cycle_has_no_repeats():
+    pool = FakePool("T", 97, lambda idx: [str(i) for i in idx.tolist()], np.random.default_rng(0), batch=10)
+    first = [pool.take() for _ in range(97)]
+    assert sorted(map(int, first)) == list(range(97))
+    second = [pool.take() for _ in range(97)]
+    assert sorted(map(int, second)) == list(range(97))
+
+
+def test_concurrent_takes_start_one_refill_at_a_time(monkeypatch):
+    pool = FakePool("T", 10_000, lambda idx: [str(i) for i in idx.tolist()], np.random.default_rng(0), batch=8)
+    started, release = [], threading.Event()
+    slow_refill = pool._refill
+
+    def refill():
+        started.append(1)
+        release.wait(5)
+        slow_refill()
+    monkeypatch.setattr(pool, "_refill", refill)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        for _ in range(50):
+            pool.take()
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(started) == 1
+    release.set()
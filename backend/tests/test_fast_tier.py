@@ -0,0 +1,38 @@
+import pytest
+
+from pii_guard import fast_tier
+from pii_guard.fast_tier import scan
+
+PLAIN = [
+    "이메일로 보내주세요",
+    "정보가 없습니다",
+    "오늘 회의는 조금 늦게 시작합니다",
+    "배송 완료되었습니다",
+    "전화번호 변경은 고객센터로 문의해 주세요",
+    "이번 주 정리 부탁드립니다",
+    "회의실 예약이 완료되었습니다",
+]
+NAMED = ["홍길동에게 전달", "이민형 님", "김철수가 왔다", "송민연 대리", "황서연씨 안녕하세요"]
+
+
+@pytest.mark.parametrize("text", PLAIN)
+def test_plain_sentences_skip_ner(text):
+    needs_ner, _, cues = scan(text)
+    assert not needs_ner and cues["name"] == 0
+
+
+@pytest.mark.parametrize("text", NAMED)
+def test_name_cues_route_to_ner(text):
+    assert scan(text)[0]
+
+
+# Kiwi가 없으면 길이와 용언 어미만 본다 (짧은 보통명사는 거르지 못한다)
+@pytest.mark.parametrize("text, expected", [("정리했습니다", False), ("김장하세요", False), ("이번달정산내역확인", False)]
+                         + [(t, True) for t in NAMED[:3]])
+def test_syllable_fallback_without_kiwi(monkeypatch, text, expected):
+    monkeypatch.setattr(fast_tier, "get_kiwi", lambda: None)
+    fast_tier._name_cue_cache.clear()
+    try:
+        assert scan(text)[0] == expected
+    finally:
+        fast_tier._name_cue_cache.clear()
@@ -0,0 +1,131 @@
+import base64
+import io
+import json
+import random
+
+import pytest
+
+from pii_guard import json_stream
+from pii_guard.engine import Base64Sink, mask_json_bytes, mask_json_objects, mask_json_stream
+from pii_guard.json_stream import iter_json_array, iter_jsonl, read_head
+
+TEXTS = ["홍길동 010-1234-5678", "김철수", "메모 없음", "이민형 a@b.com", "", "서울시 강남구 이민형"]
+
+
+def _value(rng, depth=0):
+    c = rng.random()
+    if depth > 2 or c < 0.5:
+        return rng.choice([rng.choice(TEXTS), 12345678901234567890, -0.5e-3, 7, True, False, None,
+                           "따옴표\"와 \\역슬래시", "é\U0001f600\n", 1.5])
+    if c < 0.75:
+        return {f"k{i}": _value(rng, depth + 1) for i in range(rng.randint(0, 3))}
+    return [_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+
+
+def _array(fp_text):
+    fp = io.StringIO(fp_text)
+    return list(iter_json_array(fp, read_head(fp)))
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 5, 8, 64])
+def test_values_split_across_chunk_boundaries(monkeypatch, chunk):
+    monkeypatch.setattr(json_stream, "_READ_CHUNK", chunk)
+    rng = random.Random(chunk)
+    for _ in range(40):
+        items = [_value(rng) for _ in range(rng.randint(0, 8))]
+        for doc in (json.dumps(items), json.dumps(items, ensure_ascii=False, indent=3),
+                    " \n" + json.dumps(items, separators=(",", ":")) + "\n "):
+            assert _array(doc) == items
+    assert _array("[123, 45]") == [123, 45]
+    assert _array('[NaN, -Infinity, "\\ud83d\\ude00"]')[1:] == [float("-inf"), "\U0001f600"]
+
+
+@pytest.mark.parametrize("doc", ["[1, 2", "[1 2]", "[1,]", "[1, x]", "[1] 2", '["a', "{}", ""])
+def test_malformed_array_raises(doc):
+    with pytest.raises(json.JSONDecodeError):
+        _array(doc)
+
+
+class _CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.read_chars = 0
+        self.reads = 0
+
+    def read(self, n=-1):
+        out = super().read(n)
+        self.read_chars += len(out)
+        self.reads += 1
+        return out
+
+
+def test_syntax_error_fails_without_reading_rest(monkeypatch):
+    monkeypatch.setattr(json_stream, "_READ_CHUNK", 1024)
+    tail = ", ".join(['{"a": "%s"}' % ("x" * 50)] * 20000)
+    fp = _CountingReader('[{"a": 1}, {"a": tru}, ' + tail + "]")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(fp, read_head(fp)))
+    assert fp.read_chars <= 4 * 1024
+
+
+def test_large_element_grows_reads_geometrically(monkeypatch):
+    monkeypatch.setattr(json_stream, "_READ_CHUNK", 1024)
+    big = "가" * (1 << 22)
+    fp = _CountingReader(json.dumps([1, {"a": big}, 2], ensure_ascii=False))
+    assert list(iter_json_array(fp, read_head(fp))) == [1, {"a": big}, 2]
+    assert fp.reads < 20
+
+
+@pytest.mark.parametrize("doc", ['["' + "x" * 100_000, '[1, {"a": "' + "x" * 100_000 + '"}]'])
+def test_element_over_limit_raises_with_bounded_reads(monkeypatch, doc):
+    monkeypatch.setattr(json_stream, "_READ_CHUNK", 1024)
+    monkeypatch.setattr(json_stream, "MAX_ITEM_CHARS", 10_000)
+    fp = _CountingReader(doc)
+    with pytest.raises(json.JSONDecodeError, match="longer than"):
+        list(iter_json_array(fp, read_head(fp)))
+    assert fp.read_chars <= 12_000
+
+
+def test_jsonl_keeps_raw_lines():
+    fp = io.StringIO('{"a": 1}\n\n not json\n[2]\n')
+    assert list(iter_jsonl(fp)) == [{"a": 1}, {"_raw": " not json"}, [2]]
+
+
+def _stream(data, is_jsonl, batch_items):
+    chunks = []
+    sink = Base64Sink(chunks.append)
+    summary = mask_json_stream(data, sink, is_jsonl=is_jsonl, batch_items=batch_items)
+    sink.close()
+    return "".join(chunks), summary
+
+
+@pytest.mark.parametrize("batch_items", [1, 3, 256])
+def test_streamed_json_matches_whole_document(fake_ner, batch_items):
+    rng = random.Random(batch_items)
+    for n in (0, 1, 7, 50):
+        items = [_value(rng) for _ in range(n)]
+        data = json.dumps(items, ensure_ascii=False).encode("utf-8")
+        b64, summary = _stream(data, False, batch_items)
+        (masked,), _ = mask_json_objects([items], state={})
+        assert json.loads(base64.b64decode(b64)) == masked
+        assert base64.b64decode(b64).decode("utf-8") == \
+               json.dumps(masked, ensure_ascii=False, indent=2)
+        assert summary["items"] == n
+        assert [p["index"] for p in summary["preview"]] == list(range(min(n, 5)))
+
+
+@pytest.mark.parametrize("batch_items", [1, 4, 256])
+def test_streamed_jsonl_matches_whole_document(fake_ner, batch_items):
+    rng = random.Random(batch_items)
+    items = [_value(rng) for _ in range(30)]
+    data = "\n".join(json.dumps(x, ensure_ascii=False) for x in items).encode("utf-8")
+    b64, summary = _stream(data, True, batch_items)
+    masked, _ = mask_json_objects(items, state={})
+    assert base64.b64decode(b64).decode("utf-8") == \
+           "\n".join(json.dumps(o, ensure_ascii=False) for o in masked)
+
+
+def test_mask_json_bytes_falls_back_to_text_on_bad_json(fake_ner):
+    out = mask_json_bytes("x.json", "[홍길동, 1".encode("utf-8"))
+    assert json.loads(base64.b64decode(out["masked_base64"])) == "[[이름_1], 1"
+    assert out["preview"][0]["kind"] == "json_scalar"
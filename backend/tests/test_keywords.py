@@ -0,0 +1,53 @@
+import random
+
+from pii_guard.keywords import KEYWORDS, AhoCorasick, keyword_hits
+
+
+def _naive_all(groups, text):
+    hits = set()
+    for g, words in groups.items():
+        for w in words:
+            start = text.find(w)
+            while start >= 0:
+                hits.add((start, start + len(w), g))
+                start = text.find(w, start + 1)
+    return hits
+
+
+def _random_text(rng, words):
+    parts = []
+    for _ in range(rng.randint(0, 8)):
+        if rng.random() < 0.5:
+            w = rng.choice(words)
+            # 키워드 일부만 넣어 접두/접미 겹침도 만든다
+            parts.append(w[:rng.randint(1, len(w))] if rng.random() < 0.3 else w)
+        else:
+            parts.append("".join(rng.choice("가나 번호0123-") for _ in range(rng.randint(0, 4))))
+    return "".join(parts)
+
+
+def test_find_all_matches_naive_search():
+    rng = random.Random(0)
+    words = [w for ws in KEYWORDS.values() for w in ws]
+    for _ in range(500):
+        text = _random_text(rng, words)
+        assert set(AhoCorasick(KEYWORDS).find_all(text)) == _naive_all(KEYWORDS, text)
+
+
+def test_overlapping_and_nested_keywords():
+    groups = {"a": ["he", "she", "hers", "his"], "b": ["s", "e"]}
+    text = "ushers shis"
+    assert set(AhoCorasick(groups).find_all(text)) == _naive_all(groups, text)
+
+
+def test_within_matches_substring_check():
+    rng = random.Random(1)
+    words = [w for ws in KEYWORDS.values() for w in ws]
+    for _ in range(500):
+        text = _random_text(rng, words)
+        hits = keyword_hits(text)
+        for _ in range(20):
+            lo = rng.randint(-15, len(text) + 2)
+            hi = rng.randint(max(0, lo - 3), len(text) + 15)
+            for group, kws in KEYWORDS.items():
+                assert hits.within(group, lo, hi) == any(kw in text[max(0, lo):hi] for kw in kws)
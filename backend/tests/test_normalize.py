@@ -0,0 +1,63 @@
+import random
+
+from pii_guard.normalize import as_normalized, normalize, normalize_text
+
+# 하이픈류, 공백류, 전각/반각, 결합 문자, 한글 자모, 합자/단위 기호 등 NFKC가 바꾸는 글자를 섞는다
+ALPHABET = (list("ab가힣01-@. ") + ["–", "ㅡ", "\t", "\n", "　", " ", "Ａ", "１", "－", "ｶ", "ﾞ",
+            "é", "́", "ᄀ", "ᅡ", "ᆨ", "㎏", "ﬁ", "①", "Ⅻ", "ｈｏｎｇ", "Å"])
+
+
+def _random_text(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 20)))
+
+
+def test_normalize_equals_normalize_text():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = _random_text(rng)
+        view = normalize(text)
+        assert view.text == normalize_text(text)
+        assert view.original == text
+        assert as_normalized(view) == as_normalized(text)
+
+
+def test_clean_text_takes_identity_path():
+    view = normalize("홍길동 010-1234-5678")
+    assert view.identity and view.to_original(4, 7) == (4, 7)
+
+
+def test_offsets_map_back_to_source_ranges():
+    rng = random.Random(1)
+    for _ in range(3000):
+        text = _random_text(rng)
+        view = normalize(text)
+        n = len(view.text)
+        if view.identity:
+            continue
+        assert len(view._starts) == len(view._ends) == n
+        assert view._starts == sorted(view._starts) and view._ends == sorted(view._ends)
+        for i in range(n):
+            assert 0 <= view._starts[i] < view._ends[i] <= len(text)
+        for _ in range(10):
+            a = rng.randint(0, n)
+            b = rng.randint(a, n)
+            s, e = view.to_original(a, b)
+            assert 0 <= s <= e <= len(text)
+            # 원문 구간을 다시 정규화하면 정규화 구간이 그 안에 들어 있다
+            assert view.text[a:b] in normalize_text(text[s:e])
+
+
+def test_splice_replaces_original_ranges():
+    text = "ｈｏｎｇ　　010–1234–5678 ①"
+    view = normalize(text)
+    assert view.text == "hong 010-1234-5678 1"
+    a = view.text.index("010")
+    out, offsets = view.splice([(0, 4, "[이름_1]"), (a, a + 13, "[전화번호_1]")])
+    assert out == "[이름_1]　　[전화번호_1] ①"
+    assert [o[:2] for o in offsets] == [(0, 4), (6, 19)]
+
+
+def test_overlapping_mapped_replacements_are_merged():
+    view = normalize("㎏x")
+    assert view.text == "kgx"
+    assert view.map_replacements([(0, 1, "A"), (1, 2, "B")]) == [(0, 1, "AB", [0, 1])]
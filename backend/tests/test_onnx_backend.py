@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from pii_guard.span_decoder import TorchNerPipeline
+
+TEXTS = [
+    "김민수 고객님의 연락처는 010-2345-6789입니다.",
+    "",
+    "배송지: 경기도 성남시 분당구 판교역로 235 수령인 한지민",
+    "담당자 박지훈 (jihoon.park@example.com)에게 문의하세요. " * 30,
+    "a",
+]
+
+
+@pytest.fixture(scope="module")
+def onnx_pipeline(tiny_model, tmp_path_factory):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from pii_guard.onnx_backend import FastTokenizer, OnnxNerPipeline, export_onnx
+    model, tok = tiny_model
+    model_dir = tmp_path_factory.mktemp("tiny_model")
+    model.save_pretrained(model_dir)
+    tok.save_pretrained(model_dir)
+    path = export_onnx(str(model_dir), out_path=model_dir / "onnx" / "model.onnx")
+    return OnnxNerPipeline(FastTokenizer(model_dir / "tokenizer.json"), model.config.id2label, 64, path=path)
+
+
+def test_fast_tokenizer_matches_hf_tokenizer(tiny_model, onnx_pipeline):
+    _, tok = tiny_model
+    kw = dict(padding=True, truncation=True, max_length=64, return_offsets_mapping=True,
+              return_special_tokens_mask=True, return_tensors="np")
+    want, got = tok(TEXTS, **kw), onnx_pipeline.tokenizer(TEXTS, **kw)
+    for key in ("input_ids", "attention_mask", "token_type_ids", "offset_mapping", "special_tokens_mask"):
+        np.testing.assert_array_equal(got[key], want[key], err_msg=key)
+
+
+def test_onnx_matches_torch(tiny_model, onnx_pipeline):
+    model, tok = tiny_model
+    torch_pipe = TorchNerPipeline(model, tok, model.config.id2label, 64)
+    for want, got in zip(torch_pipe(TEXTS, batch_size=2), onnx_pipeline(TEXTS, batch_size=2)):
+        assert [(e["entity_group"], e["start"], e["end"], e["word"]) for e in got] == \
+               [(e["entity_group"], e["start"], e["end"], e["word"]) for e in want]
+        assert [e["score"] for e in got] == pytest.approx([e["score"] for e in want], abs=1e-4)
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from pii_guard import inference
+from pii_guard.inference import PACK_SEPARATOR, inference_stats, ner_many, ner_packed
+
+CELLS = ["홍길동", "", "010-1234-5678", "   ", "김철수 서울시 강남구", "메모 없음", "이민형 010-9999-0000 정하나",
+         "서울시 마포구 이민형", "a", "홍길동 홍길동"]
+
+
+def _strip(results):
+    return [[(e["entity_group"], e["start"], e["end"], e["word"]) for e in ents] for ents in results]
+
+
+@pytest.mark.parametrize("max_tokens", [6, 10, 24, 512])
+def test_packed_equals_unpacked(fake_ner, max_tokens):
+    rng = random.Random(max_tokens)
+    for _ in range(20):
+        texts = [rng.choice(CELLS) for _ in range(rng.randint(1, 30))]
+        assert _strip(ner_packed(texts, max_tokens=max_tokens)) == _strip(ner_many(texts, pack=False))
+
+
+def test_packing_reduces_model_sequences(fake_ner):
+    texts = [c for c in CELLS if c.strip()] * 5
+    before = inference_stats()["sequences"]
+    ner_many(texts, pack=False)
+    unpacked = inference_stats()["sequences"] - before
+    before = inference_stats()["sequences"]
+    ner_packed(texts)
+    assert inference_stats()["sequences"] - before < unpacked
+
+
+def test_entity_crossing_a_cell_boundary_is_clipped(monkeypatch, fake_ner):
+    # 시퀀스 전체를 하나의 엔티티로 내는 파이프라인: 셀마다 잘려야 한다
+    def whole(seqs, batch_size):
+        return [[{"entity_group": "ADDR", "start": 0, "end": len(s), "word": s, "score": 0.9}] for s in seqs]
+    monkeypatch.setattr(inference, "_run_pipeline", whole)
+    texts = ["서울시", "", "강남구 역삼동"]
+    out = ner_packed(texts)
+    assert _strip(out) == [[("ADDR", 0, 3, "서울시")], [], [("ADDR", 0, 7, "강남구 역삼동")]]
+    assert all(PACK_SEPARATOR not in e["word"] for ents in out for e in ents)
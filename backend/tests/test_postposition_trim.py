@@ -0,0 +1,26 @@
+import pytest
+
+from pii_guard.model_registry import get_kiwi
+from pii_guard.pii_masking import mask_one, postposition_cuts
+
+pytestmark = pytest.mark.skipif(get_kiwi() is None, reason="kiwipiepy not installed")
+
+
+@pytest.mark.parametrize("name", ["정하나", "이도", "우다", "김가", "김수야", "박보나", "이하나"])
+def test_names_ending_in_particle_like_syllables_are_not_cut(name):
+    assert postposition_cuts([name])[name] == 0
+
+
+@pytest.mark.parametrize("word, cut", [("홍길동은", 1), ("김철수가", 1), ("홍길동도", 1),
+                                       ("이민형에게", 2), ("이도가", 1)])
+def test_trailing_particle_uses_surface_length(word, cut):
+    assert postposition_cuts([word])[word] == cut
+
+
+def test_trim_is_off_by_default(fake_ner):
+    assert mask_one("정하나에게 연락") == "[이름_1]에게 연락"
+
+
+def test_enabled_trim_keeps_name_whole(fake_ner):
+    out = mask_one("정하나 010-1234-5678", stages={"trim": True})
+    assert out == "[이름_1] [전화번호_1]"
@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+from pii_guard import precision
+
+
+def _gold(sample):
+    return [{"entity_group": e["label"], "start": e["start"], "end": e["end"]} for e in sample["entities"]]
+
+
+def _check(monkeypatch, candidate):
+    samples = precision.load_samples()
+    by_text = {s["text"]: s for s in samples}
+    predict = {"fp32": _gold, "int8": candidate}
+    monkeypatch.setattr(precision, "apply_precision", lambda model, mode: model)
+    monkeypatch.setattr(precision, "_predictor", lambda model, tok, mode: lambda text: predict[mode](by_text[text]))
+    return precision.check_precision(object(), None, "int8", samples=samples, max_drift=0.02)[1]
+
+
+@pytest.mark.parametrize("raw, mode", [(None, "fp32"), ("fp32", "fp32"), (" BF16 ", "bf16"), ("int8", "int8")])
+def test_resolve_mode_accepts_supported_values(caplog, raw, mode):
+    with caplog.at_level(logging.WARNING):
+        assert precision.resolve_mode(raw) == mode
+    assert not caplog.records
+
+
+def test_resolve_mode_falls_back_to_fp32_with_warning(caplog):
+    with caplog.at_level(logging.WARNING):
+        assert precision.resolve_mode("fp16") == "fp32"
+    assert "fp16" in caplog.text
+
+
+def test_samples_cover_every_label():
+    samples = precision.load_samples()
+    counts = {}
+    for s in samples:
+        for e in s["entities"]:
+            assert s["text"][e["start"]:e["end"]].strip()
+            counts[e["label"]] = counts.get(e["label"], 0) + 1
+    assert set(counts) == {"NAME", "PHONE", "ADDR", "EMAIL", "SSN", "CC", "ACCT", "PASS", "DLN"}
+    assert min(counts.values()) >= 20
+
+
+def test_identical_predictions_pass(monkeypatch):
+    report = _check(monkeypatch, _gold)
+    assert report["ok"] and report["max_drift"] == 0.0
+
+
+def test_missed_entities_count_as_drift(monkeypatch):
+    report = _check(monkeypatch, lambda s: [e for e in _gold(s) if e["entity_group"] != "SSN"])
+    assert not report["ok"] and report["f1_drift"]["SSN"] == 1.0
+
+
+def test_candidate_only_false_positive_label_counts_as_drift(monkeypatch):
+    def with_dates(sample):
+        return _gold(sample) + [{"entity_group": "DATE", "start": 0, "end": 1}]
+    report = _check(monkeypatch, with_dates)
+    assert "DATE" not in report["baseline"]
+    assert report["f1_drift"]["DATE"] == 1.0
+    assert not report["ok"]
@@ -0,0 +1,52 @@
+import re
+
+from pii_guard.pii_fakedata import fake_many, replace_entities_with_fake
+from pii_guard.pii_masking import mask_many
+from pii_guard.pseudonym import PSEUDONYM_TOKEN_HEX, pseudonym_suffix
+from pii_guard.state_store import MemoryStateStore, StateStore, new_job_state
+
+KEY = "test-key"
+TEXTS = ["홍길동 010-1234-5678", "김철수 010-9999-8888 홍길동", "이민형 010-1234-5678"]
+
+
+class _Forbidden(StateStore):
+    def assign_indices(self, pairs):
+        raise AssertionError("keyed mode must not use the store")
+
+    def get_fakes(self, values):
+        raise AssertionError("keyed mode must not use the store")
+
+    def put_fakes(self, pairs):
+        raise AssertionError("keyed mode must not use the store")
+
+
+def test_token_suffix_is_at_least_64_bits(fake_ner):
+    assert PSEUDONYM_TOKEN_HEX >= 16
+    assert len(pseudonym_suffix(KEY, "NAME", "홍길동")) == PSEUDONYM_TOKEN_HEX
+    (out,) = mask_many(["홍길동"], state=new_job_state(key=KEY, store=MemoryStateStore()))
+    assert re.fullmatch(r"\[이름_[0-9a-f]{%d}\]" % PSEUDONYM_TOKEN_HEX, out)
+
+
+def test_keyed_output_does_not_depend_on_order_or_state(fake_ner):
+    fwd = fake_many(TEXTS, state={"pseudonym_key": KEY})
+    rev = fake_many(TEXTS[::-1], state={"pseudonym_key": KEY})[::-1]
+    one_by_one = [fake_many([t], state={"pseudonym_key": KEY})[0] for t in TEXTS]
+    assert fwd == rev == one_by_one
+    assert mask_many(TEXTS, state={"pseudonym_key": KEY}) == \
+           mask_many(TEXTS[::-1], state={"pseudonym_key": KEY})[::-1]
+
+
+def test_keyed_mode_bypasses_store(fake_ner):
+    state = new_job_state(key=KEY, store=_Forbidden())
+    assert fake_many(TEXTS, state=state) == fake_many(TEXTS, state={"pseudonym_key": KEY})
+    mask_many(TEXTS, state=state)
+
+
+def test_keyed_fakes_are_keyed_by_label_and_value():
+    text = "4111111111111111 4111111111111111"
+    ents = [{"entity_group": "CC", "word": text[:16], "start": 0, "end": 16},
+            {"entity_group": "ACCT", "word": text[17:], "start": 17, "end": 33}]
+    out = replace_entities_with_fake(text, ents, state={"pseudonym_key": KEY})
+    cc, acct = out.split(" ")
+    assert cc != acct
+    assert replace_entities_with_fake(text, ents[:1], state={"pseudonym_key": KEY}).split(" ")[0] == cc
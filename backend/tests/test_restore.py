@@ -0,0 +1,75 @@
+import random
+
+from pii_guard.engine import detect_and_redact
+from pii_guard.normalize import normalize_text
+from pii_guard.restore import STATE_MATCHER_KEY, get_matcher, restore_text
+from pii_guard.state_store import new_job_state, release_job_state
+
+
+def _leftmost_longest(text, restore_map):
+    # 글자 단위로 훑으며 현재 위치에서 가장 긴 가짜값을 고르는 참조 구현
+    fakes = sorted((f for f in restore_map if f), key=len, reverse=True)
+    out, i = [], 0
+    while i < len(text):
+        for f in fakes:
+            if text.startswith(f, i):
+                out.append(restore_map[f])
+                i += len(f)
+                break
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def _sequential_replace(text, restore_map):
+    for fake in sorted(restore_map, key=len, reverse=True):
+        text = text.replace(fake, restore_map[fake])
+    return text
+
+
+def test_matches_leftmost_longest_reference():
+    rng = random.Random(0)
+    for _ in range(1000):
+        fakes = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 5))}
+        restore_map = {f: f"<{i}>" for i, f in enumerate(sorted(fakes))}
+        text = "".join(rng.choice("abcx") for _ in range(rng.randint(0, 25)))
+        assert restore_text(text, restore_map) == _leftmost_longest(text, restore_map)
+
+
+def test_matches_sequential_replace_on_separated_values():
+    rng = random.Random(1)
+    names = ["송민연", "조준인", "010-1747-6446", "contact694370@example.net", "송민", "서울시 중구"]
+    for _ in range(300):
+        fakes = rng.sample(names, rng.randint(1, len(names)))
+        restore_map = {f: f"원래{i}" for i, f in enumerate(fakes)}
+        text = " ".join(rng.choice(names + ["메모", "및"]) for _ in range(rng.randint(0, 10)))
+        assert restore_text(text, restore_map) == _sequential_replace(text, restore_map)
+
+
+def test_restored_values_are_not_rescanned():
+    restore_map = {"김철수": "홍길동", "홍길동": "이민형"}
+    assert restore_text("김철수와 홍길동", restore_map) == "홍길동와 이민형"
+    assert _sequential_replace("김철수와 홍길동", restore_map) == "이민형와 이민형"
+
+
+def test_fake_round_trip(fake_ner):
+    text = "홍길동 010-1234-5678, 김철수 a@b.com 홍길동 서울시 강남구"
+    res = detect_and_redact(text)
+    assert restore_text(res["fake_text"], res["restore_map"]) == normalize_text(text)
+    assert res["restored_example"] == normalize_text(text)
+
+
+def test_matcher_is_cached_per_job_state():
+    assert get_matcher({"a": "b"}) is not get_matcher({"a": "b"})
+    state = new_job_state()
+    first = get_matcher({"a": "b"}, state)
+    assert get_matcher({"a": "b"}, state) is first
+    grown = {"a": "b", "c": "d"}
+    assert restore_text("ac", grown, state) == "bd"
+    assert get_matcher(grown, state) is not first
+    assert restore_text("a", {"a": "x"}, state, version=7) == "x"
+    assert restore_text("a", {"a": "y"}, state, version=7) == "x"
+    assert restore_text("a", {"a": "y"}, state, version=8) == "y"
+    release_job_state(state)
+    assert STATE_MATCHER_KEY not in state
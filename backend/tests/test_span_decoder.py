@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from pii_guard.span_decoder import LabelScheme, TorchNerPipeline, decode_batch, decode_simple
+
+TEXTS = [
+    "김민수 고객님의 연락처는 010-2345-6789입니다.",
+    "담당자 박지훈 (jihoon.park@example.com)에게 문의하세요.",
+    "",
+    "배송지: 경기도 성남시 분당구 판교역로 235 수령인 한지민",
+    "hello world 1234-5678-9012-3456",
+    "주민등록번호 900101-1234568 확인",
+    "a",
+]
+
+
+def _groups(ents):
+    return [(e["entity_group"], int(e["start"]), int(e["end"])) for e in ents]
+
+
+def test_matches_hf_simple_aggregation(tiny_model):
+    from transformers import pipeline
+    model, tok = tiny_model
+    hf = pipeline("ner", model=model, tokenizer=tok, aggregation_strategy="simple")
+    ours = TorchNerPipeline(model, tok, model.config.id2label, 512)
+    for text, want, got in zip(TEXTS, hf(TEXTS), ours(TEXTS, batch_size=3)):
+        assert _groups(got) == _groups(want)
+        assert [e["score"] for e in got] == pytest.approx([float(e["score"]) for e in want], abs=1e-4)
+        assert [e["word"] for e in got] == [text[e["start"]:e["end"]] for e in got]
+    assert _groups(ours(TEXTS[0])) == _groups(hf(TEXTS[0]))
+
+
+ID2LABEL = {0: "B-NAME", 1: "I-NAME", 2: "B-PHONE", 3: "I-PHONE", 4: "O"}
+
+
+def _reference(probs, offsets, special):
+    # HF simple 집계를 토큰 단위로 그대로 따라가는 참조 구현
+    out, cur = [], None
+    for i, p in enumerate(probs):
+        if special[i]:
+            continue
+        lid = int(p.argmax())
+        name = ID2LABEL[lid]
+        bi, tag = (name[0], name[2:]) if name[:2] in ("B-", "I-") else ("I", name)
+        if cur is None or tag != cur[0] or bi == "B":
+            if cur is not None:
+                out.append(cur)
+            cur = [tag, offsets[i][0], offsets[i][1], [float(p[lid])]]
+        else:
+            cur[2] = offsets[i][1]
+            cur[3].append(float(p[lid]))
+    if cur is not None:
+        out.append(cur)
+    return [(t, s, e, sum(sc) / len(sc)) for t, s, e, sc in out if t != "O"]
+
+
+def test_decode_batch_matches_reference_on_random_probs():
+    rng = np.random.default_rng(0)
+    scheme = LabelScheme(ID2LABEL)
+    for _ in range(200):
+        n_seqs, n_tok = rng.integers(1, 5), rng.integers(1, 12)
+        probs = rng.dirichlet(np.ones(len(ID2LABEL)) * 0.3, size=(n_seqs, n_tok)).astype(np.float32)
+        offsets = np.stack([np.stack([np.arange(n_tok) * 2, np.arange(n_tok) * 2 + 1], axis=-1)] * n_seqs)
+        special = rng.random((n_seqs, n_tok)) < 0.2
+        spans = decode_batch(probs, offsets, special, scheme)
+        got = spans.to_dicts(["x" * (2 * n_tok)] * n_seqs)
+        for b in range(n_seqs):
+            want = _reference(probs[b], offsets[b], special[b])
+            assert _groups(got[b]) == [w[:3] for w in want]
+            assert [e["score"] for e in got[b]] == pytest.approx([w[3] for w in want], rel=1e-5)
+        single = decode_simple("x" * (2 * n_tok), probs[0], offsets[0], special[0], ID2LABEL)
+        assert _groups(single) == _groups(got[0])
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from pii_guard.engine import detect_and_redact
+from pii_guard.normalize import normalize_text
+from pii_guard.pii_masking import LABELS_KOR
+from pii_guard.span_rewriter import map_position, rewrite_spans
+
+
+def _random_replacements(rng, n):
+    reps, pos = [], 0
+    while pos < n and len(reps) < 6:
+        start = rng.randint(pos, n)
+        end = rng.randint(start, min(n, start + 5))
+        reps.append((start, end, "#" * rng.randint(0, 7)))
+        pos = end + rng.randint(0, 1)
+    return reps
+
+
+def test_rewrite_equals_sequential_replace():
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice("abc가나 ") for _ in range(rng.randint(0, 30)))
+        reps = _random_replacements(rng, len(text))
+        naive = text
+        for start, end, new in reversed(reps):
+            naive = naive[:start] + new + naive[end:]
+        out, offsets = rewrite_spans(text, reps)
+        assert out == naive
+        for (start, end, new), (s, e, ds, de) in zip(reps, offsets):
+            assert (s, e) == (start, end) and out[ds:de] == new
+        # 치환 밖의 글자는 map_position으로 옮긴 위치에 그대로 있다
+        inside = {i for s, e, _ in reps for i in range(s, e)}
+        for i, ch in enumerate(text):
+            if i not in inside:
+                assert out[map_position(offsets, i)] == ch
+
+
+def test_overlapping_replacements_are_rejected():
+    with pytest.raises(ValueError):
+        rewrite_spans("abcdef", [(0, 3, "x"), (2, 4, "y")])
+
+
+def _unrewrite(out, spans, source):
+    # 출력의 치환 구간을 원문 구간으로 되돌리면 원문이 나와야 한다
+    parts, pos = [], 0
+    for sp in spans:
+        parts.append(out[pos:sp["start"]])
+        parts.append(source[sp["src_start"]:sp["src_end"]])
+        pos = sp["end"]
+    parts.append(out[pos:])
+    return "".join(parts)
+
+
+def test_detect_and_redact_spans_point_at_tokens(fake_ner):
+    text = "홍길동 010-1234-5678, ｈｏｎｇ 김철수 a@b.com 홍길동 서울시 강남구"
+    norm = normalize_text(text)
+    res = detect_and_redact(text)
+
+    for sp in res["redacted_spans"]:
+        assert res["redacted_text"][sp["start"]:sp["end"]].startswith(f"[{LABELS_KOR[sp['label']]}_")
+    for sp in res["fake_spans"]:
+        assert res["fake_text"][sp["start"]:sp["end"]] == res["fake_map"][norm[sp["src_start"]:sp["src_end"]]]
+
+    assert _unrewrite(res["redacted_text"], res["redacted_spans"], norm) == norm
+    assert _unrewrite(res["fake_text"], res["fake_spans"], norm) == norm
+    assert _unrewrite(res["redacted_original"], res["redacted_original_spans"], text) == text
+    assert _unrewrite(res["fake_original"], res["fake_original_spans"], text) == text
+    assert [sp["label"] for sp in res["redacted_spans"]] == [sp["label"] for sp in res["fake_spans"]]
@@ -0,0 +1,143 @@
+import importlib
+import json
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+from pii_guard import state_store
+from pii_guard.pii_masking import mask_many
+from pii_guard.state_store import (CompactStateStore, MemoryStateStore, SQLiteStateStore, StateStore,
+                                    dict_state_footprint, new_job_state)
+
+
+def _pairs(seed=0, n=3000):
+    rng = random.Random(seed)
+    labels = ["NAME", "PHONE", "ACCT", "EMAIL"]
+    return [(rng.choice(labels), f"v{rng.randint(0, 800)}") for _ in range(n)]
+
+
+def _stores(tmp_path):
+    return {
+        "memory": MemoryStateStore(),
+        "compact": CompactStateStore(capacity=16),
+        "sqlite": SQLiteStateStore(str(tmp_path / "state.db"), job="t", ephemeral=True),
+    }
+
+
+def _assign_in_batches(store, pairs, size):
+    out = {}
+    for i in range(0, len(pairs), size):
+        out.update(store.assign_indices(pairs[i:i + size]))
+    return out
+
+
+def test_stores_assign_identical_indices(tmp_path):
+    pairs = _pairs()
+    results = {name: _assign_in_batches(s, pairs, 137) for name, s in _stores(tmp_path).items()}
+    first = next(iter(results.values()))
+    for name, got in results.items():
+        assert got == first, name
+    # 라벨별로 1부터 빈틈없이 매긴다
+    for label in {l for l, _ in pairs}:
+        assert sorted(n for (l, _), n in first.items() if l == label) == \
+               list(range(1, len({v for l2, v in pairs if l2 == label}) + 1))
+
+
+def test_stores_keep_first_fake(tmp_path):
+    for name, store in _stores(tmp_path).items():
+        assert store.put_fakes({"a": "x", "b": "y"}) == {"a": "x", "b": "y"}, name
+        assert store.put_fakes({"a": "z", "c": "w"}) == {"a": "x", "c": "w"}, name
+        assert store.get_fakes(["a", "b", "c", "d"]) == {"a": "x", "b": "y", "c": "w"}, name
+
+
+def test_stores_mask_identically(fake_ner, tmp_path):
+    texts = ["홍길동 010-1234-5678", "김철수와 홍길동", "이민형 a@b.com", "정하나 010-1234-5678 김철수"] * 5
+    outs = {name: mask_many(texts, state=new_job_state(store=s)) for name, s in _stores(tmp_path).items()}
+    assert outs["compact"] == outs["sqlite"] == outs["memory"] == mask_many(texts, state={})
+
+
+def test_compact_store_is_smaller_than_dict_state():
+    pairs = _pairs(n=5000)
+    compact, state = CompactStateStore(), {}
+    store = MemoryStateStore(state)
+    for s in (compact, store):
+        s.assign_indices(pairs)
+        s.put_fakes({v: f"fake-{v}" for _, v in pairs})
+    small, big = compact.footprint(), dict_state_footprint(state)
+    assert small["index_entries"] == len(set(pairs))
+    assert small["bytes_per_entry"] < big["bytes_per_entry"] / 2
+
+
+def test_state_store_base_is_abstract():
+    class Partial(StateStore):
+        def assign_indices(self, pairs):
+            return {}
+
+    with pytest.raises(TypeError):
+        StateStore()
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def _rows(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM pii_index").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_named_job_rows_are_dropped_unless_kept(tmp_path, monkeypatch):
+    db = str(tmp_path / "state.db")
+    monkeypatch.setattr(state_store, "STATE_DB", db)
+    state = state_store.new_job_state(job="file.csv:run1")
+    state["store"].assign_indices([("NAME", "홍길동")])
+    state_store.release_job_state(state)
+    assert _rows(db) == 0
+
+    kept = state_store.new_job_state(job="file.csv:run2", keep=True)
+    kept["store"].assign_indices([("NAME", "홍길동")])
+    state_store.release_job_state(kept)
+    assert _rows(db) == 1
+    state_store.drop_run("run2")
+    assert _rows(db) == 0
+
+
+@pytest.fixture
+def run_flow(monkeypatch, tmp_path):
+    monkeypatch.setattr(state_store, "STATE_DB", str(tmp_path / "state.db"))
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pipeline"))
+    try:
+        yield importlib.import_module("run_flow")
+    finally:
+        sys.path.pop(0)
+
+
+def test_rerun_starts_numbering_over_and_leaves_no_rows(fake_ner, run_flow, tmp_path):
+    parsed = tmp_path / "a_parsed.json"
+    parsed.write_text(json.dumps([{"text": "홍길동"}, {"text": "김철수"}], ensure_ascii=False), encoding="utf-8")
+    outs = []
+    for _ in range(2):
+        out = run_flow.mask_parsed_file(parsed, "_parsed.json", stateful=True)
+        outs.append(json.loads(out.read_text(encoding="utf-8")))
+    assert outs[0] == outs[1]
+    assert [r["masked"] for r in outs[0]] == ["[이름_1]", "[이름_2]"]
+    assert _rows(str(tmp_path / "state.db")) == 0
+
+
+def test_state_is_released_on_error(fake_ner, run_flow, tmp_path, monkeypatch):
+    released = []
+    monkeypatch.setattr(run_flow, "release_job_state", lambda st: released.append(st))
+
+    def boom(*a, **k):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(run_flow, "mask_many", boom)
+    parsed = tmp_path / "b_parsed.json"
+    parsed.write_text(json.dumps([{"text": "홍길동"}]), encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        run_flow.mask_parsed_file(parsed, "_parsed.json", stateful=True)
+    assert len(released) == 1
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from pii_guard import inference
+from pii_guard.inference import _windows, ner_many, ner_windowed
+from conftest import TOKEN_RE
+
+
+def _offsets(rng, n):
+    offs, pos = [], rng.randint(0, 3)
+    for _ in range(n):
+        w = rng.randint(1, 4)
+        offs.append((pos, pos + w))
+        pos += w + rng.randint(0, 2)
+    return offs, pos + rng.randint(0, 3)
+
+
+def test_window_ownership_tiles_text():
+    rng = random.Random(0)
+    for _ in range(5000):
+        n = rng.randint(1, 120)
+        offs, text_len = _offsets(rng, n)
+        size = rng.randint(1, 40)
+        overlap = rng.randint(0, 25)
+        wins = _windows(offs, text_len, size, overlap)
+        assert wins[0][2] == 0
+        assert wins[-1][3] == text_len
+        for (_, _, _, hi), (_, _, lo, _) in zip(wins, wins[1:]):
+            assert hi == lo
+        for c0, c1, lo, hi in wins:
+            assert lo <= hi
+            # 소유 구간의 토큰 시작은 모두 윈도우 안에 있다
+            for s, e in offs:
+                if lo <= s < hi:
+                    assert c0 <= s and e <= c1
+
+
+@pytest.mark.parametrize("overlap", [10, 11, 12, 13])
+def test_windowed_entities_match_whole_text(fake_ner, overlap):
+    text = " ".join(f"고객{i} 홍길동 010-1234-{i:04d} 메모" for i in range(40))
+    ents = ner_windowed(text, window_tokens=20, overlap=overlap)
+    expected = fake_ner._one(text)
+    assert [(e["entity_group"], e["start"], e["end"]) for e in ents] == \
+           [(e["entity_group"], e["start"], e["end"]) for e in expected]
+
+
+def test_long_texts_in_ner_many_are_windowed(fake_ner, monkeypatch):
+    monkeypatch.setattr(inference, "max_positions", lambda: 22)
+    text = " ".join(f"김철수 010-0000-{i:04d}" for i in range(30))
+    assert len(TOKEN_RE.findall(text)) > 20
+    (ents,) = ner_many([text])
+    assert len(ents) == 60
+    assert inference.inference_stats()["windowed_texts"] >= 1